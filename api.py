@@ -0,0 +1,377 @@
+# Read-only HTTP/JSON API over the dashboard's data
+#
+#   python api.py [--host 127.0.0.1] [--port 8502]
+#   IPI_API_PORT=8502 python serve.py [streamlit run options]
+#
+# Serves the numbers the dashboard shows, from the same shared caches (loaders.py):
+#
+#   GET /orgs                           filing orgs with their years and total expenses
+#   GET /orgs/<ein>                     the org's summary by tax year, with a Total row
+#   GET /orgs/<ein>/grantees            Schedule I totals per grantee
+#   GET /orgs/<ein>/funders             totals given to <ein> per funding org (any EIN)
+#   GET /orgs/<ein>/contractors         Part VII-B totals per contractor
+#   GET /orgs/<ein>/compensation        Schedule J totals per employee
+#   GET /years                          network totals per tax year
+#   GET /years/<year>                   every org's totals and network ranks in the year
+#   GET /search?q=                      name and EIN search hits
+#
+# Every list takes offset and limit (at most MAX_LIMIT); the per-org and per-year
+# aggregates take first_year and last_year (default: every year), and /years/<year>
+# takes sort, one of the league metrics. Org ranges are narrowed to the org's
+# filing years, as on the dashboard.
+#
+# A response depends only on the dataset version and the request, so its ETag is
+# derived from those two and checked against If-None-Match before anything else
+# runs: a repeat request is answered 304 without touching the data. Encoded
+# responses are also kept per version, so a repeat request without the header
+# is a dictionary lookup. Run inside serve.py the API shares the dashboard's
+# loaded dataset and search index, and follows its background updates.
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import traceback
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+from streamlit.logger import set_log_level
+
+from data import LEAGUE_METRICS, SUMMARY_METRICS, org_rows, range_totals, summary_range
+from loaders import load_dataset, load_search_index, served_version
+from reports import compensation_totals, contractor_totals, grantee_totals, org_names, org_years
+from search import search
+
+API_PORT = os.environ.get('IPI_API_PORT')
+
+PAGE_SIZE = 50
+MAX_LIMIT = 1000
+
+# encoded responses kept across requests
+
+RESPONSE_CACHE_SIZE = 8192
+
+# answered while the data files fail to load, and never cached
+
+UNAVAILABLE = 503, json.dumps({'error': "the data files could not be loaded"}, separators=(',', ':')).encode()
+
+INTERNAL_ERROR = 500, json.dumps({'error': "internal error"}, separators=(',', ':')).encode()
+
+
+# raised for requests the API answers 400 and 404. Only these are turned into
+# (cached) error responses: any other exception is a bug and becomes an uncached 500
+
+class BadRequest(ValueError):
+    pass
+
+
+class NotFound(LookupError):
+    pass
+
+
+def integer(params, name, default=None):
+
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+
+
+def year_range(dataset, params):
+
+    years = sorted(dataset.league_index)
+    return integer(params, 'first_year', years[0]), integer(params, 'last_year', years[-1])
+
+
+def records(df):
+
+    # rows as dicts, with NaN and NA as None (JSON has no NaN)
+
+    return [{name: None if value is pd.NA or value != value else value for name, value in row.items()}
+            for row in df.to_dict(orient='records')]
+
+
+def json_default(value):
+
+    # numpy scalars that reach the body outside of records()
+
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def paged(df, params, **fields):
+
+    # one page of rows, with the total row count
+
+    offset = integer(params, 'offset', 0)
+    limit = integer(params, 'limit', PAGE_SIZE)
+    if offset < 0 or not 0 < limit <= MAX_LIMIT:
+        raise BadRequest(f"offset must be at least 0 and limit between 1 and {MAX_LIMIT}")
+
+    page = df.iloc[offset:offset + limit]
+    return dict(fields, total=len(df), offset=offset, limit=limit, items=records(page))
+
+
+def filing_org(dataset, ein):
+
+    names = org_names(dataset.summary)
+    if ein not in names.index:
+        raise NotFound(f"no filings for EIN {ein}")
+    return names[ein]
+
+
+def org_range(dataset, ein, params):
+
+    first_year, last_year = year_range(dataset, params)
+    years = org_years(dataset.summary, ein, first_year, last_year)
+    if years is None:
+        raise NotFound(f"EIN {ein} has no filings between {first_year} and {last_year}")
+    return years
+
+
+# Endpoints: each takes the dataset, the path arguments and the query parameters,
+# and returns the response body
+
+def orgs(dataset, params):
+
+    summary = dataset.summary
+    years = summary['tax_year'].dropna().groupby(level='filing_ein', sort=False).agg(['min', 'max'])
+    filers = summary[summary['tax_year'].isna()]
+
+    table = pd.DataFrame({
+        'ein': filers.index,
+        'name': filers['filing_org'].astype(str).to_numpy(),
+        'first_year': years['min'].reindex(filers.index).astype('Int64').to_numpy(),
+        'last_year': years['max'].reindex(filers.index).astype('Int64').to_numpy(),
+        'total_expenses': filers['total_expenses'].to_numpy('float64')
+    })
+    return paged(table, params)
+
+
+def org_summary(dataset, ein, params):
+
+    name = filing_org(dataset, ein)
+    first_year, last_year = org_range(dataset, ein, params)
+
+    rows = summary_range(dataset.summary.loc[[ein]], first_year, last_year)
+    rows = rows.drop(columns='filing_org').reset_index(drop=True)
+    return {'ein': ein, 'name': name, 'first_year': first_year, 'last_year': last_year,
+            'years': records(rows)}
+
+
+def org_grantees(dataset, ein, params):
+
+    name = filing_org(dataset, ein)
+    first_year, last_year = org_range(dataset, ein, params)
+
+    i_total, i_aggregate = grantee_totals(dataset, ein, first_year, last_year)
+    i_total = i_total.astype({'grantee_business_name': str})
+    return paged(i_total, params, ein=ein, name=name, first_year=first_year, last_year=last_year, total_amount=float(i_aggregate))
+
+
+def org_funders(dataset, ein, params):
+
+    # any EIN, filer or not: who funds it is read from the funders' filings
+
+    first_year, last_year = year_range(dataset, params)
+
+    funders = range_totals(dataset.range_sums['funders'], ein, first_year, last_year)
+    funders = pd.DataFrame({
+        'ein': funders['filing_ein'].to_numpy('int64'),
+        'name': funders['filing_ein'].map(dataset.org_names).astype(str).to_numpy(),
+        'amount': funders['grantee_cash_grant'].to_numpy()
+    }).sort_values('amount', ascending=False, kind='stable')
+    return paged(funders, params, ein=ein, name=dataset.org_names.get(ein), first_year=first_year, last_year=last_year,
+                 total_amount=float(funders['amount'].sum()))
+
+
+def org_contractors(dataset, ein, params):
+
+    name = filing_org(dataset, ein)
+    first_year, last_year = org_range(dataset, ein, params)
+
+    viib_total = contractor_totals(dataset, ein, first_year, last_year).astype({'contractor_name': str})
+    return paged(viib_total, params, ein=ein, name=name, first_year=first_year, last_year=last_year,
+                 total_amount=float(viib_total['contractor_amt'].sum()))
+
+
+def org_compensation(dataset, ein, params):
+
+    name = filing_org(dataset, ein)
+    first_year, last_year = org_range(dataset, ein, params)
+
+    j_total = compensation_totals(dataset, ein, first_year, last_year)
+    j_total = j_total[['compensation_name', 'total_compensation']].astype({'compensation_name': str})
+    return paged(j_total, params, ein=ein, name=name, first_year=first_year, last_year=last_year,
+                 total_amount=float(j_total['total_compensation'].sum()))
+
+
+def years(dataset, params):
+
+    first_year, last_year = year_range(dataset, params)
+
+    summary = dataset.summary
+    rows = summary[summary['tax_year'].between(first_year, last_year).fillna(False)]
+    totals = rows.groupby('tax_year')[SUMMARY_METRICS].sum()
+    totals.insert(0, 'organizations', rows.groupby('tax_year').size())
+    return paged(totals.reset_index().astype({'tax_year': 'int64'}), params)
+
+
+def year(dataset, tax_year, params):
+
+    if tax_year not in dataset.league_index:
+        raise NotFound(f"no filings for tax year {tax_year}")
+
+    metric = params.get('sort', 'total_expenses')
+    if metric not in LEAGUE_METRICS:
+        raise BadRequest(f"sort must be one of {', '.join(LEAGUE_METRICS)}")
+
+    table = org_rows(dataset.league, dataset.league_index, tax_year)
+    table = table.sort_values(f'{metric}_rank', kind='stable').astype({'filing_org': str})
+    return paged(table, params, tax_year=tax_year, sort=metric)
+
+
+def search_names(dataset, params, version):
+
+    query = params.get('q', '')
+    hits = search(load_search_index(version), query).astype({'filing_org': str})
+    return paged(hits, params, q=query)
+
+
+ORG_ENDPOINTS = {
+    None: org_summary,
+    'grantees': org_grantees,
+    'funders': org_funders,
+    'contractors': org_contractors,
+    'compensation': org_compensation
+}
+
+
+def route(version, path, params):
+
+    dataset = load_dataset(version)
+    parts = [part for part in path.split('/') if part]
+    if parts == ['orgs']:
+        return orgs(dataset, params)
+    if len(parts) in (2, 3) and parts[0] == 'orgs':
+        endpoint = ORG_ENDPOINTS.get(parts[2] if len(parts) == 3 else None)
+        if endpoint is not None and parts[1].isdigit():
+            return endpoint(dataset, int(parts[1]), params)
+    if parts == ['years']:
+        return years(dataset, params)
+    if len(parts) == 2 and parts[0] == 'years' and parts[1].isdigit():
+        return year(dataset, int(parts[1]), params)
+    if parts == ['search']:
+        return search_names(dataset, params, version)
+    raise NotFound(f"no such endpoint: {path}")
+
+
+@lru_cache(maxsize=8)
+def version_tag(version):
+
+    return hashlib.blake2b(repr(version).encode(), digest_size=8).hexdigest()
+
+
+def entity_tag(version, target):
+
+    # the same request against the same dataset version always gets the same body
+
+    return '"' + version_tag(version) + '-' + hashlib.blake2b(target.encode(), digest_size=8).hexdigest() + '"'
+
+
+@lru_cache(maxsize=RESPONSE_CACHE_SIZE)
+def response(version, path, query):
+
+    # bad parameters are 400s and unknown endpoints, orgs and years 404s. Only
+    # called once the dataset has loaded, so a 503 is never kept
+
+    params = dict(parse_qsl(query))
+    try:
+        status, body = 200, route(version, path, params)
+    except BadRequest as e:
+        status, body = 400, {'error': str(e)}
+    except NotFound as e:
+        status, body = 404, {'error': str(e)}
+    return status, json.dumps(body, separators=(',', ':'), default=json_default).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    # keep-alive, so a client can reuse its connection. The headers and the body are
+    # separate writes, which Nagle's algorithm would hold back for the client's delayed ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+
+        version = served_version()
+        target = urlsplit(self.path)
+        etag = entity_tag(version, self.path)
+
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        try:
+            if load_dataset(version) is None:
+                status, body = UNAVAILABLE
+            else:
+                status, body = response(version, target.path, target.query)
+        except Exception:
+            traceback.print_exc()
+            status, body = INTERNAL_ERROR
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+
+        # no per-request log lines
+        pass
+
+
+def start_api(host, port):
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='api', daemon=True).start()
+    return server
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Serve the dashboard data as a read-only HTTP/JSON API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(API_PORT or 8502))
+    args = parser.parse_args()
+
+    # outside a Streamlit server the shared caches warn on every call
+    set_log_level('error')
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Serving http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
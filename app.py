@@ -3,571 +3,561 @@
 import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
-import plotly.express as px
-
-# Load data
-@st.cache_data
-def load_data():
-
-    try:
-        df_expenses = pd.read_csv('total_expenses.csv')
-        df_schedule_i = pd.read_parquet('schedule_i.parquet')
-        df_contractors = pd.read_csv('part_vii_b.csv')
-        df_schedule_j = pd.read_csv('schedule_j.csv')
-        return df_expenses, df_schedule_i, df_contractors, df_schedule_j
-    except FileNotFoundError as e:
-        st.error(f"Data file not found: {e}. Please ensure the CSV files are in the correct location.")
-        return None, None, None, None
 
-# Streamlit app title
+from charts import line_chart
+from data import LEAGUE_METRICS, org_rows, year_range_total
+from diagnostics import panel, set_org, stage, start_run
+from loaders import (load_dataset, load_graph, load_overview, org_version, page_version, search_hits, served_version,
+                     start_warm_up, updating, warmed)
+from network import flow_through, reachable, top_paths
+from reports import (IPI_EIN, SUMMARY_COLUMNS, compensation_by_year, compensation_charts, compensation_totals, contractor_charts,
+                     contractor_totals, contractors_by_year, expense_charts, expense_tables, grantee_charts, grantee_totals,
+                     org_names, org_years, target_funders)
+from tables import DOLLARS, PERCENT, paged_table
 
-def main():    
+# Chart figures, memoized per (section, org EIN, year range, org version). The underscore
+# arguments are the chart inputs and are not hashed; the least recently used
+# figures are evicted first
 
-    st.set_page_config(
-        page_title="Illinois Policy Institute 990 Data Explorer", 
-        layout="wide",
-        page_icon="💵",
-        initial_sidebar_state="collapsed"
-    )
+FIGURE_CACHE_SIZE = 64
 
-    st.markdown('<h1 style="font-family:Arial, Helvetica, sans-serif;">Illinois Policy Institute (IPI) 990 Data Explorer</h1>', unsafe_allow_html=True)
-    st.markdown('''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">
-    
-We are using the IPI 990 Data Explorer to draw out key insights into how IPI spends it's money and the networks of non-profits and independent contractors IPI contributes to and is connected to. This will be used to inform our "follow an IPI dollar" research project.
+@stage("figures: Total Expenses")
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE)
+def expense_figures(version, filing_ein, first_year, last_year, _exp_total_summed, _exp_total_perc):
 
-The IPI 990 Data Explorer combines data from about 3,000 IRS Form 990s filed by IPI, IPI's grantees, and the grantees of those grantees. Form 990s are IRS required returns for tax-exempt organizations. Using these forms we look at the following data between 2013-2024: 
-- [total expenses](#total-expenses-overview); 
-- the amount of grants awarded to other organizations ([Schedule I](#schedule-i-grants-and-other-assistance-to-organizations-governments-and-individuals));
-- independent contractor expenses ([Part VII-B](#part-vii-b-independent-contractors)); and
-- compensation information for certain officers, directors, trustees, key employees, and highest compensated employees ([Schedule J](#schedule-j-compensation-information-for-certain-officers-directors-trustees-key-employees-and-highest-compensated-employees)).</h2>
+    return expense_charts(_exp_total_summed, _exp_total_perc)
 
-''',unsafe_allow_html=True)
+@stage("figures: Schedule I")
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE)
+def schedule_i_figures(version, filing_ein, first_year, last_year, _i_total):
 
-    df_expenses, df_schedule_i, df_contractors, df_schedule_j = load_data()
+    return grantee_charts(_i_total, first_year, last_year)
 
-    # take total amount in 2024
+@stage("figures: Part VII-B")
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE)
+def contractor_figures(version, filing_ein, first_year, last_year, _viib_total):
 
-    total_2024 = df_schedule_i[df_schedule_i['tax_year'] == '2024-12-31']['grantee_cash_grant'].sum()
-    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Total Grants Given in the IPI Network (2024): ${total_2024:,.2f}</h2>''', unsafe_allow_html=True)
+    return contractor_charts(_viib_total)
 
-    # Make all filing_org names consistent
+@stage("figures: Schedule J")
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE)
+def schedule_j_figures(version, filing_ein, first_year, last_year, _j_total):
 
-    names = df_expenses.groupby(['filing_ein']).agg(
-        filing_org=('filing_org','first')
-    )
+    return compensation_charts(_j_total, first_year, last_year)
 
-    # 3 orgs do not have filing names. Manually add
+@stage("figures: Compare Organizations")
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE)
+def league_figures(version, eins, metric, first_year, last_year, _overlay):
 
-    # if 133859811 then filing_org = "THE COMMON GOOD INSTITUTE INC"
-    # if 221539721 then filing_org = "THE SEEING EYE INC"
-    # if 391134735 then filing_org = "MILWAUKEE BALLET COMPANY INC"
+    label = SUMMARY_COLUMNS[metric]
+    labels = {'tax_year': 'Tax Year', 'filing_org': 'Organization', metric: label, f'{metric}_rank': 'Rank'}
 
-    names.loc[133859811, 'filing_org'] = "THE COMMON GOOD INSTITUTE INC"
-    names.loc[221539721, 'filing_org'] = "THE SEEING EYE INC"
-    names.loc[391134735, 'filing_org'] = "MILWAUKEE BALLET COMPANY INC"
+    value_fig = line_chart(_overlay,
+        title=f"{label} by Year",
+        x='tax_year',
+        y=metric,
+        color='filing_org',
+        labels=labels,
+        hover_format='.1%' if metric.endswith('_perc') else '$,.0f')
+    rank_fig = line_chart(_overlay,
+        title=f"Network Rank by {label}",
+        x='tax_year',
+        y=f'{metric}_rank',
+        color='filing_org',
+        labels=labels,
+        hover_format=',d')
+    # rank 1 at the top
+    rank_fig.update_yaxes(autorange='reversed')
+    return value_fig, rank_fig
 
-    # filter for missing filing org name
+# Dashboard sections
 
-    names['filing_org'] = [x.upper() for x in names['filing_org']]
+@st.fragment
+@stage("section: Total Expenses")
+def total_expenses_section(filing_ein, filing_org, first_year, last_year):
 
-    name_dict = names['filing_org'].to_dict()
+    dataset = load_dataset(served_version())
 
-    # in all data frames replace the filing org name with the name_dict
-    df_expenses['filing_org'] = df_expenses['filing_ein'].map(name_dict)
+    # yearly amounts and percentages, and the category totals charted for the range
 
-    # repeat this step for the other dataframes
-    #schedule i
+    df_filtered, df_filtered_perc, exp_total_summed, exp_total_perc = expense_tables(dataset, filing_ein, first_year, last_year)
 
-    names = df_schedule_i.groupby(['filing_ein']).agg(
-        filing_org=('filing_org','first')
-    )
+    st.header("Total Expenses Overview")
 
-    # 3 orgs do not have filing names. Manually add
+    st.subheader(f"Total Expenses, Aggregate of {first_year}-{last_year}")
 
-    # if 133859811 then filing_org = "THE COMMON GOOD INSTITUTE INC"
-    # if 221539721 then filing_org = "THE SEEING EYE INC"
-    # if 391134735 then filing_org = "MILWAUKEE BALLET COMPANY INC"
+    bar,pie = st.columns(2)
+    bar_fig, pie_fig = expense_figures(org_version(dataset, filing_ein), filing_ein, first_year, last_year, exp_total_summed, exp_total_perc)
 
-    names.loc[133859811, 'filing_org'] = "THE COMMON GOOD INSTITUTE INC"
-    names.loc[221539721, 'filing_org'] = "THE SEEING EYE INC"
-    names.loc[391134735, 'filing_org'] = "MILWAUKEE BALLET COMPANY INC"
+    with bar:
+        st.plotly_chart(bar_fig, width="stretch")
 
-    names['filing_org'] = [x.upper() for x in names['filing_org']]
+    with pie:
+        st.plotly_chart(pie_fig, width="stretch")
 
-    name_dict = names['filing_org'].to_dict()
+    # By year
+    st.subheader(f"Total Expenses by Year, {first_year}-{last_year}")
 
-    # in all data frames replace the filing org name with the name_dict
-    df_schedule_i['filing_org'] = df_schedule_i['filing_ein'].map(name_dict)
+    data_format = st.radio("Select Format",["$ Amounts","Percentages"])
 
-    #schedule i (also dp grantee_business_name)
+    if data_format == "$ Amounts":
 
-    names = df_schedule_i.groupby(['grantee_ein']).agg(
-        grantee_business_name=('grantee_business_name','first')
-    )
+        st.dataframe(
+            df_filtered,
+            column_config={
+                'Total Expenses': DOLLARS,
+                'Grants Given': DOLLARS,
+                'Independent Contractor Expenses': DOLLARS,
+                'Compensation For Leadership (Filing Org+Related Orgs)': DOLLARS,
+                'Compensation For Leadership (Filing Org)': DOLLARS
+            },
+            hide_index=True)
+    else:
+        st.dataframe(
+            df_filtered_perc,
+            column_config={
+                'Grants Given (%)': PERCENT,
+                'Independent Contractor Expenses (%)': PERCENT,
+                'Compensation For Leadership (Filing Org+Related Orgs) (%)': PERCENT,
+                'Compensation For Leadership (Filing Org) (%)': PERCENT
+            },
+            hide_index=True)
 
-    # create missing grantee_business_name entries df
 
-    missing = names[names['grantee_business_name'].isnull()]
+@st.fragment
+@stage("section: Schedule I")
+def schedule_i_section(filing_ein, filing_org, first_year, last_year):
 
-    # 3 orgs do not have filing names. Manually add
+    dataset = load_dataset(served_version())
+    org_dimension = dataset.org_names
 
-    # if 133859811 then grantee_business_name = "THE COMMON GOOD INSTITUTE INC"
-    # if 221539721 then grantee_business_name = "THE SEEING EYE INC"
-    # if 391134735 then grantee_business_name = "MILWAUKEE BALLET COMPANY INC"
+    st.header("Schedule I - Grants and Other Assistance to Organizations, Governments, and Individuals")
 
-    names.loc[133859811, 'grantee_business_name'] = "THE COMMON GOOD INSTITUTE INC"
-    names.loc[221539721, 'grantee_business_name'] = "THE SEEING EYE INC"
-    names.loc[391134735, 'grantee_business_name'] = "MILWAUKEE BALLET COMPANY INC"
+    # filter for the selected filing org
 
+    st.subheader(f"Grants Awarded, {first_year}-{last_year}")
 
-    names['grantee_business_name'] = [x.upper() if x is not None else None for x in names['grantee_business_name']]
+    # total amount
 
-    name_dict = names['grantee_business_name'].to_dict()
+    # per grantee totals for the year range, from running totals
 
-    # in all data frames replace the filing org name with the name_dict
-    df_schedule_i['grantee_business_name'] = df_schedule_i['grantee_ein'].map(name_dict)
+    i_total, i_aggregate = grantee_totals(dataset, filing_ein, first_year, last_year)
+    i_avg = i_aggregate/(last_year-first_year+1)
 
+    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Total Grants Awarded: ${i_aggregate:,.2f}</h2>''', unsafe_allow_html=True)
+    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Total Grants Awarded (yearly average): ${i_avg:,.2f}</h2>''', unsafe_allow_html=True)
 
-    #schedule j
+    bar,pie = st.columns(2)
 
-    names = df_schedule_j.groupby(['filing_ein']).agg(
-        filing_org=('filing_org','first')
-    )
+    bar_fig, pie_fig = schedule_i_figures(org_version(dataset, filing_ein), filing_ein, first_year, last_year, i_total)
 
-    # 3 orgs do not have filing names. Manually add
+    with bar:
+        st.plotly_chart(bar_fig, width="stretch")
 
-    # if 133859811 then filing_org = "THE COMMON GOOD INSTITUTE INC"
-    # if 221539721 then filing_org = "THE SEEING EYE INC"
-    # if 391134735 then filing_org = "MILWAUKEE BALLET COMPANY INC"
+    with pie:
+        st.plotly_chart(pie_fig, width="stretch")
 
-    names.loc[133859811, 'filing_org'] = "THE COMMON GOOD INSTITUTE INC"
-    names.loc[221539721, 'filing_org'] = "THE SEEING EYE INC"
-    names.loc[391134735, 'filing_org'] = "MILWAUKEE BALLET COMPANY INC"
+    # donations back to a target org (IPI by default) from everyone that funds it
 
-    names['filing_org'] = [x.upper() for x in names['filing_org']]
+    target_ein = st.selectbox("Follow Donations Back To",options=org_dimension.index.tolist(),format_func=org_dimension.get,index=org_dimension.index.get_loc(IPI_EIN))
+    target_org = org_dimension[target_ein]
 
-    name_dict = names['filing_org'].to_dict()
+    # funders are other orgs' filings, so they follow the whole selected range; checked
+    # rows are organizations the selected org also donated to
 
-    # in all data frames replace the filing org name with the name_dict
-    df_schedule_j['filing_org'] = df_schedule_j['filing_ein'].map(name_dict)
+    range_start, range_end = st.session_state['years']
+    target_funders_all = target_funders(dataset, filing_ein, first_year, last_year, target_ein, range_start, range_end)
 
-    #contractors
+    target_total_donations = target_funders_all['grantee_amt'].sum()
 
-    names = df_contractors.groupby(['filing_ein']).agg(
-        filing_org=('filing_org','first')
-    )
+    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">In total, organizations in IPI's networks donated: ${target_total_donations:,.2f} to {target_org}</h2>''', unsafe_allow_html=True)
 
-    # 3 orgs do not have filing names. Manually add
+    st.header(f"Donations to {target_org} from Organizations that {filing_org} Donated To")
 
-    # if 133859811 then filing_org = "THE COMMON GOOD INSTITUTE INC"
-    # if 221539721 then filing_org = "THE SEEING EYE INC"
-    # if 391134735 then filing_org = "MILWAUKEE BALLET COMPANY INC"
+    paged_table(target_funders_all, key="target_funders", column_config={
+        'grantee_amt': DOLLARS,
+        'highlight': st.column_config.CheckboxColumn(f'Grantee of {filing_org}')
+        })
 
-    names.loc[133859811, 'filing_org'] = "THE COMMON GOOD INSTITUTE INC"
-    names.loc[221539721, 'filing_org'] = "THE SEEING EYE INC"
-    names.loc[391134735, 'filing_org'] = "MILWAUKEE BALLET COMPANY INC"
 
-    names['filing_org'] = [x.upper() for x in names['filing_org']]
+    st.subheader(f"All Grants Awarded by Grantee, {first_year}-{last_year}")
 
-    name_dict = names['filing_org'].to_dict()
+    paged_table(i_total, key="grantees", column_config={
+        'grantee_cash_grant': DOLLARS
+        })
 
-    # in all data frames replace the filing org name with the name_dict
-    df_contractors['filing_org'] = df_contractors['filing_ein'].map(name_dict)    
 
-    # Group by year and filing_ein for each data source (without totals yet)
+@st.fragment
+@stage("section: Follow the Money")
+def network_section(filing_ein, filing_org, first_year, last_year):
 
-    exp = df_expenses.groupby(['tax_year','filing_ein']).agg(
-        total_expenses=('tot_expenses', 'sum'),
-        filing_org=('filing_org', 'first')
-    ).reset_index() 
+    dataset = load_dataset(served_version())
+    org_dimension = dataset.org_names
 
-    don = df_schedule_i.groupby(['tax_year','filing_ein']).agg(
-        grantee_cash_grant=('grantee_cash_grant', 'sum')).reset_index()
+    # grants made anywhere in the network during the selected range
 
-    con = df_contractors.groupby(['tax_year','filing_ein']).agg(
-        contractor_amt=('contractor_amt', 'sum')).reset_index()
+    range_start, range_end = st.session_state['years']
 
-    pay = df_schedule_j.groupby(['tax_year','filing_ein']).agg(
-        total_compensation=('total_compensation', 'sum'),
-        total_compensation_filing_org=("total_compensation_filing_org","sum")).reset_index()
+    st.header(f"Follow the Money Through the Grantee Network, {range_start}-{range_end}")
 
-    # Merge all yearly data first (before adding totals)
+    # multi-hop grant chains starting at the selected org
 
-    exp = exp.merge(don,on=['tax_year','filing_ein'],how='left')
-    exp = exp.merge(con,on=['tax_year','filing_ein'],how='left')
-    exp = exp.merge(pay,on=['tax_year','filing_ein'],how='left')
+    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Dollars are followed through grantees of grantees: each organization is assumed to pass on its Schedule I grants in proportion to its total spending.</h2>''', unsafe_allow_html=True)
 
-    # Now calculate totals on the merged data
+    hop_col, target_col = st.columns(2)
+    with hop_col:
+        max_hops = st.slider("Grant Hops to Follow", min_value=1, max_value=6, value=3)
+    with target_col:
+        target_ein = st.selectbox("Target Organization",options=org_dimension.index.tolist(),format_func=org_dimension.get,index=org_dimension.index.get_loc(IPI_EIN))
+    target_org = org_dimension[target_ein]
 
-    totals = exp.groupby(['filing_ein']).agg(
-        total_expenses=('total_expenses', 'sum'),
-        filing_org=('filing_org', 'first'),
-        grantee_cash_grant=('grantee_cash_grant', 'sum'),
-        contractor_amt=('contractor_amt', 'sum'),
-        total_compensation=('total_compensation', 'sum'),
-        total_compensation_filing_org=('total_compensation_filing_org', 'sum')).reset_index()
+    with stage("network: graph"):
+        graph = load_graph(served_version(), range_start, range_end)
 
-    totals['tax_year'] = 'Total'
-    totals['filing_ein'] = '999999999'
+    with stage("network: queries"):
+        reached = reachable(graph, filing_ein, max_hops)
+        flow_by_org, flow_by_hop = flow_through(graph, filing_ein, max_hops)
 
-    # Concat totals once
+    returned_amount = flow_by_hop['returned'].sum()
 
-    exp = pd.concat([exp,totals],ignore_index=True)
+    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Organizations reached within {max_hops} hops: {len(reached):,}</h2>''', unsafe_allow_html=True)
+    if target_ein != filing_ein:
+        target_amount = flow_by_org.loc[flow_by_org['ein'] == target_ein, 'amount'].sum()
+        st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">{filing_org} dollars reaching {target_org}: ${target_amount:,.2f}</h2>''', unsafe_allow_html=True)
+    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">{filing_org} dollars coming back to {filing_org}: ${returned_amount:,.2f}</h2>''', unsafe_allow_html=True)
 
-    df = exp.copy()
+    hops, recipients = st.columns(2)
 
-    ipi_index = df['filing_org'].unique().tolist().index("ILLINOIS POLICY INSTITUTE")
+    with hops:
+        st.subheader("Dollars by Hop")
+        flow_by_hop.columns = ['Hop','Organizations First Reached','Dollars Passed On','Dollars Returned']
+        st.dataframe(
+            flow_by_hop,
+            column_config={
+                'Dollars Passed On': DOLLARS,
+                'Dollars Returned': DOLLARS
+                },
+            hide_index=True)
 
-    filing_org = st.selectbox("Select an IPI Grantee to Follow Their Money",options=df['filing_org'].unique().tolist(),placeholder="ILLINOIS POLICY INSTITUTE",index=ipi_index)
+    with recipients:
+        st.subheader("Largest Recipients of Followed Dollars")
+        flow_by_org.insert(0, 'Organization', flow_by_org['ein'].map(org_dimension))
+        flow_by_org.columns = ['Organization','EIN','First Reached at Hop','Dollars Received']
+        paged_table(flow_by_org, key="flow_recipients", column_config={
+            'EIN': st.column_config.NumberColumn(format="%d"),
+            'Dollars Received': DOLLARS
+            })
 
-    # Title of Section
+    st.subheader(f"Top Grant Chains from {filing_org} to {target_org}")
 
-    st.markdown(f"""<h1 style="font-family:Arial, Helvetica, sans-serif;">{filing_org}</h1>""", unsafe_allow_html=True)
-    
-    df_filtered = df[df['filing_org'] == filing_org]
+    with stage("network: top paths"):
+        paths = top_paths(graph, filing_ein, target_ein, max_hops)
+    paths['path'] = [' → '.join(str(org_dimension.get(ein, ein)) for ein in path) for path in paths['path']]
+    paths.columns = ['Grant Chain','Hops','Dollars']
 
-    df_filtered.columns=['Tax Year','Filing Org EIN','Total Expenses','Filing Org','Grants Given','Independent Contractor Expenses','Compensation For Leadership (Filing Org+Related Orgs)','Compensation For Leadership (Filing Org)']
-    df_filtered = df_filtered[['Tax Year','Total Expenses','Grants Given','Independent Contractor Expenses','Compensation For Leadership (Filing Org+Related Orgs)','Compensation For Leadership (Filing Org)']]    
+    st.dataframe(
+        paths,
+        column_config={
+            'Dollars': DOLLARS
+            },
+        hide_index=True)
 
-    # Create percentages dataframe (out of total expenses)
 
-    df_filtered_perc = df_filtered.copy()
-    df_filtered_perc['Grants Given (%)'] = (df_filtered_perc['Grants Given'] / df_filtered_perc['Total Expenses'])
-    df_filtered_perc['Independent Contractor Expenses (%)'] = (df_filtered_perc['Independent Contractor Expenses'] / df_filtered_perc['Total Expenses'])
-    df_filtered_perc['Compensation For Leadership (Filing Org+Related Orgs) (%)'] = (df_filtered_perc['Compensation For Leadership (Filing Org+Related Orgs)'] / df_filtered_perc['Total Expenses'])
-    df_filtered_perc['Compensation For Leadership (Filing Org) (%)'] = (df_filtered_perc['Compensation For Leadership (Filing Org)'] / df_filtered_perc['Total Expenses'])
-    
-    # select only the percentage columns and Tax Year
-    
-    df_filtered_perc = df_filtered_perc[['Tax Year','Grants Given (%)','Independent Contractor Expenses (%)','Compensation For Leadership (Filing Org+Related Orgs) (%)','Compensation For Leadership (Filing Org) (%)']]
+@st.fragment
+@stage("section: Part VII-B")
+def contractors_section(filing_ein, filing_org, first_year, last_year):
 
-    # Recreate bar chart, pie chart, and yearly table for total expenses by category
+    dataset = load_dataset(served_version())
 
-    exp = df_filtered.copy()
+    st.header("Part VII-B - Independent Contractors")
 
-    exp_total = exp[exp['Tax Year'] != 'Total']
+    # per contractor totals for the selected filing org and year range
 
-    exp_total = exp_total[['Total Expenses','Grants Given','Independent Contractor Expenses','Compensation For Leadership (Filing Org)']]
+    viib_total = contractor_totals(dataset, filing_ein, first_year, last_year)
 
-    # Sum all years together for each category
-    exp_total_summed = exp_total.sum().reset_index()
-    exp_total_summed.columns = ['Expense Category', 'Amount']
+    st.subheader(f"Independent Contractors by Contractor Name, Aggregate of {first_year}-{last_year}")
 
-    exp_total_perc = df_filtered_perc[df_filtered_perc['Tax Year'] == 'Total']
+    # Take top 10 for bar chart
 
-    exp_total_perc = exp_total_perc[['Tax Year','Grants Given (%)','Independent Contractor Expenses (%)','Compensation For Leadership (Filing Org) (%)']]
+    viib_total = viib_total.head(10)
 
-    exp_total_perc['Other'] = exp_total_perc['Grants Given (%)'] + exp_total_perc['Independent Contractor Expenses (%)'] + exp_total_perc['Compensation For Leadership (Filing Org) (%)']
+    bar,pie = st.columns(2)
+    bar_fig, pie_fig = contractor_figures(org_version(dataset, filing_ein), filing_ein, first_year, last_year, viib_total)
 
-    # pivot so "Total" is column name and the rest are values in that column
-    exp_total_perc = exp_total_perc.melt(id_vars=['Tax Year'], var_name='Expense Category', value_name='Percentage')
+    with bar:
+        st.plotly_chart(bar_fig, width="stretch")
 
-    # get max and min of tax_year
+    with pie:
+        st.plotly_chart(pie_fig, width="stretch")
+    
 
-    first_year = df_filtered[df_filtered['Tax Year'] != 'Total']['Tax Year'].min()
-    last_year = df_filtered[df_filtered['Tax Year'] != 'Total']['Tax Year'].max()
-    first_year = first_year[:4]
-    last_year = last_year[:4]
+    viib_by_year = contractors_by_year(dataset, filing_ein, first_year, last_year)
 
-    st.header("Total Expenses Overview")
+    st.subheader(f"Independent Contractors by Year, {first_year}-{last_year}")
+
+    paged_table(viib_by_year, key="contractors_by_year", column_config={
+        'contractor_amt_total': DOLLARS
+        })
+
+
+@st.fragment
+@stage("section: Schedule J")
+def schedule_j_section(filing_ein, filing_org, first_year, last_year):
+
+    dataset = load_dataset(served_version())
+
+    st.header("Schedule J - Compensation Information for Certain Officers, Directors, Trustees, Key Employees, and Highest Compensated Employees")  
+
+    # per employee totals over the range (each employee counted once per filing)
+
+    j_total = compensation_totals(dataset, filing_ein, first_year, last_year)
+
+    st.subheader(f"Compensation of Highest Paid Employees by Employee Name, {first_year}-{last_year}")
 
-    st.subheader(f"Total Expenses, Aggregate of All Years {first_year}-{last_year}")
 
     bar,pie = st.columns(2)
-    # Take top 10 for bar chart
-    exp_total_summed = exp_total_summed.sort_values(by='Amount',ascending=False).head(10)
+    bar_fig, pie_fig = schedule_j_figures(org_version(dataset, filing_ein), filing_ein, first_year, last_year, j_total)
+
     with bar:
-        fig = px.bar(exp_total_summed,
-            title="Total Expenses by Category",
-            x='Expense Category',
-            y='Amount',
-            labels={'Amount': 'Amount', 'Expense Category': 'Expense Category'},
-            height=700,
-            text_auto='.2s')
-        fig.update_traces(
-            hovertemplate='<b>%{x}</b><br>Amount: $%{y:,.0f}<extra></extra>',
-            texttemplate='$%{y:,.0f}',
-            textposition='outside',
-            textfont_size=20,
-            marker=dict(line=dict(color='#000000', width=2)))
-        st.plotly_chart(fig, width="stretch")
+        st.plotly_chart(bar_fig, width="stretch")
 
     with pie:
-        fig = px.pie(exp_total_perc,values='Percentage',
-        names='Expense Category',
-        title='Expense Distribution by Category',
-        height=700)
-        fig.update_traces(textfont_size=20,
-                  marker=dict(line=dict(color='#000000', width=2)))
-
-        st.plotly_chart(fig, width="stretch")
+        st.plotly_chart(pie_fig, width="stretch")
 
-    # By year
-    st.subheader(f"Total Expenses by Year, {first_year}-{last_year}")
+    st.subheader(f"Compensation of Highest Paid Employees by Employee Name and Year, {first_year}-{last_year}")
 
-    data_format = st.radio("Select Format",["$ Amounts","Percentages"])
+    # each employee's first listing in the range
 
-    if data_format == "$ Amounts":
+    j_by_year = compensation_by_year(dataset, filing_ein, first_year, last_year)
 
-        st.dataframe(
-            df_filtered.style.format({
-                'Total Expenses': '${:,.0f}',
-                'Grants Given': '${:,.0f}',
-                'Independent Contractor Expenses': '${:,.0f}',
-                'Compensation For Leadership (Filing Org+Related Orgs)': '${:,.0f}',
-                'Compensation For Leadership (Filing Org)': '${:,.0f}'
-            }),
-            hide_index=True)
-    else:
-        st.dataframe(
-            df_filtered_perc.style.format({
-                'Grants Given (%)': '{:.2%}',
-                'Independent Contractor Expenses (%)': '{:.2%}',
-                'Compensation For Leadership (Filing Org+Related Orgs) (%)': '{:.2%}',
-                'Compensation For Leadership (Filing Org) (%)': '{:.2%}'
-            }),
-            hide_index=True)    
+    paged_table(j_by_year, key="compensation_by_year", column_config={
+        'total_compensation': DOLLARS,
+        'total_compensation_filing_org': DOLLARS
+        })
 
-    
-    st.header("Schedule I - Grants and Other Assistance to Organizations, Governments, and Individuals")
 
-    # filter for the selected filing org
+@st.fragment
+@stage("section: Compare Organizations")
+def league_section(filing_ein, filing_org, first_year, last_year):
 
-    st.subheader(f"Grants Awarded, {first_year}-{last_year}")
+    dataset = load_dataset(served_version())
+    league, league_index, summary = dataset.league, dataset.league_index, dataset.summary
 
-    # total amount 
-    
-    df_i_filtered = df_schedule_i[df_schedule_i['filing_org'] == filing_org]
+    range_start, range_end = st.session_state['years']
 
-    i_aggregate = df_i_filtered['grantee_cash_grant'].sum()
-    i_avg = i_aggregate/(int(last_year)-int(first_year))
+    st.header("Compare Organizations Across the Network")
 
-    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Total Grants Awarded: ${i_aggregate:,.2f}</h2>''', unsafe_allow_html=True)
-    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Total Grants Awarded (yearly average): ${i_avg:,.2f}</h2>''', unsafe_allow_html=True)
+    year_col, metric_col = st.columns(2)
+    with year_col:
+        league_years = [year for year in sorted(league_index, reverse=True) if range_start <= year <= range_end]
+        league_year = st.selectbox("Tax Year", league_years, index=league_years.index(last_year), key="league_year")
+    with metric_col:
+        metric = st.selectbox("Rank By", LEAGUE_METRICS, format_func=SUMMARY_COLUMNS.get, key="league_metric")
 
-    i_total = df_i_filtered.groupby(['grantee_business_name']).agg(
-        grantee_cash_grant=('grantee_cash_grant','sum')
-    ).reset_index()
+    label = SUMMARY_COLUMNS[metric]
 
-    i_total = i_total.sort_values(by='grantee_cash_grant',ascending=False)
+    # ratios, growth and ranks are precomputed for every org, so one year's table is a slice
 
-    bar,pie = st.columns(2)
+    league_table = org_rows(league, league_index, league_year)
+    league_table = league_table.sort_values(f'{metric}_rank', kind='stable')
 
-    # Take top 10 for bar chart
+    columns = {f'{metric}_rank': 'Rank', 'filing_org': 'Organization', 'filing_ein': 'EIN', metric: label}
+    if f'{metric}_growth' in league.columns:
+        columns[f'{metric}_growth'] = f'{label} Growth'
+    columns.update({ratio: SUMMARY_COLUMNS[ratio] for ratio in LEAGUE_METRICS if ratio.endswith('_perc') and ratio != metric})
+    league_table = league_table[list(columns)].rename(columns=columns)
 
-    i_total_top_10 = i_total.head(10)
+    st.subheader(f"{label}, All Organizations, {league_year}")
 
-    with bar:
+    paged_table(league_table, key="league", column_config={
+        'EIN': st.column_config.NumberColumn(format="%d"),
+        label: PERCENT if metric.endswith('_perc') else DOLLARS,
+        f'{label} Growth': PERCENT,
+        **{SUMMARY_COLUMNS[ratio]: PERCENT for ratio in LEAGUE_METRICS if ratio.endswith('_perc')}
+        })
 
-        fig = px.bar(i_total_top_10,
-            title=f"Top 10 Grant Amounts by Grantee Business Name, All Years", 
-            x='grantee_business_name', 
-            y='grantee_cash_grant',
-            labels={'grantee_business_name': 'Grantee Business Name', 'grantee_cash_grant': 'Grant Amount'},
-            height=600,
-            text_auto='.2s')
-        fig.update_traces(
-            hovertemplate='<b>%{x}</b><br>Grant Amount: $%{y:,.0f}<extra></extra>',
-            texttemplate='$%{y:,.0f}',
-            textposition='outside',
-            textfont_size=20,
-            marker=dict(line=dict(color='#000000', width=2)))
-        st.plotly_chart(fig, width="stretch")
+    # overlay a handful of orgs on shared charts
 
-    with pie:
-        fig = px.pie(i_total,values='grantee_cash_grant',
-        names='grantee_business_name',
-        title='Grant Distribution by Grantee Business Name, All Years',
-        height=700)
-        fig.update_traces(textfont_size=20,
-                  marker=dict(line=dict(color='#000000', width=2)))
+    st.subheader(f"{label} Over Time")
 
-        st.plotly_chart(fig, width="stretch")
+    filers = org_names(summary)
+    compare_eins = st.multiselect("Organizations to Compare", options=filers.index.tolist(), default=list(dict.fromkeys([filing_ein, IPI_EIN])),
+        format_func=filers.get, max_selections=10, key="league_orgs")
 
+    if not compare_eins:
+        st.info("Select one or more organizations to compare.")
+        return
 
-    # i_by_year = df_i_filtered.groupby(['tax_year','grantee_business_name']).agg(
-    #     grantee_cash_grant_total=('grantee_cash_grant','sum')
-    # ).reset_index()
-    
-    grantees = i_total['grantee_business_name'].tolist()
+    overlay = league[league['filing_ein'].isin(compare_eins) & league['tax_year'].between(range_start, range_end)]
+    value_fig, rank_fig = league_figures(served_version(), tuple(sorted(compare_eins)), metric, range_start, range_end, overlay)
 
-    # get grantees eins from df_schedule_i
+    values, ranks = st.columns(2)
 
-    df_schedule_i_grantees = df_schedule_i[df_schedule_i['grantee_business_name'].isin(grantees)]
+    with values:
+        st.plotly_chart(value_fig, width="stretch")
 
-    # group by business name and get first ein
-    df_schedule_i_grantees = df_schedule_i_grantees.groupby('grantee_business_name').first().reset_index()
+    with ranks:
+        st.plotly_chart(rank_fig, width="stretch")
 
-    # get unique grantee_eins
-    df_schedule_i_grantees = df_schedule_i_grantees.drop_duplicates(subset=['grantee_ein'])
-    grantee_lookup = df_schedule_i_grantees['grantee_ein'].tolist()
 
-    ipi_grantees = df_schedule_i[df_schedule_i['filing_ein'].isin(grantee_lookup)]
+# Global search
 
-    ipi_grantees = ipi_grantees[ipi_grantees['grantee_ein'] == 412057028]
+def jump_to_hit():
 
-    ipi_grantees_all = df_schedule_i[df_schedule_i['grantee_ein']== 412057028]
+    # selecting a hit switches the org picker and opens the tab that shows the match
 
-    ipi_grantees_all = ipi_grantees_all.sort_values(by='grantee_cash_grant',ascending=False)
+    rows = st.session_state['search_hits'].selection.rows
+    if rows:
+        hit = search_hits(served_version(), st.session_state['search']).iloc[rows[0]]
+        st.session_state['org'] = int(hit['filing_ein'])
+        st.session_state['section'] = hit['section']
 
-    ipi_grantees_all = ipi_grantees_all.groupby(['filing_org']).agg(
-        grantee_amt = ('grantee_cash_grant','sum')
-    ).reset_index()
 
+# reruns the page once an artifact has been warmed up
+@st.fragment(run_every=1)
+def wait_for(name):
 
-    ipi_grantees = ipi_grantees.groupby(['filing_org']).agg(
-        grantee_amt=('grantee_cash_grant','sum'),
-        grantee_name =('grantee_business_name','first')
-    ).reset_index()
+    if warmed(name):
+        st.rerun()
 
-    ipi_grantees = ipi_grantees['filing_org'].tolist()
 
-    # add total donations to IPI (sum ipi_grantees_all)
+def search_box():
 
-    ipi_total_donations = ipi_grantees_all['grantee_amt'].sum()
+    if not warmed('search index'):
+        st.text_input("Search Organizations, Grantees, Contractors and Employees", key="search", placeholder="Name or EIN", disabled=True)
+        st.caption("Search is available as soon as its index is built.")
+        wait_for('search index')
+        return
 
-    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">In total, organizations in IPI's networks donated: ${ipi_total_donations:,.2f} to IPI</h2>''', unsafe_allow_html=True)
+    query = st.text_input("Search Organizations, Grantees, Contractors and Employees", key="search", placeholder="Name or EIN")
+    if not query.strip():
+        return
 
-    st.header(f"Donations to IPI from Organizations that {filing_org} Donated To")
+    with stage("search"):
+        hits = search_hits(served_version(), query)
 
-    def highlight_rows(row):
-        if row['filing_org'] in ipi_grantees:
-            return ['background-color: yellow'] * len(row)
-        else:
-            return [''] * len(row)
+    if hits.empty:
+        st.caption(f'No matches for "{query}".')
+        return
 
-    ipi_grantees_all = ipi_grantees_all.sort_values(by='grantee_amt',ascending=False)
+    hits = hits[['name','kind','filing_org','filing_ein','amount','section']]
+    hits.columns = ['Match','Type','Organization','EIN','Amount','Tab']
 
     st.dataframe(
-        ipi_grantees_all.style.format({
-            'grantee_amt': '${:,.0f}'
-            }).apply(highlight_rows, axis=1),
-        hide_index=True)
+        hits,
+        column_config={
+            'EIN': st.column_config.NumberColumn(format="%d"),
+            'Amount': DOLLARS
+            },
+        hide_index=True,
+        on_select=jump_to_hit,
+        selection_mode="single-row",
+        key="search_hits")
+    st.caption("Select a row to open that organization and tab.")
 
 
-    st.subheader(f"All Grants Awarded by Grantee, {first_year}-{last_year}") 
+# Streamlit app title
 
-    st.dataframe(
-        i_total.style.format({
-            'grantee_cash_grant': '${:,.0f}'
-            }),
-        hide_index=True)
+def main():    
 
-    st.header("Part VII-B - Independent Contractors")
+    st.set_page_config(
+        page_title="Illinois Policy Institute 990 Data Explorer", 
+        layout="wide",
+        page_icon="💵",
+        initial_sidebar_state="collapsed"
+    )
 
-    # filter for the selected filing org
+    st.markdown('<h1 style="font-family:Arial, Helvetica, sans-serif;">Illinois Policy Institute (IPI) 990 Data Explorer</h1>', unsafe_allow_html=True)
+    st.markdown('''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">
+    
+We are using the IPI 990 Data Explorer to draw out key insights into how IPI spends it's money and the networks of non-profits and independent contractors IPI contributes to and is connected to. This will be used to inform our "follow an IPI dollar" research project.
 
-    df_viib_filtered = df_contractors[df_contractors['filing_org'] == filing_org]
+The IPI 990 Data Explorer combines data from about 3,000 IRS Form 990s filed by IPI, IPI's grantees, and the grantees of those grantees. Form 990s are IRS required returns for tax-exempt organizations. Using these forms we look at the following data between 2013-2024, one tab each below: 
+- total expenses; 
+- the amount of grants awarded to other organizations (Schedule I), and where those grants flow next;
+- independent contractor expenses (Part VII-B);
+- compensation information for certain officers, directors, trustees, key employees, and highest compensated employees (Schedule J); and
+- how every organization in the network ranks on these measures, year by year.</h2>
 
-    # repeat lines 205-245 for df_viib_filtered
+''',unsafe_allow_html=True)
 
-    viib_total = df_viib_filtered.groupby(['contractor_name']).agg(
-        contractor_amt=('contractor_amt','sum')
-    ).reset_index()
-    viib_total = viib_total.sort_values(by='contractor_amt',ascending=False)
+    start_run()
+    start_warm_up()
 
-    st.subheader(f"Independent Contractors by Contractor Name, Aggregate of All Years {first_year}-{last_year}")
+    # one year range for every section, and the total given in it. Both come from a
+    # read of two columns, so they show before the full dataset is ready
 
-    # Take top 10 for bar chart
+    with stage("headline"):
+        all_years, network_years, network_totals = load_overview(page_version())
+    range_start, range_end = st.slider("Tax Years", min_value=all_years[0], max_value=all_years[-1], value=(all_years[0], all_years[-1]), key="years")
 
-    viib_total = viib_total.head(10)
+    total_range = year_range_total(network_years, network_totals, range_start, range_end)
+    range_label = f"{range_start}" if range_start == range_end else f"{range_start}-{range_end}"
+    st.markdown(f'''<h2 style="font-size:20px; font-family:Arial, Helvetica, sans-serif;">Total Grants Given in the IPI Network ({range_label}): ${total_range:,.2f}</h2>''', unsafe_allow_html=True)
 
-    bar,pie = st.columns(2)
-    with bar:
-        fig = px.bar(viib_total,
-            title="Total Independent Contractor Amounts by Contractor Name", 
-            x='contractor_name', 
-            y='contractor_amt',
-            labels={'contractor_name': 'Contractor Name', 'contractor_amt': 'Contractor Amount'},
-            height=600,
-            text_auto='.2s')
-        fig.update_traces(
-            hovertemplate='<b>%{x}</b><br>Contractor Amount: $%{y:,.0f}<extra></extra>',
-            texttemplate='$%{y:,.0f}',
-            textposition='outside',
-            textfont_size=20,
-            marker=dict(line=dict(color='#000000', width=2)))
-        st.plotly_chart(fig, width="stretch")
+    # the rest of the page fills in once the dataset is warmed up
 
-    with pie:
-        fig = px.pie(viib_total,values='contractor_amt',
-        names='contractor_name',
-        title='Contractor Distribution by Contractor Name',
-        height=700)
-        fig.update_traces(textfont_size=20,
-                  marker=dict(line=dict(color='#000000', width=2)))
-        st.plotly_chart(fig, width="stretch")
-    
+    if not warmed('dataset'):
+        st.info("Loading the filings. The page fills in as soon as they are ready.")
+        wait_for('dataset')
+        panel()
+        return
 
-    viib_by_year = df_viib_filtered.groupby(['tax_year','contractor_name']).agg(
-        contractor_amt_total=('contractor_amt','sum')
-    ).reset_index()
+    with stage("load_dataset"):
+        dataset = load_dataset(served_version())
+    if dataset is None:
+        st.stop()
 
-    st.subheader(f"Independent Contractors by Year, {first_year}-{last_year}")
+    if updating():
+        st.info("Updated data is being loaded. You are seeing the previous version until it is ready.")
 
-    st.dataframe(
-        viib_by_year.style.format({
-            'contractor_amt_total': '${:,.0f}'
-            }),
-        hide_index=True)
+    summary = dataset.summary
 
-    st.header("Schedule J - Compensation Information for Certain Officers, Directors, Trustees, Key Employees, and Highest Compensated Employees")  
+    filers = org_names(summary)
 
-    # filter for the selected filing org and most recent tax year
+    search_box()
 
-    j_by_year = df_schedule_j[df_schedule_j['filing_org'] == filing_org]
-    # drop duplicates
-    j_by_year = j_by_year.drop_duplicates(subset=['compensation_name'])
-    df_j_filtered = df_schedule_j[(df_schedule_j['filing_org'] == filing_org) & (df_schedule_j['tax_year'] == "2024-12-31")]
-    df_j_filtered = df_j_filtered.drop_duplicates(subset=['compensation_name'])
+    # IPI until another org is picked here or through a search hit
 
-    j_total = df_j_filtered.copy()
+    st.session_state.setdefault('org', IPI_EIN)
 
-    j_total = j_total.sort_values(by='total_compensation',ascending=False)
+    filing_ein = st.selectbox("Select an IPI Grantee to Follow Their Money",options=filers.index.tolist(),format_func=filers.get,placeholder="ILLINOIS POLICY INSTITUTE",key="org")
+    filing_org = filers[filing_ein]
+    set_org(filing_ein)
 
-    st.subheader(f"Compensation of Highest Paid Employees by Employee Name, 2024")
+    # Title of Section
 
+    st.markdown(f"""<h1 style="font-family:Arial, Helvetica, sans-serif;">{filing_org}</h1>""", unsafe_allow_html=True)
 
-    bar,pie = st.columns(2)
-    with bar:
-        fig = px.bar(j_total,
-            title="Total Compensation of Highest Paid Employees by Employee Name (2024)", 
-            x='compensation_name', 
-            y='total_compensation',
-            labels={'compensation_name': 'Employee Name', 'total_compensation': 'Total Compensation'},
-            height=600,
-            text_auto='.2s')
-        fig.update_traces(
-            hovertemplate='<b>%{x}</b><br>Total Compensation: $%{y:,.0f}<extra></extra>',
-            texttemplate='$%{y:,.0f}',
-            textposition='outside',
-            textfont_size=20,
-            marker=dict(line=dict(color='#000000', width=2)))
-        st.plotly_chart(fig, width="stretch")
+    # the org's tax years within the range
 
-    with pie:
-        fig = px.pie(j_total,values='total_compensation',
-        names='compensation_name',
-        title='Compensation Distribution of Highest Paid Employees by Employee Name (2024)',
-        height=700)
-        fig.update_traces(textfont_size=20,
-                  marker=dict(line=dict(color='#000000', width=2)))
-        st.plotly_chart(fig, width="stretch")
+    years = org_years(summary, filing_ein, range_start, range_end)
+    if years is None:
+        st.info(f"{filing_org} has no filings between {range_start} and {range_end}.")
+        panel()
+        return
+    first_year, last_year = years
 
-    st.subheader(f"Compensation of Highest Paid Employees by Employee Name and Year, {first_year}-{last_year}")
+    # each section is its own fragment: widgets inside a section only rerun that section,
+    # and only the open tab is computed
 
-    j_by_year = j_by_year.sort_values(by='tax_year',ascending=True)
+    sections = {
+        "Total Expenses": total_expenses_section,
+        "Schedule I": schedule_i_section,
+        "Follow the Money": network_section,
+        "Part VII-B": contractors_section,
+        "Schedule J": schedule_j_section,
+        "Compare Organizations": league_section
+    }
 
-    j_by_year = j_by_year[['tax_year','compensation_name','compensation_title','total_compensation','total_compensation_filing_org']]
+    tabs = st.tabs(list(sections), key="section", on_change="rerun")
 
-    st.dataframe(
-        j_by_year.style.format({
-            'total_compensation': '${:,.0f}',
-            'total_compensation_filing_org': '${:,.0f}'
-            }),
-        hide_index=True)
+    for tab, section in zip(tabs, sections.values()):
+        with tab:
+            if tab.open:
+                section(filing_ein, filing_org, first_year, last_year)
 
-    # Show which organizations donate to each
+    panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+# Load test for the JSON API (api.py)
+#
+#   python bench/api_load.py --data-dir . --seconds 10 --clients 4 --output bench/results.jsonl
+#
+# Starts api.py on the data in --data-dir, in its own process pinned to one core
+# where the OS allows it, and drives it from --clients client processes (pinned
+# to the other cores) over keep-alive connections. Three passes are timed:
+#
+#   first       every URL requested once, so each response is computed
+#   repeat      the same URLs again for --seconds, served from the response cache
+#   revalidate  the same URLs for --seconds with If-None-Match, answered 304
+#
+# Requests per second and the median / p95 latency of each pass are printed and
+# appended to --output as JSON lines like bench/run.py's.
+
+import argparse
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from run import git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = os.path.join(ROOT, 'api.py')
+
+ORG_ENDPOINTS = ['', '/grantees', '/funders', '/contractors', '/compensation']
+
+
+def pin(cores):
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+
+def get(connection, url, etag=None):
+
+    connection.request('GET', url, headers={'If-None-Match': etag} if etag else {})
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, response.getheader('ETag'), body
+
+
+def wait_for_api(port, timeout=600):
+
+    # the first request builds the dataset
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            status, _, body = get(connection, '/orgs?limit=1000')
+            return connection, json.loads(body)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def load_urls(connection, first_page):
+
+    # every filing org's endpoints, every year's league table and every page of /orgs
+
+    orgs, total = first_page['items'], first_page['total']
+    while len(orgs) < total:
+        _, _, body = get(connection, f'/orgs?limit=1000&offset={len(orgs)}')
+        orgs.extend(json.loads(body)['items'])
+
+    _, _, body = get(connection, '/years')
+    years = [row['tax_year'] for row in json.loads(body)['items']]
+
+    urls = [f"/orgs/{org['ein']}{endpoint}" for org in orgs for endpoint in ORG_ENDPOINTS]
+    urls += [f'/years/{year}' for year in years]
+    urls += [f'/orgs?offset={offset}' for offset in range(0, total, 50)]
+    return urls
+
+
+def client(port, core, urls, etags, seconds):
+
+    # requests urls in turn for seconds (once each when seconds is None); returns
+    # the latency of each request and the number of failed ones
+
+    if core is not None:
+        pin({core})
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + (seconds or float('inf'))
+    position = 0
+    while time.perf_counter() < deadline and (seconds or position < len(urls)):
+        url = urls[position % len(urls)]
+        start = time.perf_counter()
+        status, _, _ = get(connection, url, etags.get(url))
+        latencies.append(time.perf_counter() - start)
+        failures += status not in (200, 304)
+        position += 1
+    return latencies, failures
+
+
+def run_pass(pool, port, cores, urls, etags, seconds, clients):
+
+    # urls split between the clients, each starting at a different place
+
+    shares = [urls[number::clients] for number in range(clients)]
+    start = time.perf_counter()
+    results = pool.starmap(client, [(port, cores[number % len(cores)] if cores else None, share, etags, seconds)
+                                    for number, share in enumerate(shares)])
+    elapsed = time.perf_counter() - start
+    latencies = [latency for share, _ in results for latency in share]
+    return len(latencies), sum(failures for _, failures in results), elapsed, latencies
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Load test the read-only JSON API')
+    parser.add_argument('--data-dir', default='.')
+    parser.add_argument('--port', type=int, default=8599)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'bench', 'results.jsonl'))
+    args = parser.parse_args()
+
+    # the server gets core 0 to itself, the clients share the rest
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+    server_core, client_cores = (cores[:1], cores[1:]) if len(cores) > 1 else (cores, [])
+
+    server = subprocess.Popen([sys.executable, API, '--port', str(args.port)], cwd=args.data_dir,
+                              preexec_fn=(lambda: pin(set(server_core))) if server_core else None)
+    try:
+        start = time.perf_counter()
+        connection, first_page = wait_for_api(args.port)
+        print(f"API up and dataset built in {time.perf_counter() - start:.2f}s")
+        urls = load_urls(connection, first_page)
+
+        meta = {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'urls': len(urls),
+            'clients': args.clients,
+            'server_cores': 1 if server_core else os.cpu_count(),
+            'shared_cores': not client_cores
+        }
+
+        with multiprocessing.Pool(args.clients) as pool, open(args.output, 'a') as out:
+            etags = {}
+            for stage, seconds in [('first', None), ('repeat', args.seconds), ('revalidate', args.seconds)]:
+                if stage == 'revalidate':
+                    etags = {url: get(connection, url)[1] for url in urls}
+
+                requests, failures, elapsed, latencies = run_pass(pool, args.port, client_cores, urls, etags, seconds, args.clients)
+                row = dict(meta, stage=f'api[{stage}]', requests=requests, failures=failures, rps=requests / elapsed,
+                           median_s=statistics.median(latencies), p95_s=float(np.percentile(latencies, 95)))
+                out.write(json.dumps(row) + '\n')
+                print(f"{row['stage']:<16} {requests:>8,} requests in {elapsed:6.2f}s  {row['rps']:9,.0f} req/s  "
+                      f"median {row['median_s'] * 1000:7.2f}ms  p95 {row['p95_s'] * 1000:7.2f}ms  ({failures} failed)")
+
+        if not client_cores:
+            print("Only one core available: the clients share it with the server, so these rates are a lower bound.")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Memory used per concurrent dashboard session
+#
+#   python bench/memory_report.py --sessions 1 5 10 25
+#
+# Run from the directory holding the data files. Every session is a headless
+# AppTest run of app.py inside this process, so they all share the one
+# published dataset. The first session starts the background warm-up
+# (loaders.py) and is measured once every warmed artifact is ready, as in
+# bench/run.py, so every session renders the full page. The report shows how
+# much each extra session keeps resident, and the peak extra memory allocated
+# while a session reruns.
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loaders
+
+APP = os.path.join(ROOT, 'app.py')
+
+MB = 2 ** 20
+
+
+def traced_mb():
+
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] / MB
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Memory used per concurrent dashboard session')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10, 25])
+    parser.add_argument('--section', default='Schedule I', help='dashboard tab every session opens')
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start = traced_mb()
+
+    sessions = []
+    first = None
+
+    print(f"{'sessions':>8} {'traced MB':>10} {'MB per extra session':>21} {'rerun peak MB':>14}")
+
+    for target in sorted(args.sessions):
+        rerun_peak = 0.0
+        while len(sessions) < target:
+            session = AppTest.from_file(APP, default_timeout=600)
+            session.session_state['section'] = args.section
+            if not sessions:
+                # the first run starts the warm-up and only shows the loading notice
+                session.run()
+                for name in loaders.WARM_UP:
+                    loaders.wait(name)
+            before = traced_mb()
+            tracemalloc.reset_peak()
+            session.run()
+            rerun_peak = max(rerun_peak, tracemalloc.get_traced_memory()[1] / MB - before)
+            if session.exception:
+                raise RuntimeError(session.exception[0].value)
+            if not session.tabs:
+                raise RuntimeError("the dashboard rendered without its tabs")
+            sessions.append(session)
+
+        current = traced_mb() - start
+        if first is None:
+            first = (target, current)
+        per_session = (current - first[1]) / (target - first[0]) if target > first[0] else 0.0
+        print(f"{target:>8} {current:>10.1f} {per_session:>21.2f} {rerun_peak:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# Benchmarks for XML ingestion, loading, name resolution, normalization, summaries, per-org selection and full reruns
+#
+#   python bench/run.py --scales 1 10 100 --output bench/results.jsonl
+#
+# For every scale a synthetic network is generated (bench/synthetic.py) into
+# --workdir, each stage is timed --repeat times, and one JSON line per stage
+# is appended to --output with the median time, so runs from different
+# releases can be compared.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+import data
+import entities
+import search
+from synthetic import IPI_EIN, generate, write_returns
+
+APP = os.path.join(ROOT, 'app.py')
+INGEST = os.path.join(ROOT, 'ingest.py')
+
+# typed into the global search box: a name, a short prefix, a common word and an EIN prefix
+
+SEARCH_QUERIES = ['illinois policy', 'in', 'foundation', 'person 1', '4120']
+
+# year range used for the per-org selection stage
+
+YEAR_RANGE = (2015, 2022)
+
+SECTIONS = ["Total Expenses", "Schedule I", "Follow the Money", "Part VII-B", "Schedule J", "Compare Organizations"]
+
+
+def git_commit():
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, repeat):
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def sample_orgs(df_schedule_i, n):
+
+    # the biggest grantors (worst case) plus a random handful
+
+    sizes = df_schedule_i['filing_ein'].value_counts()
+    largest = sizes.index[:n // 2].tolist()
+    rest = sizes.index[n // 2:].to_series().sample(min(n - len(largest), len(sizes) - len(largest)), random_state=0).tolist()
+    return largest + rest
+
+
+def select_org(dataset, ein):
+
+    # what a section does after the selectbox or the year range changes
+
+    first_year, last_year = YEAR_RANGE
+    summary = data.summary_range(dataset.summary.loc[[ein]], first_year, last_year)
+    i_total = data.range_totals(dataset.range_sums['schedule_i'], ein, first_year, last_year).sort_values('grantee_cash_grant', ascending=False)
+    viib_total = data.range_totals(dataset.range_sums['contractors'], ein, first_year, last_year)
+    j_total = data.range_totals(dataset.range_sums['schedule_j'], ein, first_year, last_year)
+    return len(summary) + len(i_total) + len(viib_total) + len(j_total)
+
+
+def dataset_memory(dataset):
+
+    # deep in-memory size of each published frame, in MB
+
+    frames = {name: getattr(dataset, name) for name in ['expenses', 'schedule_i', 'contractors', 'schedule_j', 'summary', 'league']}
+    frames.update({f'range_sums[{name}]': sums.rows for name, sums in dataset.range_sums.items()})
+    return {name: round(int(df.memory_usage(deep=True).sum()) / 2 ** 20, 3) for name, df in frames.items()}
+
+
+def app_runs(orgs, repeat):
+
+    from streamlit.testing.v1 import AppTest
+    import streamlit as st
+
+    import loaders
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+    # a cold start for each scale
+    for event in [loaders.WARM_UP_STARTED, *loaders.WARMED.values()]:
+        event.clear()
+
+    session = AppTest.from_file(APP, default_timeout=1800)
+    start = time.perf_counter()
+    session.run()
+    cold = time.perf_counter() - start
+    if session.exception:
+        raise RuntimeError(session.exception[0].value)
+
+    # the first run shows the page header and starts the warm-up; the page is
+    # complete once every warmed artifact is ready
+    for name in loaders.WARM_UP:
+        loaders.wait(name)
+    warm = time.perf_counter() - start
+    session.run()
+
+    reruns = {section: [] for section in SECTIONS}
+    for _ in range(repeat):
+        for ein in orgs:
+            for section in SECTIONS:
+                session.selectbox[0].set_value(ein)
+                session.session_state['section'] = section
+                start = time.perf_counter()
+                session.run()
+                reruns[section].append(time.perf_counter() - start)
+                if session.exception:
+                    raise RuntimeError(session.exception[0].value)
+
+    return cold, warm, reruns
+
+
+def run_scale(scale, args, record):
+
+    workdir = os.path.join(args.workdir, f"scale_{scale:g}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    start = time.perf_counter()
+    sizes = generate(workdir, scale, args.seed)
+    record(scale, 'generate', [time.perf_counter() - start], sizes)
+
+    if args.ingest:
+        returns_dir = os.path.join(workdir, 'returns')
+        write_returns(workdir, returns_dir)
+        command = [sys.executable, INGEST, returns_dir, '--out-dir', os.path.join(workdir, 'ingested'), '--workers', str(args.workers)]
+        times, _ = timed(lambda: subprocess.run(command, check=True, capture_output=True), args.repeat)
+        record(scale, 'ingest_xml', times, {'workers': args.workers, 'returns': sizes['filings']})
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        times, _ = timed(data.load_raw_data, args.repeat)
+        record(scale, 'load_sources', times)
+
+        times, _ = timed(lambda: [data.convert_source(path) for path in data.SCHEMAS], args.repeat)
+        record(scale, 'convert', times)
+
+        times, (mapping, names) = timed(entities.resolve_contractors, args.repeat)
+        mapping.to_csv(data.NAME_VARIANTS_FILE, index=False)
+        record(scale, 'resolve_names', times, {'names': names, 'variants': len(mapping)})
+
+        times, raw = timed(data.load_raw_data, args.repeat)
+        record(scale, 'load_converted', times)
+
+        def normalize():
+            frames = [df.copy() for df in raw]
+            org_names = data.build_org_names(*frames, data.load_org_overrides())
+            data.apply_org_names(*frames, org_names)
+            data.apply_name_variants(frames[2], 'contractor_name', mapping)
+            return frames
+
+        times, frames = timed(normalize, args.repeat)
+        record(scale, 'normalize_names', times)
+
+        times, _ = timed(lambda: data.build_summary(*frames), args.repeat)
+        record(scale, 'build_summary', times)
+
+        # only one copy of the data resident at a time from here on
+        del raw, frames
+
+        times, dataset = timed(data.build_dataset, args.repeat)
+        memory_mb = dataset_memory(dataset)
+        record(scale, 'build_dataset', times, {'memory_mb': memory_mb})
+        print(f"scale {scale:>5g}  dataset memory {sum(memory_mb.values()):.1f} MB  {memory_mb}")
+
+        orgs = sample_orgs(dataset.schedule_i, args.orgs)
+        if IPI_EIN not in orgs:
+            orgs[0] = IPI_EIN
+
+        per_org = []
+        for ein in orgs:
+            times, _ = timed(lambda: select_org(dataset, ein), args.repeat)
+            per_org.extend(times)
+        record(scale, 'select_org', per_org)
+
+        times, index = timed(lambda: search.build_search_index(dataset), args.repeat)
+        record(scale, 'search_index', times)
+
+        per_query = []
+        for query in SEARCH_QUERIES:
+            times, _ = timed(lambda: search.search(index, query), args.repeat)
+            per_query.extend(times)
+        record(scale, 'search_query', per_query)
+
+        if not args.skip_app:
+            cold, warm, reruns = app_runs(orgs[:args.app_orgs], 1)
+            record(scale, 'app_cold_run', [cold])
+            record(scale, 'app_warm_up', [warm])
+            for section, times in reruns.items():
+                record(scale, f"app_rerun[{section}]", times)
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the IPI 990 Data Explorer on synthetic data')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--orgs', type=int, default=20, help='orgs timed for per-org selection')
+    parser.add_argument('--app-orgs', type=int, default=3, help='orgs selected in the headless app reruns')
+    parser.add_argument('--skip-app', action='store_true', help='skip the headless Streamlit reruns')
+    parser.add_argument('--ingest', action='store_true', help='also time ingest.py on the filings written as XML returns')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='ingest.py worker processes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=os.path.join(ROOT, 'bench', 'data'))
+    parser.add_argument('--output', default=os.path.join(ROOT, 'bench', 'results.jsonl'))
+    args = parser.parse_args()
+
+    meta = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__
+    }
+
+    with open(args.output, 'a') as out:
+
+        def record(scale, stage, times, extra=None):
+            row = dict(meta, scale=scale, stage=stage, runs=len(times),
+                       median_s=statistics.median(times), p95_s=float(np.percentile(times, 95)), **(extra or {}))
+            out.write(json.dumps(row) + '\n')
+            out.flush()
+            print(f"scale {scale:>5g}  {stage:<28} median {row['median_s']:8.4f}s  p95 {row['p95_s']:8.4f}s  ({len(times)} runs)")
+
+        for scale in args.scales:
+            run_scale(scale, args, record)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# Synthetic 990 network generator for the benchmarks
+#
+#   python bench/synthetic.py OUT_DIR --scale 10
+#
+# Writes total_expenses.csv, schedule_i.parquet, part_vii_b.csv and
+# schedule_j.csv with the same columns as the real files (including the
+# unnamed index column and the unused address / filing_org_temp fields). At
+# scale 1 the network is about the size of the real one (~600 filers,
+# ~3,500 filings); grant counts, grantee popularity and contractor
+# popularity follow heavy tailed distributions so a few orgs dominate, like
+# the real data.
+
+import argparse
+import os
+import shutil
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+IPI_EIN = 412057028
+
+# orgs whose filings carry no name (see org_overrides.csv)
+
+UNNAMED_EINS = [133859811, 221539721, 391134735]
+
+FILERS_PER_SCALE = 600
+GRANTEE_ONLY_PER_FILER = 3
+CONTRACTORS_PER_SCALE = 4000
+
+YEARS = np.arange(2013, 2025)
+
+WORDS = np.array([
+    'AMERICAN', 'FOUNDATION', 'INSTITUTE', 'POLICY', 'FREEDOM', 'LIBERTY', 'EDUCATION', 'CENTER',
+    'FUND', 'ALLIANCE', 'TRUST', 'COUNCIL', 'SOCIETY', 'NATIONAL', 'CHARITABLE', 'PROJECT',
+    'ILLINOIS', 'MIDWEST', 'FAMILY', 'RESEARCH', 'ACTION', 'COMMUNITY', 'HERITAGE', 'PROSPERITY'
+])
+
+SUFFIXES = np.array(['INC', 'LLC', 'CORP', 'CO', 'GROUP', 'LLP'])
+
+STATES = np.array(['IL', 'NY', 'CA', 'TX', 'VA', 'DC', 'MI', 'WI', 'OH', 'FL'])
+
+
+def random_names(rng, n, suffixes=None):
+
+    words = WORDS[rng.integers(0, len(WORDS), size=(n, 3))]
+    names = pd.Series(words[:, 0]) + ' ' + words[:, 1] + ' ' + words[:, 2] + ' ' + pd.Series(np.arange(n)).astype(str)
+    if suffixes is not None:
+        names = names + ' ' + suffixes[rng.integers(0, len(suffixes), n)]
+    return names.to_numpy(dtype=object)
+
+
+def random_eins(rng, n, exclude):
+
+    eins = np.unique(rng.integers(10_000_000, 999_999_999, size=int(n * 1.1) + 10))
+    eins = eins[~np.isin(eins, exclude)]
+    return rng.permutation(eins)[:n]
+
+
+def skewed_choice(rng, n_choices, size, a=1.3):
+
+    # zipf-like popularity: low ids are picked far more often than high ones
+
+    return np.minimum(rng.zipf(a, size) - 1, n_choices - 1)
+
+
+def with_index_column(df):
+
+    # the real CSVs were written with pandas' default index
+
+    return df.reset_index(drop=True).reset_index().rename(columns={'index': ''})
+
+
+def name_variants(rng, names, rate=0.1):
+
+    # lower case / trailing punctuation variants, as different filers spell the same org
+
+    names = names.copy()
+    pick = rng.random(len(names)) < rate
+    lower = pick & (rng.random(len(names)) < 0.5)
+    names[lower] = [name.lower() if isinstance(name, str) else name for name in names[lower]]
+    dotted = pick & ~lower
+    names[dotted] = [name + '.' if isinstance(name, str) else name for name in names[dotted]]
+    return names
+
+
+def generate(out_dir, scale=1, seed=0):
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    n_filers = max(int(FILERS_PER_SCALE * scale), 10)
+    fixed = np.array([IPI_EIN] + UNNAMED_EINS)
+
+    filer_eins = np.concatenate([fixed, random_eins(rng, n_filers - len(fixed), fixed)])
+    grantee_only_eins = random_eins(rng, n_filers * GRANTEE_ONLY_PER_FILER, filer_eins)
+    all_eins = np.concatenate([filer_eins, grantee_only_eins])
+
+    all_names = random_names(rng, len(all_eins), SUFFIXES[:1])
+    all_names[0] = 'ILLINOIS POLICY INSTITUTE'
+    name_of = dict(zip(all_eins.tolist(), all_names))
+
+    # filings: each filer files for a run of consecutive years, fiscal year ending June or December
+
+    n_years = rng.integers(1, len(YEARS) + 1, n_filers)
+    n_years[0] = len(YEARS)
+    first_year = YEARS[-1] - n_years + 1
+    fiscal_end = np.where(rng.random(n_filers) < 0.3, '-06-30', '-12-31')
+    fiscal_end[0] = '-12-31'
+
+    filing_filer = np.repeat(np.arange(n_filers), n_years)
+    filing_year = first_year[filing_filer] + (np.arange(len(filing_filer)) - np.repeat(np.cumsum(n_years) - n_years, n_years))
+    filing_ein = filer_eins[filing_filer]
+    filing_tax_year = pd.Series(filing_year.astype(str)) + fiscal_end[filing_filer]
+    filing_org = all_names[filing_filer].copy()
+    filing_org[np.isin(filing_ein, UNNAMED_EINS)] = None
+    filing_org = name_variants(rng, filing_org, rate=0.05)
+
+    org_size = rng.lognormal(16.5, 2.0, n_filers)
+    n_filings = len(filing_filer)
+
+    # total expenses
+
+    expenses = pd.DataFrame({
+        'filing_org': filing_org,
+        'filing_ein': filing_ein,
+        'tax_year': filing_tax_year,
+        'tot_expenses': (org_size[filing_filer] * rng.lognormal(0, 0.2, n_filings)).round().astype('int64'),
+        'filing_org_temp': np.where(filing_org == None, all_names[filing_filer], None)
+    })
+    with_index_column(expenses).to_csv(os.path.join(out_dir, 'total_expenses.csv'), index=False)
+
+    # Schedule I: grants per filing are heavy tailed, grantees are picked by popularity
+
+    grants_per_filing = np.minimum(rng.zipf(1.8, n_filings), 2000)
+    grant_filing = np.repeat(np.arange(n_filings), grants_per_filing)
+    grantee = skewed_choice(rng, len(all_eins), len(grant_filing), a=1.2)
+    grantee = rng.permutation(len(all_eins))[grantee]
+    grantee_ein = all_eins[grantee].astype('float64')
+
+    to_ipi = rng.random(len(grant_filing)) < 0.01
+    grantee_ein[to_ipi] = IPI_EIN
+    individuals = rng.random(len(grant_filing)) < 0.02
+    grantee_ein[individuals] = np.nan
+
+    grantee_name = np.array([name_of.get(int(ein)) if ein == ein else None for ein in grantee_ein], dtype=object)
+    grantee_name = name_variants(rng, grantee_name)
+
+    schedule_i = pd.DataFrame({
+        'filing_org': filing_org[grant_filing],
+        'filing_ein': filing_ein[grant_filing],
+        'tax_year': filing_tax_year.to_numpy()[grant_filing],
+        'grantee_business_name': grantee_name,
+        'grantee_ein': pd.array(grantee_ein, dtype='Int64'),
+        'grantee_cash_grant': rng.lognormal(10, 1.5, len(grant_filing)).round()
+    })
+    schedule_i.to_parquet(os.path.join(out_dir, 'schedule_i.parquet'), index=False)
+
+    # Part VII-B: up to five contractors per filing, drawn from a popularity skewed pool
+
+    n_contractors = max(int(CONTRACTORS_PER_SCALE * scale), 10)
+    contractor_names = name_variants(rng, random_names(rng, n_contractors, SUFFIXES[1:]))
+    contractor_names[rng.random(n_contractors) < 0.2] = None
+    contractor_state = STATES[rng.integers(0, len(STATES), n_contractors)]
+    contractor_zip = rng.integers(10000, 99999, n_contractors).astype('float64')
+
+    contractors_per_filing = rng.integers(0, 6, n_filings)
+    contract_filing = np.repeat(np.arange(n_filings), contractors_per_filing)
+    contractor = skewed_choice(rng, n_contractors, len(contract_filing), a=1.1)
+
+    contractors = pd.DataFrame({
+        'filing_org': filing_org[contract_filing],
+        'filing_ein': filing_ein[contract_filing],
+        'tax_year': filing_tax_year.to_numpy()[contract_filing],
+        'contractor_name': contractor_names[contractor],
+        'contractor_amt': rng.lognormal(12.5, 1.0, len(contract_filing)).round(),
+        'contractor_address': [f"{number} MAIN ST" for number in rng.integers(1, 9999, len(contract_filing))],
+        'contractor_city': 'CHICAGO',
+        'contractor_state': contractor_state[contractor],
+        'contractor_zip': contractor_zip[contractor],
+        'contractor_description': 'CONSULTING',
+        'filing_org_temp': None
+    })
+    with_index_column(contractors).to_csv(os.path.join(out_dir, 'part_vii_b.csv'), index=False)
+
+    # Schedule J: one to ten compensated people per filing, mostly the same people every year
+
+    people_per_filing = rng.integers(1, 11, n_filings)
+    person_filing = np.repeat(np.arange(n_filings), people_per_filing)
+    person = np.arange(len(person_filing)) - np.repeat(np.cumsum(people_per_filing) - people_per_filing, people_per_filing)
+    compensation = rng.lognormal(12.5, 0.8, len(person_filing)).round()
+
+    schedule_j = pd.DataFrame({
+        'filing_org': filing_org[person_filing],
+        'filing_ein': filing_ein[person_filing],
+        'tax_year': filing_tax_year.to_numpy()[person_filing],
+        'compensation_name': [f"PERSON {filer} {number}" for filer, number in zip(filing_filer[person_filing], person)],
+        'compensation_title': np.where(person == 0, 'PRESIDENT', 'DIRECTOR'),
+        'total_compensation': compensation,
+        'total_compensation_filing_org': (compensation * rng.uniform(0.7, 1.0, len(person_filing))).round()
+    })
+    with_index_column(schedule_j).to_csv(os.path.join(out_dir, 'schedule_j.csv'), index=False)
+
+    # the override table ships with the app, the benchmarks need it next to the data
+
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'org_overrides.csv'), out_dir)
+
+    return {
+        'filers': n_filers,
+        'filings': n_filings,
+        'schedule_i_rows': len(schedule_i),
+        'contractor_rows': len(contractors),
+        'schedule_j_rows': len(schedule_j)
+    }
+
+
+def xml_fields(row, fields):
+
+    return ''.join(f"<{tag}>{escape(str(row[column]))}</{tag}>" for column, tag in fields if not pd.isna(row[column]))
+
+
+def write_returns(data_dir, returns_dir):
+
+    # one IRS e-file style Form 990 XML return per filing in data_dir, for ingest.py
+
+    os.makedirs(returns_dir, exist_ok=True)
+    expenses = pd.read_csv(os.path.join(data_dir, 'total_expenses.csv'), index_col=0)
+    frames = {
+        'schedule_i': pd.read_parquet(os.path.join(data_dir, 'schedule_i.parquet')),
+        'contractors': pd.read_csv(os.path.join(data_dir, 'part_vii_b.csv'), index_col=0),
+        'schedule_j': pd.read_csv(os.path.join(data_dir, 'schedule_j.csv'), index_col=0)
+    }
+    groups = {name: dict(list(df.groupby(['filing_ein', 'tax_year']))) for name, df in frames.items()}
+    empty = pd.DataFrame()
+
+    for number, filing in enumerate(expenses.itertuples(index=False)):
+        key = (filing.filing_ein, filing.tax_year)
+        name = filing.filing_org if isinstance(filing.filing_org, str) else ''
+
+        grants = ''.join(
+            "<RecipientTable>"
+            + (f"<RecipientEIN>{int(row['grantee_ein']):09d}</RecipientEIN>" if not pd.isna(row['grantee_ein']) else "")
+            + "<RecipientBusinessName>" + xml_fields(row, [('grantee_business_name', 'BusinessNameLine1Txt')]) + "</RecipientBusinessName>"
+            + f"<CashGrantAmt>{row['grantee_cash_grant']:.0f}</CashGrantAmt></RecipientTable>"
+            for row in groups['schedule_i'].get(key, empty).to_dict('records'))
+        contractors = ''.join(
+            "<ContractorCompensationGrp><ContractorName><BusinessName>"
+            + xml_fields(row, [('contractor_name', 'BusinessNameLine1Txt')]) + "</BusinessName></ContractorName>"
+            + "<ContractorAddress><USAddress>"
+            + xml_fields(row, [('contractor_address', 'AddressLine1Txt'), ('contractor_city', 'CityNm'), ('contractor_state', 'StateAbbreviationCd')])
+            + f"<ZIPCd>{row['contractor_zip']:05.0f}</ZIPCd></USAddress></ContractorAddress>"
+            + xml_fields(row, [('contractor_description', 'ServicesDesc')])
+            + f"<CompensationAmt>{row['contractor_amt']:.0f}</CompensationAmt></ContractorCompensationGrp>"
+            for row in groups['contractors'].get(key, empty).to_dict('records'))
+        people = ''.join(
+            "<RltdOrgOfficerTrstKeyEmplGrp>" + xml_fields(row, [('compensation_name', 'PersonNm'), ('compensation_title', 'TitleTxt')])
+            + f"<TotalCompensationFilingOrgAmt>{row['total_compensation_filing_org']:.0f}</TotalCompensationFilingOrgAmt>"
+            + f"<TotalCompensationRltdOrgsAmt>{row['total_compensation'] - row['total_compensation_filing_org']:.0f}</TotalCompensationRltdOrgsAmt>"
+            + "</RltdOrgOfficerTrstKeyEmplGrp>"
+            for row in groups['schedule_j'].get(key, empty).to_dict('records'))
+
+        document = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<Return xmlns="http://www.irs.gov/efile" returnVersion="2022v5.0"><ReturnHeader>'
+            f"<ReturnTs>{filing.tax_year[:4]}-11-15T09:00:00-05:00</ReturnTs>"
+            f"<TaxPeriodEndDt>{filing.tax_year}</TaxPeriodEndDt><ReturnTypeCd>990</ReturnTypeCd>"
+            f"<Filer><EIN>{filing.filing_ein:09d}</EIN><BusinessName><BusinessNameLine1Txt>{escape(name)}</BusinessNameLine1Txt></BusinessName></Filer>"
+            '</ReturnHeader><ReturnData>'
+            f"<IRS990><CYTotalExpensesAmt>{filing.tot_expenses}</CYTotalExpensesAmt>{contractors}</IRS990>"
+            f"<IRS990ScheduleI>{grants}</IRS990ScheduleI>"
+            f"<IRS990ScheduleJ>{people}</IRS990ScheduleJ>"
+            '</ReturnData></Return>')
+        with open(os.path.join(returns_dir, f"{number:09d}_public.xml"), 'w') as out:
+            out.write(document)
+
+    return len(expenses)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic 990 network')
+    parser.add_argument('out_dir')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--returns-dir', help='also write the filings as e-file XML returns here')
+    args = parser.parse_args()
+
+    print(generate(args.out_dir, args.scale, args.seed))
+    if args.returns_dir:
+        print(f"{write_returns(args.out_dir, args.returns_dir):,} returns written to {args.returns_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Plotly figure builders shared by the dashboard sections
+#
+# Pie inputs are capped at TOP_N slices plus an aggregated "Other" slice so the
+# figure payload stays bounded no matter how many grantees or contractors an
+# org has.
+
+import os
+
+import pandas as pd
+import plotly.express as px
+
+TOP_N = int(os.environ.get('IPI_CHART_TOP_N', 20))
+
+OTHER_LABEL = 'Other'
+
+
+def top_n(df, names, values, n=TOP_N):
+
+    # largest n rows by values, with everything else rolled up into one "Other" row
+
+    df = df.sort_values(by=values, ascending=False)
+    if len(df) <= n:
+        return df
+
+    other = pd.DataFrame({names: [OTHER_LABEL], values: [df[values].iloc[n:].sum()]})
+    return pd.concat([df[[names, values]].head(n), other], ignore_index=True)
+
+
+def bar_chart(df, title, x, y, labels, hover_label, height=600):
+
+    fig = px.bar(df,
+        title=title,
+        x=x,
+        y=y,
+        labels=labels,
+        height=height,
+        text_auto='.2s')
+    fig.update_traces(
+        hovertemplate=f'<b>%{{x}}</b><br>{hover_label}: $%{{y:,.0f}}<extra></extra>',
+        texttemplate='$%{y:,.0f}',
+        textposition='outside',
+        textfont_size=20,
+        marker=dict(line=dict(color='#000000', width=2)))
+    return fig
+
+
+def pie_chart(df, values, names, title, height=700):
+
+    fig = px.pie(df,values=values,
+    names=names,
+    title=title,
+    height=height)
+    fig.update_traces(textfont_size=20,
+              marker=dict(line=dict(color='#000000', width=2)))
+    return fig
+
+
+def line_chart(df, title, x, y, color, labels, hover_format, height=600):
+
+    # one line per org, for overlaying several orgs on shared axes
+
+    fig = px.line(df,
+        title=title,
+        x=x,
+        y=y,
+        color=color,
+        labels=labels,
+        height=height,
+        markers=True)
+    fig.update_traces(
+        hovertemplate=f'<b>%{{fullData.name}}</b><br>%{{x}}: %{{y:{hover_format}}}<extra></extra>')
+    fig.update_xaxes(dtick=1)
+    return fig
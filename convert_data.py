@@ -0,0 +1,25 @@
+# Convert the four source datasets into typed, column-pruned Parquet files
+#
+#   python convert_data.py
+#
+# Writes parquet/<dataset>.parquet next to the source files. load_data() picks
+# the converted files up automatically and falls back to the sources when a
+# converted file is missing or older than its source.
+
+import time
+
+from data import PARQUET_DIR, SCHEMAS, convert_source, parquet_path
+
+
+def main():
+
+    for path in SCHEMAS:
+        start = time.perf_counter()
+        rows = convert_source(path)
+        print(f"{path} -> {parquet_path(path)}: {rows:,} rows in {time.perf_counter() - start:.2f}s")
+
+    print(f"Converted files written to {PARQUET_DIR}/")
+
+
+if __name__ == "__main__":
+    main()
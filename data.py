@@ -0,0 +1,664 @@
+# Data loading and preparation for the IPI 990 Data Explorer
+#
+# Everything in here is plain pandas so it can be reused outside of Streamlit.
+# app.py wraps these functions in Streamlit caches keyed by data_version().
+
+import hashlib
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# frames are shared read-only between sessions; with copy-on-write (always on from
+# pandas 3) slices of them are views and any write copies instead of leaking back
+
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+EXPENSES_FILE = 'total_expenses.csv'
+SCHEDULE_I_FILE = 'schedule_i.parquet'
+CONTRACTORS_FILE = 'part_vii_b.csv'
+SCHEDULE_J_FILE = 'schedule_j.csv'
+
+# EIN -> display name for orgs whose filings are missing a name
+
+ORG_OVERRIDES_FILE = 'org_overrides.csv'
+
+# spelling variant -> canonical name per name column, written by entities.py
+
+NAME_VARIANTS_FILE = 'name_variants.csv'
+
+# typed, column-pruned Parquet copies of the four datasets written by convert_data.py
+
+PARQUET_DIR = 'parquet'
+
+# columns the dashboard uses from each dataset and their on-disk types.
+# rows are sorted by filing_ein so EIN filters can skip whole row groups
+
+SCHEMAS = {
+    EXPENSES_FILE: pa.schema([
+        ('filing_ein', pa.int64()),
+        ('tax_year', pa.date32()),
+        ('filing_org', pa.string()),
+        ('tot_expenses', pa.float64())
+    ]),
+    SCHEDULE_I_FILE: pa.schema([
+        ('filing_ein', pa.int64()),
+        ('tax_year', pa.date32()),
+        ('filing_org', pa.string()),
+        ('grantee_ein', pa.int64()),
+        ('grantee_business_name', pa.string()),
+        ('grantee_cash_grant', pa.float64())
+    ]),
+    CONTRACTORS_FILE: pa.schema([
+        ('filing_ein', pa.int64()),
+        ('tax_year', pa.date32()),
+        ('filing_org', pa.string()),
+        ('contractor_name', pa.string()),
+        ('contractor_amt', pa.float64())
+    ]),
+    SCHEDULE_J_FILE: pa.schema([
+        ('filing_ein', pa.int64()),
+        ('tax_year', pa.date32()),
+        ('filing_org', pa.string()),
+        ('compensation_name', pa.string()),
+        ('compensation_title', pa.string()),
+        ('total_compensation', pa.float64()),
+        ('total_compensation_filing_org', pa.float64())
+    ])
+}
+
+# name columns are dictionary encoded on disk
+
+DICTIONARY_COLUMNS = ['filing_org', 'grantee_business_name', 'contractor_name', 'compensation_name', 'compensation_title']
+
+ROW_GROUP_SIZE = 16384
+
+# in-memory dtypes. EINs are nine digit numbers and fit in 32 bits (grantee EINs can be
+# missing), tax years are the calendar year the tax period ends in, and name columns
+# are categoricals so each distinct name is stored once per frame
+
+EIN_DTYPES = {'filing_ein': 'uint32', 'grantee_ein': 'UInt32'}
+
+AMOUNT_COLUMNS = ['tot_expenses', 'grantee_cash_grant', 'contractor_amt', 'total_compensation', 'total_compensation_filing_org']
+
+
+def parquet_path(path):
+
+    return os.path.join(PARQUET_DIR, os.path.splitext(os.path.basename(path))[0] + '.parquet')
+
+
+DATA_FILES = [EXPENSES_FILE, SCHEDULE_I_FILE, CONTRACTORS_FILE, SCHEDULE_J_FILE, ORG_OVERRIDES_FILE, NAME_VARIANTS_FILE] + [parquet_path(path) for path in SCHEMAS]
+
+# precomputed org x tax_year summary, with the org versions it was built from so only
+# the orgs whose data changed are rebuilt
+
+SUMMARY_FILE = 'summary.parquet'
+
+SUMMARY_METRICS = ['total_expenses', 'grantee_cash_grant', 'contractor_amt', 'total_compensation', 'total_compensation_filing_org']
+
+
+# path -> (size, mtime, content hash) of the file as last seen, so each file is hashed
+# once per change on disk and only its latest fingerprint is kept
+
+FINGERPRINTS = {}
+
+FINGERPRINT_BLOCK = 2 ** 20
+
+
+def file_fingerprint(path, size, mtime):
+
+    seen = FINGERPRINTS.get(path)
+    if seen is None or seen[:2] != (size, mtime):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(FINGERPRINT_BLOCK), b''):
+                digest.update(block)
+        seen = FINGERPRINTS[path] = (size, mtime, digest.hexdigest())
+    return seen[2]
+
+
+def data_version():
+
+    # content fingerprint of every source file. Only a stat per file on each call; a file
+    # is re-hashed when its size or modification time changes, and anything cached on the
+    # version is rebuilt only when some file's content actually changed
+
+    version = []
+    for path in DATA_FILES:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            version.append((path, file_fingerprint(path, stat.st_size, stat.st_mtime_ns)))
+        else:
+            version.append((path, None))
+    return tuple(version)
+
+
+def read_source(path):
+
+    # original (untyped) file, pruned to the dashboard columns and cast to the schema types
+
+    schema = SCHEMAS[path]
+
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path, columns=schema.names)
+    else:
+        df = pd.read_csv(path, usecols=schema.names)
+
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors='coerce').astype('Int64')
+        elif pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors='coerce').astype('float64')
+        elif pa.types.is_date(field.type):
+            df[field.name] = pd.to_datetime(df[field.name]).dt.date
+
+    df = df.dropna(subset=['filing_ein'])
+    df['filing_ein'] = df['filing_ein'].astype('int64')
+    df = df.sort_values('filing_ein', kind='stable')
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def convert_source(path):
+
+    table = read_source(path)
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    pq.write_table(
+        table,
+        parquet_path(path),
+        row_group_size=ROW_GROUP_SIZE,
+        use_dictionary=[name for name in table.column_names if name in DICTIONARY_COLUMNS],
+        compression='zstd')
+    return table.num_rows
+
+
+def converted_is_fresh(path):
+
+    converted = parquet_path(path)
+    return os.path.exists(converted) and os.stat(converted).st_mtime_ns >= os.stat(path).st_mtime_ns
+
+
+def read_dataset(path, columns=None, eins=None):
+
+    # read the converted Parquet copy when it is up to date, only the requested columns
+    # and (with eins) only the row groups that can contain those filers
+
+    filters = [('filing_ein', 'in', list(eins))] if eins is not None else None
+
+    if converted_is_fresh(path):
+        table = pq.read_table(parquet_path(path), columns=columns, filters=filters)
+    else:
+        table = read_source(path)
+        if columns is not None:
+            table = table.select(columns)
+        if filters is not None:
+            table = table.filter(pc.is_in(table['filing_ein'], pa.array(list(eins), pa.int64())))
+
+    if 'tax_year' in table.column_names:
+        tax_year = pc.year(table['tax_year']).cast(pa.int16())
+        table = table.set_column(table.column_names.index('tax_year'), 'tax_year', tax_year)
+
+    # arrow backed strings are converted without a Python object per value
+
+    return compact_frame(table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get))
+
+
+def compact_amounts(values):
+
+    # whole dollar amounts are stored as 32 bit unsigned integers when they fit, which
+    # sums still add up exactly (pandas sums them as 64 bit). Missing, negative,
+    # fractional or larger amounts stay 64 bit
+
+    if values.isna().any():
+        return values
+    if len(values) and ((values % 1 != 0).any() or values.min() < 0):
+        return values
+    if len(values) == 0 or values.max() < 2 ** 32:
+        return values.astype('uint32')
+    return values.astype('int64')
+
+
+def compact_frame(df):
+
+    for column in df.columns:
+        if column in EIN_DTYPES:
+            df[column] = df[column].astype(EIN_DTYPES[column])
+        elif column in AMOUNT_COLUMNS:
+            df[column] = compact_amounts(df[column])
+        elif column in DICTIONARY_COLUMNS:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def load_raw_data(eins=None):
+
+    # the four files are read concurrently: Parquet and CSV decoding run in Arrow and
+    # the pandas C parser, outside the GIL
+
+    paths = [EXPENSES_FILE, SCHEDULE_I_FILE, CONTRACTORS_FILE, SCHEDULE_J_FILE]
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        df_expenses, df_schedule_i, df_contractors, df_schedule_j = pool.map(lambda path: read_dataset(path, eins=eins), paths)
+    return df_expenses, df_schedule_i, df_contractors, df_schedule_j
+
+
+def load_org_overrides():
+
+    if not os.path.exists(ORG_OVERRIDES_FILE):
+        return pd.Series(dtype=object, name='filing_org')
+
+    overrides = pd.read_csv(ORG_OVERRIDES_FILE, dtype={'filing_ein': 'int64', 'filing_org': object})
+    return overrides.set_index('filing_ein')['filing_org']
+
+
+def load_name_variants():
+
+    if not os.path.exists(NAME_VARIANTS_FILE):
+        return pd.DataFrame(columns=['column', 'variant', 'canonical'])
+
+    return pd.read_csv(NAME_VARIANTS_FILE, dtype=str, keep_default_na=False)
+
+
+def apply_name_variants(df, column, variants):
+
+    # merge the categories of a name column into their canonical spellings. Only the
+    # category table is remapped, so this costs the same however many rows use a name
+
+    mapping = variants[variants['column'] == column].set_index('variant')['canonical']
+    if mapping.empty:
+        return
+
+    categories = df[column].cat.categories
+    names = mapping.reindex(categories).fillna(pd.Series(categories, index=categories))
+    dtype = pd.CategoricalDtype(np.sort(names.unique()))
+    codes = dtype.categories.get_indexer(names)
+
+    old = df[column].cat.codes.to_numpy()
+    df[column] = pd.Categorical.from_codes(np.where(old >= 0, codes[old], -1), dtype=dtype)
+
+
+def build_org_names(df_expenses, df_schedule_i, df_contractors, df_schedule_j, overrides):
+
+    # canonical organization dimension: integer EIN -> upper case display name
+    # filer names win over the names grantors wrote on Schedule I, and the first
+    # non-missing name is used when an org is spelled differently across years
+
+    frames = [
+        df[['filing_ein', 'filing_org']]
+        for df in (df_expenses, df_schedule_i, df_schedule_j, df_contractors)
+    ]
+    frames.append(df_schedule_i[['grantee_ein', 'grantee_business_name']].set_axis(['filing_ein', 'filing_org'], axis=1))
+
+    names = pd.concat(frames, ignore_index=True).dropna(subset=['filing_ein'])
+    names['filing_ein'] = names['filing_ein'].astype('int64')
+    names = names.groupby('filing_ein', sort=False)['filing_org'].first()
+
+    # manual fixes for orgs that do not have filing names
+
+    names = overrides.combine_first(names)
+    names = names.str.upper()
+    names.index.name = 'filing_ein'
+    names.name = 'filing_org'
+    return names
+
+
+def apply_org_names(df_expenses, df_schedule_i, df_contractors, df_schedule_j, org_names):
+
+    # in all data frames replace the filing org (and grantee) name with the canonical name.
+    # The name columns share one categorical dtype built from the org dimension, so
+    # every org name is stored once no matter how many frames and rows refer to it
+
+    dtype = org_name_dtype(org_names)
+    name_codes = dtype.categories.get_indexer(org_names)
+
+    def canonical(eins):
+        pos = org_names.index.get_indexer(eins)
+        codes = np.where(pos >= 0, name_codes[pos], -1)
+        return pd.Categorical.from_codes(codes, dtype=dtype)
+
+    for df in (df_expenses, df_schedule_i, df_contractors, df_schedule_j):
+        df['filing_org'] = canonical(df['filing_ein'])
+
+    df_schedule_i['grantee_business_name'] = canonical(df_schedule_i['grantee_ein'])
+
+
+def org_name_dtype(org_names):
+
+    return pd.CategoricalDtype(np.sort(org_names.dropna().unique()))
+
+
+def build_org_index(df, key='filing_ein'):
+
+    # EIN -> (start, stop) row positions, so one org's rows are a slice
+    # instead of a full-table comparison. df must be sorted by key
+
+    eins = df[key].to_numpy()
+    if len(eins) == 0:
+        return {}
+
+    bounds = np.flatnonzero(np.diff(eins)) + 1
+    starts = np.r_[0, bounds]
+    stops = np.r_[bounds, len(eins)]
+    return dict(zip(eins[starts].tolist(), zip(starts.tolist(), stops.tolist())))
+
+
+def org_rows(df, org_index, ein):
+
+    start, stop = org_index.get(ein, (0, 0))
+    return df.iloc[start:stop]
+
+
+# running totals per org and counterparty over tax years. rows holds one sum per
+# (key, counterparty, tax year), sorted in that order, and cumulative the running
+# total of each value column down the whole table with a leading zero. The rows of one
+# (key, counterparty) pair in a year range are contiguous, so their total is the
+# difference of two cumulative entries, found by binary search on position
+
+RangeSums = namedtuple('RangeSums', ['rows', 'position', 'cumulative', 'index', 'key', 'counterparty', 'values'])
+
+YEAR_SLOTS = 2 ** 16
+
+
+def build_range_sums(df, key, counterparty, values):
+
+    # missing counterparties are kept as their own group, so totals over all
+    # counterparties still add up to the org total
+
+    rows = df.groupby([key, counterparty, 'tax_year'], observed=True, dropna=False)[values].sum().reset_index()
+
+    keys = rows[key].to_numpy('int64')
+    if isinstance(rows[counterparty].dtype, pd.CategoricalDtype):
+        counterparties = rows[counterparty].cat.codes.to_numpy('int64')
+    else:
+        counterparties = rows[counterparty].to_numpy('int64', na_value=-1)
+
+    pair = np.cumsum(np.r_[True, (np.diff(keys) != 0) | (np.diff(counterparties) != 0)][:len(rows)]) - 1
+    position = pair * YEAR_SLOTS + rows['tax_year'].to_numpy('int64')
+
+    cumulative = np.zeros((len(rows) + 1, len(values)))
+    np.cumsum(rows[values].to_numpy('float64'), axis=0, out=cumulative[1:])
+
+    return RangeSums(rows, position, cumulative, build_org_index(rows, key=key), key, counterparty, values)
+
+
+def range_totals(sums, ein, first_year, last_year):
+
+    # one row per counterparty of ein with its totals over first_year..last_year.
+    # Counterparties without rows in the range are left out
+
+    start, stop = sums.index.get(ein, (0, 0))
+    position = sums.position[start:stop]
+
+    firsts = np.flatnonzero(np.r_[True, np.diff(position // YEAR_SLOTS) != 0][:len(position)])
+    pairs = position[firsts] // YEAR_SLOTS * YEAR_SLOTS
+    lo = start + np.searchsorted(position, pairs + first_year, side='left')
+    hi = start + np.searchsorted(position, pairs + last_year, side='right')
+    found = hi > lo
+
+    totals = sums.rows.iloc[start + firsts[found]][[sums.key, sums.counterparty]].reset_index(drop=True)
+    totals[sums.values] = sums.cumulative[hi[found]] - sums.cumulative[lo[found]]
+    return totals
+
+
+def range_rows(sums, ein, first_year, last_year):
+
+    # ein's per counterparty and year sums within the range
+
+    rows = org_rows(sums.rows, sums.index, ein)
+    return rows[rows['tax_year'].between(first_year, last_year)]
+
+
+def build_all_range_sums(df_schedule_i, df_contractors, df_schedule_j):
+
+    # an employee listed more than once in a filing is counted once, as on the dashboard
+
+    compensation = df_schedule_j.drop_duplicates(subset=['filing_ein', 'compensation_name', 'tax_year'])
+
+    # funders are keyed by grantee: "who funds EIN X" for any X
+
+    grants = df_schedule_i.dropna(subset=['grantee_ein']).astype({'grantee_ein': 'uint32'})
+
+    return {
+        'schedule_i': build_range_sums(df_schedule_i, 'filing_ein', 'grantee_business_name', ['grantee_cash_grant']),
+        'contractors': build_range_sums(df_contractors, 'filing_ein', 'contractor_name', ['contractor_amt']),
+        'schedule_j': build_range_sums(compensation, 'filing_ein', 'compensation_name', ['total_compensation']),
+        'funders': build_range_sums(grants, 'grantee_ein', 'filing_ein', ['grantee_cash_grant'])
+    }
+
+
+def year_range_total(tax_years, cumulative, first_year, last_year):
+
+    # total over first_year..last_year from per year running totals (leading zero)
+
+    lo = np.searchsorted(tax_years, first_year, side='left')
+    hi = np.searchsorted(tax_years, last_year, side='right')
+    return cumulative[hi] - cumulative[lo]
+
+
+def prepare_data():
+
+    df_expenses, df_schedule_i, df_contractors, df_schedule_j = load_raw_data()
+
+    org_names = build_org_names(df_expenses, df_schedule_i, df_contractors, df_schedule_j, load_org_overrides())
+    apply_org_names(df_expenses, df_schedule_i, df_contractors, df_schedule_j, org_names)
+    apply_name_variants(df_contractors, 'contractor_name', load_name_variants())
+
+    # contiguous rows per filer (stable, so the original row order within an org is kept)
+
+    df_schedule_i, df_contractors, df_schedule_j = [
+        df if df['filing_ein'].is_monotonic_increasing else df.sort_values('filing_ein', kind='stable', ignore_index=True)
+        for df in (df_schedule_i, df_contractors, df_schedule_j)
+    ]
+
+    org_index = {
+        'schedule_i': build_org_index(df_schedule_i),
+        'contractors': build_org_index(df_contractors),
+        'schedule_j': build_org_index(df_schedule_j)
+    }
+
+    return df_expenses, df_schedule_i, df_contractors, df_schedule_j, org_names, org_index
+
+
+Dataset = namedtuple('Dataset', [
+    'expenses', 'schedule_i', 'contractors', 'schedule_j',
+    'org_names', 'org_index', 'org_versions', 'summary', 'range_sums', 'league', 'league_index'
+])
+
+
+def build_org_versions(df_expenses, df_schedule_i, df_contractors, df_schedule_j):
+
+    # content fingerprint per org: the wrapping sum of the hashes of every row the org
+    # filed, plus the Schedule I rows naming it as grantee. Rows are hashed after name
+    # normalization, so a renamed org or contractor changes the version too. Anything
+    # computed from one org's rows can be cached on its version and survives data
+    # updates that do not touch the org
+
+    parts = [
+        (df['filing_ein'], pd.util.hash_pandas_object(df, index=False))
+        for df in (df_expenses, df_schedule_i, df_contractors, df_schedule_j)
+    ]
+    grants = df_schedule_i.dropna(subset=['grantee_ein'])
+    parts.append((grants['grantee_ein'], pd.util.hash_pandas_object(grants, index=False)))
+
+    eins = np.concatenate([eins.to_numpy('int64') for eins, _ in parts])
+    hashes = np.concatenate([hashes.to_numpy('uint64') for _, hashes in parts])
+    return pd.Series(hashes, index=eins).groupby(level=0).sum().astype('uint64').rename_axis('filing_ein')
+
+
+def build_dataset():
+
+    # everything the dashboard reads, normalized, summarized and indexed before it is
+    # published. The frames are shared by every session and must not be modified in place
+
+    df_expenses, df_schedule_i, df_contractors, df_schedule_j, org_names, org_index = prepare_data()
+    org_versions = build_org_versions(df_expenses, df_schedule_i, df_contractors, df_schedule_j)
+    summary = load_summary(df_expenses, df_schedule_i, df_contractors, df_schedule_j, org_versions)
+
+    # range sums and the league table are running totals and ranks across all orgs,
+    # so they are rebuilt as a whole (both are a few vectorized passes)
+    range_sums = build_all_range_sums(df_schedule_i, df_contractors, df_schedule_j)
+    league, league_index = build_league_table(summary)
+
+    return Dataset(df_expenses, df_schedule_i, df_contractors, df_schedule_j, org_names, org_index, org_versions, summary, range_sums, league, league_index)
+
+
+def build_summary(df_expenses, df_schedule_i, df_contractors, df_schedule_j):
+
+    # Group by year and filing_ein for each data source (without totals yet)
+
+    exp = df_expenses.groupby(['tax_year','filing_ein']).agg(
+        total_expenses=('tot_expenses', 'sum'),
+        filing_org=('filing_org', 'first')
+    ).reset_index()
+
+    don = df_schedule_i.groupby(['tax_year','filing_ein']).agg(
+        grantee_cash_grant=('grantee_cash_grant', 'sum')).reset_index()
+
+    con = df_contractors.groupby(['tax_year','filing_ein']).agg(
+        contractor_amt=('contractor_amt', 'sum')).reset_index()
+
+    pay = df_schedule_j.groupby(['tax_year','filing_ein']).agg(
+        total_compensation=('total_compensation', 'sum'),
+        total_compensation_filing_org=("total_compensation_filing_org","sum")).reset_index()
+
+    # Merge all yearly data first (before adding totals)
+
+    exp = exp.merge(don,on=['tax_year','filing_ein'],how='left')
+    exp = exp.merge(con,on=['tax_year','filing_ein'],how='left')
+    exp = exp.merge(pay,on=['tax_year','filing_ein'],how='left')
+
+    # Now calculate totals on the merged data
+
+    totals = exp.groupby(['filing_ein']).agg(
+        filing_org=('filing_org', 'first'),
+        **{metric: (metric, 'sum') for metric in SUMMARY_METRICS}).reset_index()
+
+    # one contiguous block of rows per org: years ascending, then the Total row (tax_year missing)
+
+    exp['is_total'] = False
+    totals['is_total'] = True
+    summary = pd.concat([exp,totals],ignore_index=True)
+    summary = summary.sort_values(['filing_ein','is_total','tax_year'],kind='stable').drop(columns='is_total')
+    summary['tax_year'] = summary['tax_year'].astype('Int16')
+
+    # percentages of total expenses
+
+    for metric in SUMMARY_METRICS[1:]:
+        summary[f'{metric}_perc'] = summary[metric] / summary['total_expenses']
+
+    summary = summary[['filing_ein','tax_year','filing_org'] + SUMMARY_METRICS + [f'{metric}_perc' for metric in SUMMARY_METRICS[1:]]]
+    return summary.set_index('filing_ein')
+
+
+LEAGUE_METRICS = SUMMARY_METRICS + [f'{metric}_perc' for metric in SUMMARY_METRICS[1:]]
+
+
+def build_league_table(summary):
+
+    # every org's yearly metrics and ratios next to year over year growth and the
+    # org's rank within the year, for all orgs in one pass over the summary.
+    # Sorted by tax year, so one year's table is a slice
+
+    league = summary[summary['tax_year'].notna()].reset_index()
+    league['tax_year'] = league['tax_year'].astype('int16')
+
+    # the summary is sorted by org then year, so the previous row is last year's
+    # filing whenever it belongs to the same org and is exactly one year earlier
+
+    follows = (league['filing_ein'].diff() == 0) & (league['tax_year'].diff() == 1)
+    for metric in SUMMARY_METRICS:
+        previous = league[metric].shift().where(follows)
+        league[f'{metric}_growth'] = (league[metric] - previous) / previous.where(previous != 0)
+
+    ranks = league.groupby('tax_year')[LEAGUE_METRICS].rank(method='min', ascending=False)
+    for metric in LEAGUE_METRICS:
+        league[f'{metric}_rank'] = ranks[metric].astype('Int32')
+
+    league = league.sort_values('tax_year', kind='stable', ignore_index=True)
+    return league, build_org_index(league, key='tax_year')
+
+
+def summary_range(org_summary, first_year, last_year):
+
+    # one org's summary rows for the years in the range, and a Total row over just those years
+
+    years = org_summary[org_summary['tax_year'].between(first_year, last_year).fillna(False)]
+
+    total = pd.DataFrame([years[SUMMARY_METRICS].sum()], index=years.index[:1])
+    for metric in SUMMARY_METRICS[1:]:
+        total[f'{metric}_perc'] = total[metric] / total['total_expenses']
+
+    summary = pd.concat([years, total])
+    summary['tax_year'] = summary['tax_year'].astype('Int16')
+    return summary
+
+
+def year_labels(tax_years):
+
+    # summary tax years for display, with 'Total' for the all-years rows
+
+    return tax_years.astype('string').fillna('Total')
+
+
+def read_persisted_summary(path=SUMMARY_FILE):
+
+    # (summary, org versions it was built from), or None when there is no usable file.
+    # Summaries written before tax years were stored as integers, or before org
+    # versions were recorded, are rebuilt
+
+    if not os.path.exists(path):
+        return None
+    summary = pd.read_parquet(path)
+    if not pd.api.types.is_integer_dtype(summary['tax_year']) or 'org_version' not in summary:
+        return None
+
+    versions = summary['org_version'].groupby(level='filing_ein', sort=False).first()
+    return summary.drop(columns='org_version'), versions
+
+
+def load_summary(df_expenses, df_schedule_i, df_contractors, df_schedule_j, org_versions, persist=True):
+
+    # reuse the persisted summary for every org whose version is unchanged and rebuild
+    # the rows of the orgs that were added, changed or removed
+
+    # the summary has rows for the orgs in the expenses table only: versions of other
+    # orgs (grantees that never file) are not stored with it, and would count as
+    # changed on every build
+
+    frames = (df_expenses, df_schedule_i, df_contractors, df_schedule_j)
+    org_versions = org_versions[org_versions.index.isin(df_expenses['filing_ein'].unique())]
+
+    persisted = read_persisted_summary() if persist else None
+
+    if persisted is None:
+        summary = build_summary(df_expenses, df_schedule_i, df_contractors, df_schedule_j)
+    else:
+        summary, versions = persisted
+        common = org_versions.index.intersection(versions.index)
+        unchanged = common[versions[common].to_numpy() == org_versions[common].to_numpy()]
+        changed = org_versions.index.difference(unchanged)
+        removed = summary.index.difference(org_versions.index)
+        if len(changed) == 0 and len(removed) == 0:
+            return summary
+
+        rebuilt = build_summary(*[df[df['filing_ein'].isin(changed)] for df in frames])
+        kept = summary[~summary.index.isin(changed.union(removed))]
+
+        # the two parts have their own name categories
+        summary = pd.concat([kept, rebuilt]).sort_index(kind='stable')
+        summary['filing_org'] = summary['filing_org'].astype(object).astype('category')
+
+    if persist:
+        try:
+            # written next to the old file and swapped in, so a reader never sees half a file
+            summary.assign(org_version=summary.index.map(org_versions)).to_parquet(SUMMARY_FILE + '.tmp')
+            os.replace(SUMMARY_FILE + '.tmp', SUMMARY_FILE)
+        except OSError:
+            # read-only deploys still get the in-memory summary
+            pass
+
+    return summary
@@ -0,0 +1,180 @@
+# Opt-in stage timing and memory instrumentation
+#
+# Turned on with IPI_DIAGNOSTICS=1 in the environment or ?diagnostics=1 in the
+# URL. Each named stage of a rerun records its wall time, and with
+# IPI_DIAGNOSTICS=1 its peak traced memory. The records are shown in a
+# collapsible panel and appended to a JSON lines log (IPI_DIAGNOSTICS_LOG,
+# default diagnostics.jsonl).
+#
+# Peak memory comes from tracemalloc, which is process wide and slows every
+# allocation, so only the environment variable starts it: the query parameter
+# alone records timings. With several sessions rerunning at once a stage's peak
+# includes their allocations too.
+#
+#   python diagnostics.py [diagnostics.jsonl] [--by-org]
+#
+# prints latency percentiles per stage (and per org) from the log.
+#
+# Cold start times (how long after the process started each warmed artifact was
+# ready, see loaders.py) are kept for the process, shown in the panel and, with
+# IPI_DIAGNOSTICS=1, logged as "startup: <artifact>" stages.
+
+import argparse
+import datetime
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+LOG_FILE = os.environ.get('IPI_DIAGNOSTICS_LOG', 'diagnostics.jsonl')
+
+MB = 2 ** 20
+
+# artifact -> seconds after process start it was ready
+
+STARTUP = {}
+
+
+def tracing():
+
+    # memory tracing is for the whole process, so only the environment turns it on
+
+    return os.environ.get('IPI_DIAGNOSTICS') == '1'
+
+
+def enabled():
+
+    return tracing() or st.query_params.get('diagnostics') == '1'
+
+
+def record_startup(name, seconds):
+
+    # called from the warm-up thread, where there are no query params to check
+
+    STARTUP[name] = seconds
+    if os.environ.get('IPI_DIAGNOSTICS') == '1':
+        record = {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'session': None,
+            'org': None,
+            'stage': f"startup: {name}",
+            'seconds': seconds,
+            'peak_mb': None
+        }
+        with open(LOG_FILE, 'a') as log:
+            log.write(json.dumps(record) + '\n')
+
+
+def start_run():
+
+    # called at the top of every full rerun
+
+    if not enabled():
+        return
+
+    if tracing() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    st.session_state.setdefault('diagnostics_session', uuid.uuid4().hex)
+    st.session_state['diagnostics_org'] = None
+    st.session_state['diagnostics_stages'] = []
+    st.session_state['diagnostics_open'] = []
+
+
+def set_org(ein):
+
+    if enabled():
+        st.session_state['diagnostics_org'] = ein
+
+
+@contextmanager
+def stage(name):
+
+    # time a block (or, as a decorator, every call of a function)
+
+    if not enabled() or 'diagnostics_stages' not in st.session_state:
+        yield
+        return
+
+    # stages nest (a section wraps its figures), and each one resets the traced peak.
+    # The peak the enclosing stage reached so far is kept on its entry in open
+    # stages before the reset, and every stage hands its own peak up on exit
+
+    traced = tracemalloc.is_tracing()
+    if traced:
+        open_stages = st.session_state.setdefault('diagnostics_open', [])
+        memory, peak = tracemalloc.get_traced_memory()
+        if open_stages:
+            open_stages[-1]['peak'] = max(open_stages[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        current = {'before': memory, 'peak': memory}
+        open_stages.append(current)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if traced:
+            open_stages.remove(current)
+            peak = max(current['peak'], tracemalloc.get_traced_memory()[1])
+            if open_stages:
+                open_stages[-1]['peak'] = max(open_stages[-1]['peak'], peak)
+        record = {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'session': st.session_state['diagnostics_session'],
+            'org': st.session_state['diagnostics_org'],
+            'stage': name,
+            'seconds': time.perf_counter() - start,
+            'peak_mb': (peak - current['before']) / MB if traced else None
+        }
+        st.session_state['diagnostics_stages'].append(record)
+        with open(LOG_FILE, 'a') as log:
+            log.write(json.dumps(record) + '\n')
+
+
+def panel():
+
+    if not enabled():
+        return
+
+    with st.expander("Diagnostics"):
+        stages = pd.DataFrame(st.session_state.get('diagnostics_stages', []), columns=['stage', 'seconds', 'peak_mb'])
+        st.dataframe(
+            stages,
+            column_config={
+                'seconds': st.column_config.NumberColumn(format="%.4f"),
+                'peak_mb': st.column_config.NumberColumn('peak MB', format="%.2f")
+                },
+            hide_index=True)
+        st.caption(f"Stages since the last full rerun (section-only reruns are added as they happen). Appended to {LOG_FILE}.")
+
+        startup = pd.DataFrame(list(STARTUP.items()), columns=['artifact', 'seconds'])
+        st.dataframe(startup, column_config={'seconds': st.column_config.NumberColumn(format="%.3f")}, hide_index=True)
+        st.caption("Cold start: seconds after the server process started that each artifact was warmed up.")
+
+
+def summarize(path=LOG_FILE, by_org=False):
+
+    log = pd.read_json(path, lines=True)
+    keys = ['stage', 'org'] if by_org else ['stage']
+    summary = log.groupby(keys, dropna=False)['seconds'].describe(percentiles=[0.5, 0.9, 0.99])
+    return summary[['count', '50%', '90%', '99%', 'max']].sort_values('50%', ascending=False)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Latency percentiles per stage from the diagnostics log')
+    parser.add_argument('log', nargs='?', default=LOG_FILE)
+    parser.add_argument('--by-org', action='store_true')
+    args = parser.parse_args()
+
+    with pd.option_context('display.width', 200, 'display.max_rows', None):
+        print(summarize(args.log, args.by_org))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# Offline entity resolution for contractor names
+#
+#   python entities.py [--output name_variants.csv]
+#
+# Filers spell the same contractor many ways ("ARAMARK", "Aramark Corporation",
+# "ARAMARK CORP."), which splits its totals across several bars. This clusters
+# the spellings and writes a variant -> canonical mapping that data.py applies
+# when the dataset is built, so the dashboard pays nothing per rerun.
+#
+# Names are never compared pairwise. Each distinct name gets a few blocking
+# keys (its normalized name, its zip code or city with its first word, and
+# MinHash bands over its trigrams); names are sorted by each key and only
+# neighbours within a small window that share the key are scored, so the
+# number of comparisons grows linearly with the number of names. Pairs whose
+# trigram similarity clears the threshold (a lower one when they share an
+# address) are merged, and each cluster is named after its most used spelling.
+#
+# Grantee names are not resolved: they come from the grantee EIN (see
+# data.build_org_names), so every grantee already has one name.
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data import CONTRACTORS_FILE, NAME_VARIANTS_FILE
+from search import trigram_codes
+
+# words that do not tell two businesses apart
+
+STOP_WORDS = ['THE', 'INC', 'INCORPORATED', 'LLC', 'LLP', 'LP', 'LTD', 'LIMITED', 'CORP', 'CORPORATION',
+              'CO', 'COMPANY', 'PC', 'PLLC', 'PA']
+
+# words that only join others ("HEART & MIND STRATEGIES", "UNIVERSITY OF ILLINOIS AT
+# CHICAGO"), ignored when counting the words of two names
+
+CONNECTORS = {'AND', 'OF', 'AT', 'FOR'}
+
+# trigram Jaccard similarity needed to merge two names, and to merge two names
+# filed at the same zip code (or city when the zip is missing). Either way the
+# names must also start with the same word, or have the same words in another
+# order, and neither may have a word the other lacks
+
+NAME_THRESHOLD = 0.85
+ADDRESS_THRESHOLD = 0.7
+
+# names compared after each name in the sorted order of a blocking key
+
+WINDOW = 4
+
+# MinHash signature: BANDS bands of ROWS hashes. Two names with similarity s share
+# at least one band with probability 1 - (1 - s ** ROWS) ** BANDS (~0.99 at 0.8)
+
+BANDS = 6
+ROWS = 3
+
+HASH_PRIME = 2 ** 31 - 1
+
+
+def normalize(names):
+
+    # upper case, '&' spelled out, punctuation and legal suffixes dropped
+
+    normalized = (names.astype('string[pyarrow]').str.upper()
+        .str.replace('&', ' AND ', regex=False)
+        .str.replace(r"['.,]", '', regex=True)
+        .str.replace(r'[^A-Z0-9]+', ' ', regex=True)
+        .str.replace(r'\b(?:' + '|'.join(STOP_WORDS) + r')\b', ' ', regex=True)
+        .str.replace(r' +', ' ', regex=True)
+        .str.strip())
+
+    # names that are nothing but stop words keep their upper case spelling
+    return normalized.mask(normalized == '', names.astype('string[pyarrow]').str.upper().str.strip())
+
+
+def zip_codes(values):
+
+    # five digit zip codes from numbers like 60606.0 or 606061234
+
+    zips = pd.to_numeric(values, errors='coerce')
+    zips = zips.where(zips < 100000, zips // 10000)
+    return zips.where(zips > 0).astype('Int64').astype('string').str.zfill(5)
+
+
+def minhash(codes, ids, n):
+
+    # BANDS * ROWS minimum trigram hashes per name
+
+    order = np.argsort(ids, kind='stable')
+    codes, ids = codes[order], ids[order]
+    starts = np.searchsorted(ids, np.arange(n))
+
+    rng = np.random.default_rng(0)
+    a = rng.integers(1, HASH_PRIME, BANDS * ROWS)
+    b = rng.integers(0, HASH_PRIME, BANDS * ROWS)
+    return np.minimum.reduceat((a[None, :] * codes[:, None] + b[None, :]) % HASH_PRIME, starts, axis=0)
+
+
+def window_pairs(keys, order):
+
+    # pairs of names within WINDOW of each other in order that share a key
+
+    keys = keys[order]
+    pairs = []
+    for offset in range(1, WINDOW + 1):
+        same = np.flatnonzero((keys[:-offset] == keys[offset:]) & (keys[offset:] >= 0))
+        pairs.append(np.column_stack([order[same], order[same + offset]]))
+    return np.concatenate(pairs)
+
+
+def candidate_pairs(normalized, places, signatures):
+
+    # blocking keys, one code per name (-1 where the name has no such key)
+
+    first_words = normalized.str.split(' ').str[0]
+    blocks = [
+        pd.factorize(normalized)[0],
+        pd.factorize(places + '|' + first_words)[0]
+    ]
+    for band in range(BANDS):
+        band_hashes = signatures[:, band * ROWS:(band + 1) * ROWS]
+        blocks.append(pd.factorize(pd.MultiIndex.from_arrays(band_hashes.T))[0])
+
+    # within a block, neighbours in name order are the likeliest matches
+    rank = np.argsort(np.argsort(normalized.to_numpy(dtype=object), kind='stable'))
+
+    pairs = np.concatenate([window_pairs(keys, np.lexsort((rank, keys))) for keys in blocks])
+    pairs = np.sort(pairs, axis=1)
+    return np.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0)
+
+
+def connected_labels(n, pairs):
+
+    # smallest name id in each connected component, by min label propagation
+    # with pointer jumping
+
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, pairs[:, 0], low)
+        np.minimum.at(updated, pairs[:, 1], low)
+        updated = updated[updated]
+        if (updated == labels).all():
+            return labels
+        labels = updated
+
+
+def resolve_names(names, amounts, places):
+
+    # names, amounts and places (zip or city, may be missing) are one entry per row.
+    # Returns a frame of variant -> canonical, for the names that change
+
+    rows = pd.DataFrame({'name': names, 'amount': amounts, 'place': places}).dropna(subset=['name'])
+    rows['name'] = rows['name'].astype(str)
+
+    variants = rows.groupby('name').agg(rows=('amount', 'size'), amount=('amount', 'sum')).reset_index()
+
+    # the place a name is most often filed at
+    place = rows.dropna(subset=['place']).groupby(['name', 'place']).size().reset_index(name='count')
+    place = place.sort_values('count', ascending=False, kind='stable').drop_duplicates('name').set_index('name')['place']
+    variants['place'] = variants['name'].map(place).astype('string[pyarrow]')
+
+    normalized = normalize(variants['name'])
+    digits = normalized.str.replace(r'[^0-9]+', ' ', regex=True).str.strip().to_numpy(dtype=object)
+    words = [name.split(' ') for name in normalized.tolist()]
+    content = [[word for word in name if word not in CONNECTORS] for name in words]
+
+    codes, ids = trigram_codes((' ' + normalized + ' ').tolist())
+    signatures = minhash(codes, ids, len(variants))
+    trigrams = np.split(codes[np.argsort(ids, kind='stable')], np.searchsorted(np.sort(ids), np.arange(1, len(variants))))
+    trigrams = [set(values.tolist()) for values in trigrams]
+
+    pairs = candidate_pairs(normalized, variants['place'], signatures)
+
+    # score the candidates; names that differ in their numbers ("LOCAL 150" and
+    # "LOCAL 151") or in their first word ("IRIDIAN ASSET MANAGEMENT" and "INDIAN
+    # ASSET MANAGEMENT", "RAMLOWSTEIN ARCHITECTS" and "UIHLEINWILSON RAMLOWSTEIN
+    # ARCHITECTS") are never merged, unless they are the same words reordered.
+    # Neither are names with a word the other lacks once the legal suffixes and
+    # connectors are dropped (and the words run together, so "TOTAL SOURCE" is
+    # "TOTALSOURCE"): that is usually a distinct entity or subsidiary ("CONSIGLI
+    # CONSTRUCTION NY", "CLARK CONSTRUCTION GROUP CA"), even at the same address
+    # ("WEST GROUP" and "WEST GROUP LAW", "PLANET DIRECT" and "PLANET DIRECT MAIL")
+
+    places = variants['place'].to_numpy(dtype=object, na_value=None)
+    keep = []
+    for left, right in pairs.tolist():
+        same_words = words[left][0] == words[right][0] or set(words[left]) == set(words[right])
+        extra_words = len(content[left]) != len(content[right]) and ''.join(content[left]) != ''.join(content[right])
+        if digits[left] != digits[right] or not same_words or extra_words:
+            keep.append(False)
+            continue
+        a, b = trigrams[left], trigrams[right]
+        similarity = len(a & b) / len(a | b)
+        same_place = places[left] is not None and places[left] == places[right]
+        keep.append(similarity >= NAME_THRESHOLD or (same_place and similarity >= ADDRESS_THRESHOLD))
+
+    variants['cluster'] = connected_labels(len(variants), pairs[np.array(keep, dtype=bool)])
+
+    # each cluster is named after the spelling on the most rows, upper case on a tie,
+    # then the one with the most dollars. The name is upper cased, so the variants
+    # of one vendor never show in two spellings (names not in a cluster keep theirs)
+    variants['upper'] = variants['name'] == variants['name'].str.upper()
+    canonical = variants.sort_values(['cluster', 'rows', 'upper', 'amount', 'name'], ascending=[True, False, False, False, True], kind='stable')
+    canonical = canonical.drop_duplicates('cluster').set_index('cluster')['name'].str.upper()
+    variants['canonical'] = variants['cluster'].map(canonical)
+
+    # names that were not merged with anything are left as filed
+    merged = variants['cluster'].duplicated(keep=False)
+    changed = variants[merged & (variants['name'] != variants['canonical'])]
+    return pd.DataFrame({'variant': changed['name'], 'canonical': changed['canonical']}).sort_values(['canonical', 'variant'], ignore_index=True)
+
+
+def resolve_contractors(path=CONTRACTORS_FILE):
+
+    # the address columns are only in the source file, not the converted copy
+
+    wanted = ['contractor_name', 'contractor_amt', 'contractor_city', 'contractor_zip']
+    df = pd.read_csv(path, usecols=lambda column: column in wanted)
+
+    places = pd.Series(pd.NA, index=df.index, dtype='string[pyarrow]')
+    if 'contractor_zip' in df:
+        places = zip_codes(df['contractor_zip'])
+    if 'contractor_city' in df:
+        places = places.fillna(df['contractor_city'].astype('string[pyarrow]').str.upper().str.strip())
+
+    amounts = pd.to_numeric(df['contractor_amt'], errors='coerce').fillna(0)
+    mapping = resolve_names(df['contractor_name'], amounts, places)
+    mapping.insert(0, 'column', 'contractor_name')
+    return mapping, df['contractor_name'].nunique()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Cluster contractor name variants and write the variant -> canonical mapping')
+    parser.add_argument('--output', default=NAME_VARIANTS_FILE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    mapping, names = resolve_contractors()
+    mapping.to_csv(args.output, index=False)
+    print(f"{CONTRACTORS_FILE}: {names:,} names, {len(mapping):,} variants mapped onto "
+          f"{mapping['canonical'].nunique():,} names in {time.perf_counter() - start:.2f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# Export every org's "follow an IPI dollar" report as static files
+#
+#   python export.py [--out-dir reports] [--workers N] [--orgs EIN ...] [--years 2013 2024] [--target 412057028]
+#
+# Writes one standalone HTML page per filing org with the tables and charts of the
+# dashboard's Total Expenses, Schedule I, Part VII-B and Schedule J tabs, the same
+# tables as CSV files in a folder per org, and an index.html linking the pages.
+# The numbers and figures come from reports.py, as on the dashboard.
+#
+# The dataset is built once, in this process. Worker processes are forked from it
+# after that and read it copy-on-write, so no worker reloads or unpickles it; orgs
+# are handed to them in chunks. Where fork is not available each worker builds
+# its own copy instead. plotly.min.js is written once next to the pages, so the
+# folder works offline and the pages stay small.
+
+import argparse
+import html
+import multiprocessing
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from plotly.offline import get_plotlyjs
+
+from data import build_dataset
+from reports import (IPI_EIN, compensation_by_year, compensation_charts, compensation_totals, contractor_charts,
+                     contractor_totals, contractors_by_year, expense_charts, expense_tables, grantee_charts,
+                     grantee_totals, org_names, org_years, target_funders)
+
+# orgs per task handed to a worker
+
+CHUNK_SIZE = 16
+
+# set in each worker before it exports anything: inherited from the parent when
+# forked, built by init_worker otherwise
+
+DATASET = None
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="plotly.min.js"></script>
+<style>
+body {{ font-family: Arial, Helvetica, sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; }}
+td {{ text-align: right; }}
+.charts {{ display: flex; flex-wrap: wrap; }}
+.charts > div {{ flex: 1 1 600px; }}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+'''
+
+
+def dollars(value):
+
+    return '' if value != value else f'${value:,.0f}'
+
+
+def percent(value):
+
+    return '' if value != value else f'{value:.1%}'
+
+
+def html_table(df, formats):
+
+    # column -> formatter; names are escaped by to_html
+
+    return df.to_html(index=False, na_rep='', formatters=formats, border=0)
+
+
+def html_charts(figures):
+
+    divs = ''.join(f'<div>{fig.to_html(full_html=False, include_plotlyjs=False)}</div>' for fig in figures)
+    return f'<div class="charts">{divs}</div>'
+
+
+def org_report(dataset, filing_ein, first_year, last_year, target_ein, range_start, range_end):
+
+    # the page body and the CSV tables of one org's report
+
+    filing_org = str(dataset.org_names.get(filing_ein, filing_ein))
+    target_org = str(dataset.org_names.get(target_ein, target_ein))
+    escape = html.escape
+
+    amounts, percentages, by_category, distribution = expense_tables(dataset, filing_ein, first_year, last_year)
+    i_total, i_aggregate = grantee_totals(dataset, filing_ein, first_year, last_year)
+    funders = target_funders(dataset, filing_ein, first_year, last_year, target_ein, range_start, range_end)
+    viib_total = contractor_totals(dataset, filing_ein, first_year, last_year)
+    viib_by_year = contractors_by_year(dataset, filing_ein, first_year, last_year)
+    j_total = compensation_totals(dataset, filing_ein, first_year, last_year)
+    j_by_year = compensation_by_year(dataset, filing_ein, first_year, last_year)
+
+    funders = funders.rename(columns={'highlight': 'grantee_of_filing_org'})
+
+    tables = {
+        'expenses': amounts,
+        'expenses_perc': percentages,
+        'grantees': i_total,
+        'funders': funders,
+        'contractors': viib_total,
+        'contractors_by_year': viib_by_year,
+        'compensation': j_total[['compensation_name', 'total_compensation']],
+        'compensation_by_year': j_by_year
+    }
+
+    amount_formats = {column: dollars for column in amounts.columns[1:]}
+    percent_formats = {column: percent for column in percentages.columns[1:]}
+
+    body = [
+        f'<h1>{escape(filing_org)}</h1>',
+        f'<p>EIN {filing_ein:09d}, tax years {first_year}-{last_year}</p>',
+
+        '<h1>Total Expenses Overview</h1>',
+        f'<h2>Total Expenses, Aggregate of {first_year}-{last_year}</h2>',
+        html_charts(expense_charts(by_category, distribution)),
+        f'<h2>Total Expenses by Year, {first_year}-{last_year}</h2>',
+        html_table(amounts, amount_formats),
+        html_table(percentages, percent_formats),
+
+        '<h1>Schedule I - Grants and Other Assistance to Organizations, Governments, and Individuals</h1>',
+        f'<h2>Grants Awarded, {first_year}-{last_year}</h2>',
+        f'<p>Total Grants Awarded: ${i_aggregate:,.2f}</p>',
+        f'<p>Total Grants Awarded (yearly average): ${i_aggregate / (last_year - first_year + 1):,.2f}</p>',
+        html_charts(grantee_charts(i_total, first_year, last_year)),
+        f'<h2>Donations to {escape(target_org)} from Organizations that {escape(filing_org)} Donated To, {range_start}-{range_end}</h2>',
+        f"<p>In total, organizations in IPI's networks donated: ${funders['grantee_amt'].sum():,.2f} to {escape(target_org)}</p>",
+        html_table(funders, {'grantee_amt': dollars, 'grantee_of_filing_org': lambda value: 'yes' if value else ''}),
+        f'<h2>All Grants Awarded by Grantee, {first_year}-{last_year}</h2>',
+        html_table(i_total, {'grantee_cash_grant': dollars}),
+
+        '<h1>Part VII-B - Independent Contractors</h1>',
+        f'<h2>Independent Contractors by Contractor Name, Aggregate of {first_year}-{last_year}</h2>',
+        html_charts(contractor_charts(viib_total.head(10))),
+        f'<h2>Independent Contractors by Year, {first_year}-{last_year}</h2>',
+        html_table(viib_by_year, {'contractor_amt_total': dollars}),
+
+        '<h1>Schedule J - Compensation Information for Certain Officers, Directors, Trustees, Key Employees, and Highest Compensated Employees</h1>',
+        f'<h2>Compensation of Highest Paid Employees by Employee Name, {first_year}-{last_year}</h2>',
+        html_charts(compensation_charts(j_total, first_year, last_year)),
+        f'<h2>Compensation of Highest Paid Employees by Employee Name and Year, {first_year}-{last_year}</h2>',
+        html_table(j_by_year, {'total_compensation': dollars, 'total_compensation_filing_org': dollars})
+    ]
+
+    return PAGE.format(title=escape(filing_org), body='\n'.join(body)), tables
+
+
+def init_worker():
+
+    global DATASET
+    if DATASET is None:
+        DATASET = build_dataset()
+
+
+def export_orgs(eins, out_dir, range_start, range_end, target_ein):
+
+    # writes the reports of a chunk of orgs; returns the seconds each one took,
+    # None for orgs without filings in the range
+
+    times = []
+    for filing_ein in eins:
+        start = time.perf_counter()
+        years = org_years(DATASET.summary, filing_ein, range_start, range_end)
+        if years is None:
+            times.append(None)
+            continue
+
+        page, tables = org_report(DATASET, filing_ein, *years, target_ein, range_start, range_end)
+        with open(os.path.join(out_dir, f'{filing_ein:09d}.html'), 'w', encoding='utf-8') as out:
+            out.write(page)
+
+        csv_dir = os.path.join(out_dir, f'{filing_ein:09d}')
+        os.makedirs(csv_dir, exist_ok=True)
+        for name, df in tables.items():
+            df.to_csv(os.path.join(csv_dir, f'{name}.csv'), index=False)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def chunks(values, size):
+
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def write_index(out_dir, names, exported, range_start, range_end):
+
+    links = ''.join(f'<li><a href="{ein:09d}.html">{html.escape(str(names[ein]))}</a></li>' for ein in exported)
+    body = f'<h1>IPI 990 Reports, {range_start}-{range_end}</h1>\n<ul>{links}</ul>'
+    with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as out:
+        out.write(PAGE.format(title='IPI 990 Reports', body=body))
+
+
+def main():
+
+    global DATASET
+
+    parser = argparse.ArgumentParser(description='Export every org\'s report as standalone HTML and CSV files')
+    parser.add_argument('--out-dir', default='reports')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--orgs', type=int, nargs='+', help='EINs to export (default: every filing org)')
+    parser.add_argument('--years', type=int, nargs=2, metavar=('FIRST', 'LAST'), help='tax year range (default: every year)')
+    parser.add_argument('--target', type=int, default=IPI_EIN, help='org whose funders are cross-referenced')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    DATASET = build_dataset()
+    loaded = time.perf_counter()
+    print(f"Dataset built in {loaded - start:.2f}s")
+
+    names = org_names(DATASET.summary)
+    eins = names.index.tolist()
+    if args.orgs:
+        unknown = sorted(set(args.orgs) - set(eins))
+        if unknown:
+            parser.error(f"not filing orgs in the data: {', '.join(map(str, unknown))}")
+        eins = args.orgs
+    years = sorted(DATASET.league_index)
+    range_start, range_end = args.years or (years[0], years[-1])
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    with open(os.path.join(args.out_dir, 'plotly.min.js'), 'w', encoding='utf-8') as out:
+        out.write(get_plotlyjs())
+
+    # forked workers share the dataset built above
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context, initializer = multiprocessing.get_context('fork'), None
+    else:
+        context, initializer = multiprocessing.get_context(), init_worker
+
+    times = []
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=initializer) as pool:
+        tasks = [pool.submit(export_orgs, chunk, args.out_dir, range_start, range_end, args.target) for chunk in chunks(eins, CHUNK_SIZE)]
+        for task in tasks:
+            times.extend(task.result())
+
+    exported = [ein for ein, seconds in zip(eins, times) if seconds is not None]
+    write_index(args.out_dir, names, exported, range_start, range_end)
+
+    done = time.perf_counter()
+    org_times = [seconds for seconds in times if seconds is not None]
+    print(f"{len(exported):,} reports ({len(eins) - len(exported):,} orgs without filings in {range_start}-{range_end}) "
+          f"by {args.workers} workers in {done - loaded:.2f}s"
+          + (f", median {statistics.median(org_times):.3f}s per org" if org_times else ''))
+    print(f"Done in {done - start:.2f}s -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+# Build the four dashboard source files from raw IRS 990 e-file XML returns
+#
+#   python ingest.py RETURNS_DIR [--out-dir .] [--workers N] [--batch-size 250] [--append]
+#
+# Every *.xml file under RETURNS_DIR is read with an incremental parser that
+# keeps only the fields below and clears each element as soon as it is closed,
+# so no whole document tree is ever held in memory. The returns are split into
+# chunks that a process pool parses in parallel; each worker appends its rows
+# to its own Parquet part files every --batch-size returns. The parts are then
+# merged into total_expenses.csv, schedule_i.parquet, part_vii_b.csv and
+# schedule_j.csv with the columns of the original files, and converted as in
+# convert_data.py.
+#
+# Only full Form 990 returns are used (990-EZ and 990-PF returns have none of
+# these schedules). When an org filed more than once for a tax period, the
+# latest return (an amended one on a tie) replaces the others.
+#
+# With --append the returns are added to the source files already in --out-dir:
+# a new or amended return replaces whatever those files hold for its org and
+# tax period and everything else is kept. The dashboard picks the change up by
+# content fingerprint and rebuilds in the background (see app.py).
+
+import argparse
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import iterparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data import CONTRACTORS_FILE, EXPENSES_FILE, SCHEDULE_I_FILE, SCHEDULE_J_FILE, SCHEMAS, convert_source
+
+# source file -> column order, as in the original extracts. object_id (the return
+# file name) ties every row to its return; return_ts and amended_return pick the
+# return that wins when an org filed more than once for a period
+
+COLUMNS = {
+    EXPENSES_FILE: ['filing_org', 'filing_ein', 'tax_year', 'tot_expenses', 'object_id', 'return_ts', 'amended_return'],
+    SCHEDULE_I_FILE: ['filing_org', 'filing_ein', 'tax_year', 'grantee_business_name', 'grantee_ein', 'grantee_cash_grant', 'object_id'],
+    CONTRACTORS_FILE: ['filing_org', 'filing_ein', 'tax_year', 'contractor_name', 'contractor_amt', 'contractor_address',
+                       'contractor_city', 'contractor_state', 'contractor_zip', 'contractor_description', 'object_id'],
+    SCHEDULE_J_FILE: ['filing_org', 'filing_ein', 'tax_year', 'compensation_name', 'compensation_title',
+                      'total_compensation', 'total_compensation_filing_org', 'object_id']
+}
+
+# return level fields: column -> element paths (innermost last), current e-file
+# tag names first and the pre-2013 names after them
+
+RETURN_FIELDS = {
+    'filing_ein': [('Filer', 'EIN')],
+    'filing_org': [('Filer', 'BusinessName', 'BusinessNameLine1Txt'), ('Filer', 'Name', 'BusinessNameLine1')],
+    'tax_year': [('ReturnHeader', 'TaxPeriodEndDt'), ('ReturnHeader', 'TaxPeriodEndDate')],
+    'return_type': [('ReturnHeader', 'ReturnTypeCd'), ('ReturnHeader', 'ReturnType')],
+    'return_ts': [('ReturnHeader', 'ReturnTs'), ('ReturnHeader', 'Timestamp')],
+    'amended_return': [('IRS990', 'AmendedReturnInd'), ('IRS990', 'AmendedReturn')],
+    'tot_expenses': [('IRS990', 'CYTotalExpensesAmt'), ('IRS990', 'TotalExpensesCurrentYear')]
+}
+
+# repeating groups: group element -> source file, and column -> paths within the group
+
+GROUPS = {
+    'RecipientTable': SCHEDULE_I_FILE,
+    'ContractorCompensationGrp': CONTRACTORS_FILE,
+    'CompensationOfHghstPdCntrct': CONTRACTORS_FILE,
+    'RltdOrgOfficerTrstKeyEmplGrp': SCHEDULE_J_FILE,
+    'RltdOrgOfficerTrstKeyEmpl': SCHEDULE_J_FILE
+}
+
+GROUP_FIELDS = {
+    SCHEDULE_I_FILE: {
+        'grantee_business_name': [('RecipientBusinessName', 'BusinessNameLine1Txt'), ('RecipientNameBusiness', 'BusinessNameLine1')],
+        'grantee_ein': [('RecipientEIN',), ('EINOfRecipient',)],
+        'grantee_cash_grant': [('CashGrantAmt',), ('AmountOfCashGrant',)]
+    },
+    CONTRACTORS_FILE: {
+        'contractor_name': [('ContractorName', 'BusinessName', 'BusinessNameLine1Txt'), ('ContractorName', 'PersonNm'),
+                            ('NameBusiness', 'BusinessNameLine1'), ('NameIndividual',)],
+        'contractor_amt': [('CompensationAmt',), ('Compensation',)],
+        'contractor_address': [('AddressLine1Txt',), ('AddressLine1',)],
+        'contractor_city': [('CityNm',), ('City',)],
+        'contractor_state': [('StateAbbreviationCd',), ('State',)],
+        'contractor_zip': [('ZIPCd',), ('ZIPCode',)],
+        'contractor_description': [('ServicesDesc',), ('DescriptionOfServices',)]
+    },
+    SCHEDULE_J_FILE: {
+        'compensation_name': [('PersonNm',), ('NamePerson',)],
+        'compensation_title': [('TitleTxt',), ('Title',)],
+        'total_compensation_filing_org': [('TotalCompensationFilingOrgAmt',), ('TotalCompensationFilingOrg',)],
+        'total_compensation_related': [('TotalCompensationRltdOrgsAmt',), ('TotalCompensationRelatedOrgs',)]
+    }
+}
+
+# returns per chunk handed to one worker task
+
+CHUNK_SIZE = 200
+
+PARTS_DIR = 'ingest_parts'
+
+
+def leaf_lookup(fields):
+
+    # innermost element name -> [(column, path)], so each closing tag is one dict lookup
+
+    lookup = {}
+    for column, paths in fields.items():
+        for path in paths:
+            lookup.setdefault(path[-1], []).append((column, path))
+    return lookup
+
+
+RETURN_LOOKUP = leaf_lookup(RETURN_FIELDS)
+GROUP_LOOKUPS = {target: leaf_lookup(fields) for target, fields in GROUP_FIELDS.items()}
+
+
+def parse_return(path):
+
+    # (return fields, {source file: [group rows]}) for one return, streamed
+
+    header = {}
+    rows = {target: [] for target in GROUP_FIELDS}
+    stack = []
+    group = None
+
+    for event, element in iterparse(path, events=('start', 'end')):
+        name = element.tag.rpartition('}')[2]
+
+        if event == 'start':
+            stack.append(name)
+            if group is None and name in GROUPS:
+                group = (GROUPS[name], len(stack), {})
+            continue
+
+        text = (element.text or '').strip()
+        if text:
+            if group is not None:
+                target, depth, record = group
+                candidates = GROUP_LOOKUPS[target].get(name, ())
+                scope = stack[depth:]
+            else:
+                record, candidates, scope = header, RETURN_LOOKUP.get(name, ()), stack
+            for column, field_path in candidates:
+                if column not in record and tuple(scope[-len(field_path):]) == field_path:
+                    record[column] = text
+
+        if group is not None and len(stack) == group[1]:
+            rows[group[0]].append(group[2])
+            group = None
+
+        stack.pop()
+        element.clear()
+
+    return header, rows
+
+
+def return_rows(path):
+
+    # rows for the four source files from one return, or None when it is not a Form 990
+
+    header, rows = parse_return(path)
+    if header.get('return_type') != '990' or 'filing_ein' not in header:
+        return None
+
+    filing = {
+        'filing_org': header.get('filing_org'),
+        'filing_ein': header['filing_ein'],
+        'tax_year': header.get('tax_year'),
+        'object_id': os.path.splitext(os.path.basename(path))[0]
+    }
+
+    tables = {EXPENSES_FILE: [dict(filing,
+        tot_expenses=header.get('tot_expenses'),
+        return_ts=header.get('return_ts'),
+        amended_return=header.get('amended_return'))]}
+    for target, records in rows.items():
+        tables[target] = [dict(filing, **record) for record in records]
+    return tables
+
+
+def part_columns(target):
+
+    # part files hold the text as parsed; Schedule J keeps the related org
+    # compensation that total_compensation is summed from
+
+    columns = [column for column in COLUMNS[target] if column != 'total_compensation']
+    if target == SCHEDULE_J_FILE:
+        columns.append('total_compensation_related')
+    return columns
+
+
+def write_batch(writers, tables, parts_dir, chunk):
+
+    for target, records in tables.items():
+        if not records:
+            continue
+        schema = pa.schema([(column, pa.string()) for column in part_columns(target)])
+
+        if target not in writers:
+            os.makedirs(os.path.join(parts_dir, target), exist_ok=True)
+            writers[target] = pq.ParquetWriter(os.path.join(parts_dir, target, f'{chunk:06d}.parquet'), schema)
+        writers[target].write_table(pa.Table.from_pylist(records, schema=schema))
+
+
+def ingest_chunk(paths, parts_dir, chunk, batch_size):
+
+    # parse a chunk of returns, appending to this chunk's part files every batch_size returns
+
+    writers = {}
+    tables = {target: [] for target in COLUMNS}
+    used = skipped = 0
+
+    try:
+        for number, path in enumerate(paths, 1):
+            try:
+                found = return_rows(path)
+            except SyntaxError:
+                # ParseError: truncated or malformed download
+                found = None
+            if found is None:
+                skipped += 1
+            else:
+                used += 1
+                for target, records in found.items():
+                    tables[target].extend(records)
+
+            if number % batch_size == 0 or number == len(paths):
+                write_batch(writers, tables, parts_dir, chunk)
+                tables = {target: [] for target in COLUMNS}
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return used, skipped
+
+
+def read_parts(parts_dir, target):
+
+    files = sorted(glob.glob(os.path.join(parts_dir, target, '*.parquet')))
+    columns = part_columns(target)
+    if not files:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+    return pd.concat([pd.read_parquet(path) for path in files], ignore_index=True)[columns]
+
+
+def latest_returns(expenses):
+
+    # (EIN, tax period) -> object_id of the return kept for it: latest timestamp,
+    # then amended over original, then the highest object id
+
+    returns = expenses[['filing_ein', 'tax_year', 'object_id', 'return_ts', 'amended_return']].copy()
+    returns['amended'] = returns['amended_return'].isin(['X', 'x', '1', 'true'])
+    returns = returns.sort_values(['return_ts', 'amended', 'object_id'], na_position='first', kind='stable')
+    return returns.drop_duplicates(['filing_ein', 'tax_year'], keep='last').set_index(['filing_ein', 'tax_year'])['object_id']
+
+
+def typed(df, target):
+
+    # numeric columns as numbers, and total_compensation from its two parts
+
+    df = df.copy()
+    for field in SCHEMAS[target]:
+        if field.name in df and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)):
+            df[field.name] = pd.to_numeric(df[field.name], errors='coerce')
+    if target == SCHEDULE_J_FILE:
+        related = pd.to_numeric(df.pop('total_compensation_related'), errors='coerce')
+        df['total_compensation'] = df['total_compensation_filing_org'].add(related, fill_value=0)
+    return df
+
+
+def read_existing(out_dir, target):
+
+    # the current source file, for appending. Rows from extracts made before
+    # ingest.py have no return id; each (EIN, tax period) of theirs gets one, with
+    # no timestamp, so any new return for the period supersedes them
+
+    path = os.path.join(out_dir, target)
+    if not os.path.exists(path):
+        return None
+    df = pd.read_parquet(path) if target.endswith('.parquet') else pd.read_csv(path, index_col=0, low_memory=False)
+    df = df.reindex(columns=COLUMNS[target])
+
+    legacy_ids = df['filing_ein'].astype('Int64').astype(str) + '_' + df['tax_year'].astype(str)
+    df['object_id'] = df['object_id'].astype(object).where(df['object_id'].notna(), legacy_ids)
+    return df
+
+
+def merge_parts(parts_dir, out_dir, append=False):
+
+    # the part files (and with append the current source files) as the four source
+    # files, sorted by EIN, keeping only the latest return of each org and tax period
+
+    tables = {target: typed(read_parts(parts_dir, target), target) for target in COLUMNS}
+    if append:
+        # a return ingested again replaces its earlier copy instead of doubling it
+        ingested = tables[EXPENSES_FILE]['object_id']
+        for target in COLUMNS:
+            existing = read_existing(out_dir, target)
+            if existing is not None:
+                existing = existing[~existing['object_id'].isin(ingested)]
+                tables[target] = pd.concat([existing, tables[target]], ignore_index=True)
+
+    winners = latest_returns(tables[EXPENSES_FILE])
+
+    counts = {}
+    for target, df in tables.items():
+        # rows of a period without an expenses row are kept as they are
+        winner = winners.reindex(pd.MultiIndex.from_frame(df[['filing_ein', 'tax_year']])).to_numpy()
+        df = df[pd.isna(winner) | (winner == df['object_id'].to_numpy())]
+
+        df = df.sort_values('filing_ein', kind='stable', ignore_index=True)[COLUMNS[target]]
+        path = os.path.join(out_dir, target)
+        if target.endswith('.parquet'):
+            df.astype({'grantee_ein': 'Int64'}).to_parquet(path, index=False)
+        else:
+            # the original extracts were written with pandas' default index
+            df.to_csv(path)
+        counts[target] = len(df)
+
+    return counts
+
+
+def chunks(paths, size):
+
+    return [paths[start:start + size] for start in range(0, len(paths), size)]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Build the dashboard source files from IRS 990 e-file XML returns')
+    parser.add_argument('returns_dir')
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=250, help='returns per Parquet write in each worker')
+    parser.add_argument('--append', action='store_true', help='add the returns to the source files in --out-dir instead of replacing them')
+    parser.add_argument('--no-convert', action='store_true', help='skip writing the converted Parquet copies')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = sorted(glob.glob(os.path.join(args.returns_dir, '**', '*.xml'), recursive=True))
+    parts_dir = os.path.join(args.out_dir, PARTS_DIR)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+
+    used = skipped = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        tasks = [pool.submit(ingest_chunk, chunk, parts_dir, number, args.batch_size) for number, chunk in enumerate(chunks(paths, CHUNK_SIZE))]
+        for task in tasks:
+            chunk_used, chunk_skipped = task.result()
+            used += chunk_used
+            skipped += chunk_skipped
+    parsed = time.perf_counter()
+    print(f"{len(paths):,} returns parsed by {args.workers} workers in {parsed - start:.2f}s ({used:,} Form 990, {skipped:,} skipped)")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    counts = merge_parts(parts_dir, args.out_dir, args.append)
+    shutil.rmtree(parts_dir)
+    for target, rows in counts.items():
+        print(f"{os.path.join(args.out_dir, target)}: {rows:,} rows")
+
+    if not args.no_convert:
+        cwd = os.getcwd()
+        os.chdir(args.out_dir)
+        try:
+            for path in SCHEMAS:
+                convert_source(path)
+        finally:
+            os.chdir(cwd)
+
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# Shared Streamlit caches for the dataset and the artifacts derived from it
+#
+# These live outside app.py so they are the same cached functions whether they
+# are filled by a session or by the warm-up thread. serve.py starts the warm-up
+# when the server process starts, before anyone connects; under a plain
+# `streamlit run app.py` the first session starts it. Until an artifact is ready
+# the page renders without it and fills it in once warmed (see app.main).
+
+import threading
+import time
+
+import numpy as np
+import streamlit as st
+
+from data import EXPENSES_FILE, SCHEDULE_I_FILE, build_dataset, data_version, read_dataset
+from diagnostics import record_startup
+from network import build_graph
+from search import build_search_index, search
+
+# the process start, as far as this app can tell: serve.py imports this module first thing
+
+PROCESS_START = time.perf_counter()
+
+# artifacts warmed at startup, in the order a first visit needs them
+
+WARM_UP = ['overview', 'dataset', 'search index', 'network']
+
+WARMED = {name: threading.Event() for name in WARM_UP}
+
+WARM_UP_STARTED = threading.Event()
+
+WARM_UP_LOCK = threading.Lock()
+
+
+# built once per dataset version and shared read-only by every session, so reruns
+# neither reload nor copy it. Room for two versions: the one being served and the
+# one being built
+@st.cache_resource(max_entries=2)
+def load_dataset(version):
+
+    try:
+        return build_dataset()
+    except FileNotFoundError as e:
+        st.error(f"Data file not found: {e}. Please ensure the CSV files are in the correct location.")
+        return None
+
+
+# the dataset version sessions are served, shared by every session. When the data files
+# change, the new version is built on a background thread and sessions keep getting
+# the previous one until it is ready
+@st.cache_resource
+def publication():
+
+    return {'served': None, 'building': None, 'failed': None, 'lock': threading.Lock()}
+
+
+def build_in_background(state, version):
+
+    try:
+        dataset = load_dataset(version)
+    except Exception:
+        dataset = None
+    with state['lock']:
+        state['building'] = None
+        if dataset is None:
+            state['failed'] = version
+        else:
+            state['served'] = version
+
+
+def served_version():
+
+    version = data_version()
+    state = publication()
+
+    with state['lock']:
+        served = state['served']
+        if served is not None and served != version and state['building'] != version and state['failed'] != version:
+            state['building'] = version
+            threading.Thread(target=build_in_background, args=(state, version), daemon=True).start()
+    if served is not None:
+        return served
+
+    # nothing published yet: build in the foreground
+    if load_dataset(version) is not None:
+        with state['lock']:
+            state['served'] = state['served'] or version
+    return version
+
+
+def page_version():
+
+    # the served version once a dataset is published, the files on disk before that
+
+    return publication()['served'] or data_version()
+
+
+def updating():
+
+    state = publication()
+    return state['building'] is not None
+
+
+# figures built from one org's rows are cached on the org's content version, so they
+# survive data updates that leave the org unchanged
+def org_version(dataset, filing_ein):
+
+    return int(dataset.org_versions.get(filing_ein, 0))
+
+
+# every tax year, and the running total of grants given across the network by tax
+# year so the total for any year range is a subtraction. Read straight from two
+# columns of the files, so the page header does not wait for the full dataset
+@st.cache_data
+def load_overview(version):
+
+    years = np.unique(read_dataset(EXPENSES_FILE, columns=['tax_year'])['tax_year'].to_numpy())
+    grants = read_dataset(SCHEDULE_I_FILE, columns=['tax_year', 'grantee_cash_grant'])
+    totals = grants.groupby('tax_year')['grantee_cash_grant'].sum()
+    return years.tolist(), totals.index.to_numpy(), np.r_[0, totals.cumsum().to_numpy('float64')]
+
+
+# Schedule I grant network for a year range, shared read-only across sessions
+@st.cache_resource(max_entries=16)
+def load_graph(version, first_year, last_year):
+
+    dataset = load_dataset(version)
+    return build_graph(dataset.schedule_i, dataset.expenses, range(first_year, last_year + 1))
+
+
+# name and EIN search index over all four datasets, shared read-only across sessions
+@st.cache_resource(max_entries=1)
+def load_search_index(version):
+
+    return build_search_index(load_dataset(version))
+
+
+# hits per query, so the selection callback sees the rows the table showed
+@st.cache_data(max_entries=256)
+def search_hits(version, query):
+
+    return search(load_search_index(version), query)
+
+
+def warmed(name):
+
+    return WARMED[name].is_set()
+
+
+def wait(name, timeout=None):
+
+    return WARMED[name].wait(timeout)
+
+
+def warm_up():
+
+    # fill the shared caches in WARM_UP order, recording how long after process start
+    # each was ready. A failed step still counts as done, so pages stop waiting
+
+    def step(name, func):
+        try:
+            return func()
+        except Exception:
+            return None
+        finally:
+            WARMED[name].set()
+            record_startup(name, time.perf_counter() - PROCESS_START)
+
+    step('overview', lambda: load_overview(data_version()))
+    dataset = step('dataset', lambda: load_dataset(served_version()))
+    if dataset is None:
+        # rebuilt by the next session, which shows the error
+        load_dataset.clear()
+        for name in WARM_UP:
+            WARMED[name].set()
+        return
+
+    version = served_version()
+    step('search index', lambda: load_search_index(version))
+
+    # the graph for the default (all years) range of the Follow the Money tab
+    years = sorted(dataset.league_index)
+    step('network', lambda: load_graph(version, years[0], years[-1]))
+
+
+def start_warm_up():
+
+    # once per process. serve.py calls this once the server runtime exists, since
+    # st.cache_data entries made before that are not shared with sessions
+
+    with WARM_UP_LOCK:
+        if not WARM_UP_STARTED.is_set():
+            WARM_UP_STARTED.set()
+            threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
@@ -0,0 +1,191 @@
+# "Follow an IPI dollar" money flow graph over Schedule I
+#
+# Filers and grantees are nodes and Schedule I cash grants are weighted edges
+# (filer EIN -> grantee EIN). Edges are stored as flat numpy arrays sorted by
+# filer (CSR layout), so every query is a few vectorized passes over the edge
+# list rather than repeated DataFrame filters.
+#
+# Dollars are followed with a pass-through model: an org passes on
+# grant / spend of every dollar it receives to each of its grantees, where spend
+# is its total expenses (or total grants, if larger).
+
+import heapq
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+MoneyFlowGraph = namedtuple('MoneyFlowGraph', ['eins', 'indptr', 'src', 'dst', 'amount', 'share', 'spend'])
+
+
+def build_graph(df_schedule_i, df_expenses=None, tax_years=None):
+
+    grants = df_schedule_i[['filing_ein', 'grantee_ein', 'tax_year', 'grantee_cash_grant']].dropna(subset=['grantee_ein'])
+    if tax_years is not None:
+        grants = grants[grants['tax_year'].isin(tax_years)]
+    grants = grants[grants['grantee_cash_grant'] > 0]
+
+    # one edge per filer/grantee pair, sorted by filer
+
+    edges = grants.groupby(['filing_ein', 'grantee_ein'])['grantee_cash_grant'].sum()
+    filer = edges.index.get_level_values('filing_ein').to_numpy('int64')
+    grantee = edges.index.get_level_values('grantee_ein').to_numpy('int64')
+    amount = edges.to_numpy('float64')
+
+    # dense node ids
+
+    eins = np.unique(np.concatenate([filer, grantee]))
+    src = np.searchsorted(eins, filer)
+    dst = np.searchsorted(eins, grantee)
+    n = len(eins)
+
+    indptr = np.zeros(n + 1, dtype='int64')
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+    spend = np.bincount(src, weights=amount, minlength=n)
+
+    if df_expenses is not None:
+        expenses = df_expenses
+        if tax_years is not None:
+            expenses = expenses[expenses['tax_year'].isin(tax_years)]
+        expenses = expenses.groupby('filing_ein')['tot_expenses'].sum()
+        pos = np.searchsorted(eins, expenses.index.to_numpy('int64'))
+        known = pos < n
+        known[known] = eins[pos[known]] == expenses.index.to_numpy('int64')[known]
+        spend[pos[known]] = np.maximum(spend[pos[known]], expenses.to_numpy('float64')[known])
+
+    share = amount / spend[src]
+
+    return MoneyFlowGraph(eins, indptr, src, dst, amount, share, spend)
+
+
+def node_id(graph, ein):
+
+    pos = int(np.searchsorted(graph.eins, ein))
+    if pos < len(graph.eins) and graph.eins[pos] == ein:
+        return pos
+    return None
+
+
+def hop_distances(graph, start, max_hops, reverse=False):
+
+    # breadth first search as one vectorized pass over the edge list per hop.
+    # -1 for orgs not reached within max_hops
+
+    n = len(graph.eins)
+    src, dst = (graph.dst, graph.src) if reverse else (graph.src, graph.dst)
+
+    hops = np.full(n, -1, dtype='int16')
+    hops[start] = 0
+    frontier = np.zeros(n, dtype=bool)
+    frontier[start] = True
+
+    for hop in range(1, max_hops + 1):
+        reached = np.zeros(n, dtype=bool)
+        reached[dst[frontier[src]]] = True
+        reached &= hops < 0
+        if not reached.any():
+            break
+        hops[reached] = hop
+        frontier = reached
+
+    return hops
+
+
+def reachable(graph, source, max_hops):
+
+    # orgs funded by source within max_hops grants, with their hop distance
+
+    start = node_id(graph, source)
+    if start is None:
+        return pd.Series(dtype='int16', name='hops', index=pd.Index([], dtype='int64', name='ein'))
+
+    hops = hop_distances(graph, start, max_hops)
+    reached = np.flatnonzero(hops > 0)
+    return pd.Series(hops[reached], index=pd.Index(graph.eins[reached], name='ein'), name='hops')
+
+
+def flow_through(graph, source, max_hops):
+
+    # follow the source's spending max_hops grants deep. Returns attributed dollars
+    # received per org and per hop, including dollars that come back to the source
+    # (which are not passed on again)
+
+    empty = (pd.DataFrame(columns=['ein', 'first_hop', 'amount']),
+             pd.DataFrame(columns=['hop', 'orgs', 'amount', 'returned']))
+
+    start = node_id(graph, source)
+    if start is None:
+        return empty
+
+    n = len(graph.eins)
+    flow = np.zeros(n)
+    flow[start] = graph.spend[start]
+
+    received = np.zeros(n)
+    first_hop = np.zeros(n, dtype='int16')
+    by_hop = []
+
+    for hop in range(1, max_hops + 1):
+        flow = np.bincount(graph.dst, weights=graph.share * flow[graph.src], minlength=n)
+        returned = flow[start]
+        flow[start] = 0
+
+        new = (flow > 0) & (first_hop == 0)
+        first_hop[new] = hop
+        received += flow
+        by_hop.append((hop, int(new.sum()), flow.sum(), returned))
+
+        if not flow.any():
+            break
+
+    reached = np.flatnonzero(received > 0)
+    by_org = pd.DataFrame({
+        'ein': graph.eins[reached],
+        'first_hop': first_hop[reached],
+        'amount': received[reached]
+    }).sort_values('amount', ascending=False, ignore_index=True)
+
+    return by_org, pd.DataFrame(by_hop, columns=['hop', 'orgs', 'amount', 'returned'])
+
+
+def top_paths(graph, source, target, max_hops, n=10, max_expansions=100000):
+
+    # best n grant chains from source to target by attributed dollars. target may be
+    # the source itself, in which case these are the cycles that bring money back.
+    #
+    # Best-first search over simple paths: extending a path never increases its value,
+    # so paths leave the heap in descending order. Orgs that cannot reach the target
+    # within the remaining hops are never expanded.
+
+    start = node_id(graph, source)
+    end = node_id(graph, target)
+    if start is None or end is None:
+        return pd.DataFrame(columns=['path', 'hops', 'amount'])
+
+    to_target = hop_distances(graph, end, max_hops, reverse=True)
+
+    heap = [(-graph.spend[start], (start,))]
+    found = []
+    expansions = 0
+
+    while heap and len(found) < n and expansions < max_expansions:
+        value, path = heapq.heappop(heap)
+        node = path[-1]
+
+        if len(path) > 1 and node == end:
+            found.append((graph.eins[list(path)].tolist(), len(path) - 1, -value))
+            continue
+
+        remaining = max_hops - (len(path) - 1)
+        if remaining <= 0:
+            continue
+        expansions += 1
+
+        lo, hi = graph.indptr[node], graph.indptr[node + 1]
+        for nxt, share in zip(graph.dst[lo:hi].tolist(), graph.share[lo:hi].tolist()):
+            if nxt != end and (nxt in path or to_target[nxt] < 0 or to_target[nxt] >= remaining):
+                continue
+            heapq.heappush(heap, (value * share, path + (nxt,)))
+
+    return pd.DataFrame(found, columns=['path', 'hops', 'amount'])
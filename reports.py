@@ -0,0 +1,226 @@
+# Per-org report tables and charts shared by the dashboard sections and export.py
+#
+# Every function takes the built dataset (data.build_dataset) and an org's EIN and
+# year range, and returns plain frames or Plotly figures; none of them touch
+# Streamlit, so the same numbers come out of the dashboard and the batch export.
+
+from charts import TOP_N, bar_chart, pie_chart, top_n
+from data import org_rows, range_rows, range_totals, summary_range, year_labels
+
+IPI_EIN = 412057028
+
+SUMMARY_COLUMNS = {
+    'tax_year': 'Tax Year',
+    'total_expenses': 'Total Expenses',
+    'grantee_cash_grant': 'Grants Given',
+    'contractor_amt': 'Independent Contractor Expenses',
+    'total_compensation': 'Compensation For Leadership (Filing Org+Related Orgs)',
+    'total_compensation_filing_org': 'Compensation For Leadership (Filing Org)',
+    'grantee_cash_grant_perc': 'Grants Given (%)',
+    'contractor_amt_perc': 'Independent Contractor Expenses (%)',
+    'total_compensation_perc': 'Compensation For Leadership (Filing Org+Related Orgs) (%)',
+    'total_compensation_filing_org_perc': 'Compensation For Leadership (Filing Org) (%)'
+}
+
+
+def org_names(summary):
+
+    # filing org names, in the order of the org picker
+
+    return summary['filing_org'].groupby(level='filing_ein', sort=False).first()
+
+
+def org_years(summary, filing_ein, range_start, range_end):
+
+    # first and last tax year the org filed within the range, None when it has none
+
+    tax_years = summary.loc[[filing_ein], 'tax_year'].dropna()
+    tax_years = tax_years[tax_years.between(range_start, range_end)]
+    if tax_years.empty:
+        return None
+    return int(tax_years.min()), int(tax_years.max())
+
+
+# Total Expenses
+
+def expense_tables(dataset, filing_ein, first_year, last_year):
+
+    # yearly amounts and percentages with a Total row, and the category totals and
+    # distribution charted for the whole range
+
+    org_summary = summary_range(dataset.summary.loc[[filing_ein]], first_year, last_year)
+    org_summary = org_summary.assign(tax_year=year_labels(org_summary['tax_year']))
+
+    df_filtered = org_summary.rename(columns=SUMMARY_COLUMNS)
+
+    df_filtered = df_filtered[['Tax Year','Total Expenses','Grants Given','Independent Contractor Expenses','Compensation For Leadership (Filing Org+Related Orgs)','Compensation For Leadership (Filing Org)']]
+
+    # percentages dataframe (out of total expenses) is already in the summary
+
+    df_filtered_perc = org_summary.rename(columns=SUMMARY_COLUMNS)
+
+    # select only the percentage columns and Tax Year
+
+    df_filtered_perc = df_filtered_perc[['Tax Year','Grants Given (%)','Independent Contractor Expenses (%)','Compensation For Leadership (Filing Org+Related Orgs) (%)','Compensation For Leadership (Filing Org) (%)']]
+
+    exp = df_filtered.copy()
+
+    exp_total = exp[exp['Tax Year'] != 'Total']
+
+    exp_total = exp_total[['Total Expenses','Grants Given','Independent Contractor Expenses','Compensation For Leadership (Filing Org)']]
+
+    # Sum all years together for each category
+    exp_total_summed = exp_total.sum().reset_index()
+    exp_total_summed.columns = ['Expense Category', 'Amount']
+
+    # Take top 10 for bar chart
+    exp_total_summed = exp_total_summed.sort_values(by='Amount',ascending=False).head(10)
+
+    exp_total_perc = df_filtered_perc[df_filtered_perc['Tax Year'] == 'Total']
+
+    exp_total_perc = exp_total_perc[['Tax Year','Grants Given (%)','Independent Contractor Expenses (%)','Compensation For Leadership (Filing Org) (%)']]
+
+    exp_total_perc['Other'] = exp_total_perc['Grants Given (%)'] + exp_total_perc['Independent Contractor Expenses (%)'] + exp_total_perc['Compensation For Leadership (Filing Org) (%)']
+
+    # pivot so "Total" is column name and the rest are values in that column
+    exp_total_perc = exp_total_perc.melt(id_vars=['Tax Year'], var_name='Expense Category', value_name='Percentage')
+
+    return df_filtered, df_filtered_perc, exp_total_summed, exp_total_perc
+
+
+def expense_charts(exp_total_summed, exp_total_perc):
+
+    bar_fig = bar_chart(exp_total_summed,
+        title="Total Expenses by Category",
+        x='Expense Category',
+        y='Amount',
+        labels={'Amount': 'Amount', 'Expense Category': 'Expense Category'},
+        hover_label='Amount',
+        height=700)
+    pie_fig = pie_chart(exp_total_perc,values='Percentage',
+        names='Expense Category',
+        title='Expense Distribution by Category')
+    return bar_fig, pie_fig
+
+
+# Schedule I
+
+def grantee_totals(dataset, filing_ein, first_year, last_year):
+
+    # per grantee totals for the year range, from running totals, and the total
+    # given (including grants without a grantee name)
+
+    i_by_grantee = range_totals(dataset.range_sums['schedule_i'], filing_ein, first_year, last_year)
+
+    i_aggregate = i_by_grantee['grantee_cash_grant'].sum()
+
+    i_total = i_by_grantee.loc[i_by_grantee['grantee_business_name'].notna(), ['grantee_business_name','grantee_cash_grant']]
+
+    i_total = i_total.sort_values(by='grantee_cash_grant',ascending=False)
+
+    return i_total, i_aggregate
+
+
+def grantee_charts(i_total, first_year, last_year):
+
+    # Take top 10 for bar chart
+
+    bar_fig = bar_chart(i_total.head(10),
+        title=f"Top 10 Grant Amounts by Grantee Business Name, {first_year}-{last_year}",
+        x='grantee_business_name',
+        y='grantee_cash_grant',
+        labels={'grantee_business_name': 'Grantee Business Name', 'grantee_cash_grant': 'Grant Amount'},
+        hover_label='Grant Amount')
+    pie_fig = pie_chart(top_n(i_total, 'grantee_business_name', 'grantee_cash_grant'),values='grantee_cash_grant',
+        names='grantee_business_name',
+        title=f'Grant Distribution by Grantee Business Name, {first_year}-{last_year}')
+    return bar_fig, pie_fig
+
+
+def target_funders(dataset, filing_ein, first_year, last_year, target_ein, range_start, range_end):
+
+    # everyone that funds the target org (IPI by default), flagging the funders the
+    # selected org also donated to. Funders are other orgs' filings, so they follow
+    # the whole range rather than just the selected org's filing years
+
+    target_funders_all = range_totals(dataset.range_sums['funders'], target_ein, range_start, range_end)
+    target_funders_all = target_funders_all.rename(columns={'grantee_cash_grant': 'grantee_amt'})
+    target_funders_all['filing_org'] = target_funders_all['filing_ein'].map(dataset.org_names)
+
+    # funders of the target that the selected org also donated to in the range
+
+    df_i_filtered = org_rows(dataset.schedule_i, dataset.org_index['schedule_i'], filing_ein)
+    df_i_filtered = df_i_filtered[df_i_filtered['tax_year'].between(first_year, last_year)]
+
+    highlight_eins = set(df_i_filtered['grantee_ein'].dropna()) & set(target_funders_all['filing_ein'])
+    target_funders_all['highlight'] = target_funders_all['filing_ein'].isin(highlight_eins)
+
+    target_funders_all = target_funders_all.sort_values(by='grantee_amt',ascending=False)
+    return target_funders_all[['filing_org','grantee_amt','highlight']]
+
+
+# Part VII-B
+
+def contractor_totals(dataset, filing_ein, first_year, last_year):
+
+    # per contractor totals for the filing org and year range, largest first
+
+    viib_total = range_totals(dataset.range_sums['contractors'], filing_ein, first_year, last_year)
+    viib_total = viib_total.loc[viib_total['contractor_name'].notna(), ['contractor_name','contractor_amt']]
+    return viib_total.sort_values(by='contractor_amt',ascending=False)
+
+
+def contractors_by_year(dataset, filing_ein, first_year, last_year):
+
+    viib_by_year = range_rows(dataset.range_sums['contractors'], filing_ein, first_year, last_year).dropna(subset=['contractor_name'])
+    viib_by_year = viib_by_year.sort_values(['tax_year','contractor_name'], kind='stable')
+    return viib_by_year[['tax_year','contractor_name','contractor_amt']].rename(columns={'contractor_amt': 'contractor_amt_total'})
+
+
+def contractor_charts(viib_total):
+
+    bar_fig = bar_chart(viib_total,
+        title="Total Independent Contractor Amounts by Contractor Name",
+        x='contractor_name',
+        y='contractor_amt',
+        labels={'contractor_name': 'Contractor Name', 'contractor_amt': 'Contractor Amount'},
+        hover_label='Contractor Amount')
+    pie_fig = pie_chart(top_n(viib_total, 'contractor_name', 'contractor_amt'),values='contractor_amt',
+        names='contractor_name',
+        title='Contractor Distribution by Contractor Name')
+    return bar_fig, pie_fig
+
+
+# Schedule J
+
+def compensation_totals(dataset, filing_ein, first_year, last_year):
+
+    # per employee totals over the range (each employee counted once per filing)
+
+    j_total = range_totals(dataset.range_sums['schedule_j'], filing_ein, first_year, last_year)
+    j_total = j_total.dropna(subset=['compensation_name'])
+    return j_total.sort_values(by='total_compensation',ascending=False)
+
+
+def compensation_by_year(dataset, filing_ein, first_year, last_year):
+
+    df_j_org = org_rows(dataset.schedule_j, dataset.org_index['schedule_j'], filing_ein)
+    df_j_org = df_j_org[df_j_org['tax_year'].between(first_year, last_year)]
+    # drop duplicates
+    j_by_year = df_j_org.drop_duplicates(subset=['compensation_name'])
+    j_by_year = j_by_year.sort_values(by='tax_year',ascending=True)
+    return j_by_year[['tax_year','compensation_name','compensation_title','total_compensation','total_compensation_filing_org']]
+
+
+def compensation_charts(j_total, first_year, last_year):
+
+    bar_fig = bar_chart(j_total.head(TOP_N),
+        title=f"Total Compensation of Highest Paid Employees by Employee Name ({first_year}-{last_year})",
+        x='compensation_name',
+        y='total_compensation',
+        labels={'compensation_name': 'Employee Name', 'total_compensation': 'Total Compensation'},
+        hover_label='Total Compensation')
+    pie_fig = pie_chart(top_n(j_total, 'compensation_name', 'total_compensation'),values='total_compensation',
+        names='compensation_name',
+        title=f'Compensation Distribution of Highest Paid Employees by Employee Name ({first_year}-{last_year})')
+    return bar_fig, pie_fig
@@ -0,0 +1,215 @@
+# Global name and EIN search for the dashboard
+#
+# Every distinct name in the four datasets (filing orgs, Schedule I grantees,
+# Part VII-B contractors and Schedule J employees) is an entry. Each entry is
+# linked to the filing orgs it appears in, with the dollars involved, so a hit
+# can jump straight to that org and the tab that shows it.
+#
+# Lookups use an inverted index of byte trigrams over the lower case names,
+# stored as flat numpy arrays (trigram -> sorted entry ids), so a query
+# intersects a few posting lists instead of scanning every name. Queries
+# shorter than a trigram use a prefix search over the sorted names, and
+# all-digit queries a prefix search over EINs.
+
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# entry kind -> dashboard tab the hit opens
+
+KINDS = {
+    'Organization': "Total Expenses",
+    'Grantee': "Schedule I",
+    'Contractor': "Part VII-B",
+    'Employee': "Schedule J"
+}
+
+RESULT_LIMIT = 20
+
+# filing orgs listed per matching name
+
+ORGS_PER_NAME = 3
+
+# names are split into blocks while trigrams are extracted, to bound the
+# temporary (names x longest name) arrays
+
+TRIGRAM_BLOCK = 20000
+
+SearchIndex = namedtuple('SearchIndex', [
+    'entries', 'lower', 'sorted_names', 'sorted_ids', 'trigrams', 'indptr', 'postings',
+    'eins', 'ein_ids', 'relations', 'relation_ptr'
+])
+
+
+def name_relations(sums, kind):
+
+    # (name, filing org, dollars) over all years from a RangeSums table
+
+    rows = sums.rows.dropna(subset=[sums.counterparty])
+    relations = rows.groupby([sums.counterparty, 'filing_ein'], observed=True)[sums.values[0]].sum().reset_index()
+    relations.columns = ['name', 'filing_ein', 'amount']
+    relations['kind'] = kind
+    return relations
+
+
+def trigram_codes(lower):
+
+    # (trigram, entry id) pairs for every byte trigram of every name, deduplicated
+    # and sorted by trigram
+
+    pairs = []
+    for start in range(0, len(lower), TRIGRAM_BLOCK):
+        block = lower[start:start + TRIGRAM_BLOCK]
+        encoded = np.array([name.encode('utf-8') for name in block], dtype=bytes)
+        width = encoded.dtype.itemsize
+        if width < 3:
+            continue
+
+        chars = encoded.view('uint8').reshape(len(block), width).astype('int64')
+        codes = (chars[:, :-2] << 16) | (chars[:, 1:-1] << 8) | chars[:, 2:]
+        ids = np.broadcast_to(np.arange(start, start + len(block))[:, None], codes.shape)
+
+        # names shorter than the longest are zero padded
+        valid = chars[:, 2:] != 0
+        pairs.append((codes[valid] << 32) | ids[valid])
+
+    if not pairs:
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64')
+
+    pairs = np.sort(np.concatenate(pairs))
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]][:len(pairs)]]
+    return pairs >> 32, pairs & 0xFFFFFFFF
+
+
+def build_search_index(dataset):
+
+    summary = dataset.summary
+    filers = summary[summary['tax_year'].isna()]
+
+    organizations = pd.DataFrame({
+        'name': filers['filing_org'].to_numpy(),
+        'filing_ein': filers.index.to_numpy(),
+        'amount': filers['total_expenses'].to_numpy('float64'),
+        'kind': 'Organization'
+    })
+
+    relations = pd.concat([
+        organizations,
+        name_relations(dataset.range_sums['schedule_i'], 'Grantee'),
+        name_relations(dataset.range_sums['contractors'], 'Contractor'),
+        name_relations(dataset.range_sums['schedule_j'], 'Employee')
+    ], ignore_index=True)
+
+    # only orgs that can be picked in the dashboard are jump targets
+
+    relations = relations[relations['name'].notna() & relations['filing_ein'].isin(filers.index)]
+    relations = relations.astype({'name': str, 'filing_ein': 'int64', 'amount': 'float64'})
+
+    # one entry per (kind, name), weighted by its dollars
+
+    entries = relations.groupby(['kind', 'name'], sort=False)['amount'].sum().reset_index(name='weight')
+    entries['kind_order'] = entries['kind'].map({kind: order for order, kind in enumerate(KINDS)})
+
+    entry_ids = pd.MultiIndex.from_frame(entries[['kind', 'name']]).get_indexer(pd.MultiIndex.from_frame(relations[['kind', 'name']]))
+    relations = pd.DataFrame({
+        'entry': entry_ids,
+        'filing_ein': relations['filing_ein'].to_numpy(),
+        'filing_org': relations['filing_ein'].map(dataset.org_names).to_numpy(),
+        'amount': relations['amount'].to_numpy()
+    }).sort_values(['entry', 'amount'], ascending=[True, False], kind='stable', ignore_index=True)
+
+    lower = entries['name'].str.lower().astype('string[pyarrow]')
+
+    order = np.argsort(lower.to_numpy(dtype=object), kind='stable')
+    trigrams, postings = trigram_codes(lower.tolist())
+    keys, starts = np.unique(trigrams, return_index=True)
+    indptr = np.r_[starts, len(trigrams)]
+
+    # one EIN row per filer; filers sharing a name share its entry
+
+    filers = relations[entries['kind'].to_numpy()[relations['entry'].to_numpy()] == 'Organization']
+    ein_text = filers['filing_ein'].map('{:09d}'.format).to_numpy(dtype=object)
+    ein_order = np.argsort(ein_text, kind='stable')
+
+    return SearchIndex(
+        entries, lower, pd.Index(lower.iloc[order].to_numpy(dtype=object)), order, keys, indptr, postings,
+        pd.Index(ein_text[ein_order]), filers['entry'].to_numpy()[ein_order],
+        relations, np.searchsorted(relations['entry'].to_numpy(), np.arange(len(entries) + 1)))
+
+
+def prefix_ids(sorted_values, ids, prefix):
+
+    lo = sorted_values.searchsorted(prefix, side='left')
+    hi = sorted_values.searchsorted(prefix + '\uffff', side='left')
+    return ids[lo:hi]
+
+
+def candidate_ids(index, query):
+
+    if query.isdigit():
+        return np.unique(prefix_ids(index.eins, index.ein_ids, query))
+
+    encoded = np.frombuffer(query.encode('utf-8'), dtype='uint8').astype('int64')
+    if len(encoded) < 3:
+        return prefix_ids(index.sorted_names, index.sorted_ids, query)
+
+    # entries holding every trigram of the query, smallest posting list first
+
+    codes = np.unique((encoded[:-2] << 16) | (encoded[1:-1] << 8) | encoded[2:])
+    pos = np.searchsorted(index.trigrams, codes)
+    if (pos >= len(index.trigrams)).any() or (index.trigrams[np.minimum(pos, len(index.trigrams) - 1)] != codes).any():
+        return np.zeros(0, dtype='int64')
+
+    lists = sorted((index.postings[index.indptr[p]:index.indptr[p + 1]] for p in pos), key=len)
+    ids = lists[0]
+    for postings in lists[1:]:
+        ids = np.intersect1d(ids, postings, assume_unique=True)
+        if len(ids) == 0:
+            break
+
+    # trigrams can match out of order, so confirm the substring
+
+    found = index.lower.iloc[ids].str.contains(query, regex=False).to_numpy(dtype=bool)
+    return ids[found]
+
+
+def search(index, query, limit=RESULT_LIMIT):
+
+    # ranked hits: exact names, then prefixes, then word starts, then any substring;
+    # ties go to organizations first and then to the entries with the most dollars
+
+    query = query.strip().lower()
+    columns = ['kind', 'name', 'filing_ein', 'filing_org', 'amount', 'section']
+    if not query:
+        return pd.DataFrame(columns=columns)
+
+    ids = candidate_ids(index, query)
+    if len(ids) == 0:
+        return pd.DataFrame(columns=columns)
+
+    if query.isdigit():
+        score = np.zeros(len(ids), dtype='int8')
+    else:
+        names = index.lower.iloc[ids]
+        exact = (names == query).to_numpy(dtype=bool)
+        prefix = names.str.startswith(query).to_numpy(dtype=bool)
+        word_start = names.str.contains(r'(?:^|[^0-9a-z])' + re.escape(query)).to_numpy(dtype=bool)
+        score = np.where(exact, 0, np.where(prefix, 1, np.where(word_start, 2, 3)))
+
+    candidates = index.entries.iloc[ids].assign(score=score)
+    candidates = candidates.sort_values(['score', 'kind_order', 'weight'], ascending=[True, True, False], kind='stable').head(limit)
+
+    # the top filing orgs of each matching entry, in ranked order
+
+    entries = candidates.index.to_numpy()
+    starts = index.relation_ptr[entries]
+    counts = np.minimum(index.relation_ptr[entries + 1] - starts, ORGS_PER_NAME)
+    rows = np.repeat(starts - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+
+    hits = index.relations.iloc[rows].reset_index(drop=True)
+    hits['kind'] = np.repeat(candidates['kind'].to_numpy(), counts)
+    hits['name'] = np.repeat(candidates['name'].to_numpy(), counts)
+    hits['section'] = hits['kind'].map(KINDS)
+    return hits[columns]
@@ -0,0 +1,45 @@
+# Start the dashboard with its data warmed up before the first visitor
+#
+#   python serve.py [streamlit run options, e.g. --server.port 8501]
+#
+# Runs `streamlit run app.py` in this process and, as soon as the server
+# runtime exists, starts the warm-up thread (see loaders.py) that builds the
+# dataset, the search index and the default network graph into the shared
+# caches. Visitors arriving during the warm-up get the page header at once and
+# the rest of the page as it becomes ready.
+#
+# With IPI_API_PORT set, the read-only JSON API (api.py) is served on that port
+# from this process too, sharing the dashboard's loaded data.
+
+import os
+import sys
+import threading
+import time
+
+from streamlit import runtime
+from streamlit.web import cli
+
+import loaders
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def warm_up_when_serving():
+
+    while not runtime.exists():
+        time.sleep(0.05)
+    loaders.start_warm_up()
+
+
+def main():
+
+    threading.Thread(target=warm_up_when_serving, name='warm-up-start', daemon=True).start()
+    if os.environ.get('IPI_API_PORT'):
+        import api
+        api.start_api('127.0.0.1', int(os.environ['IPI_API_PORT']))
+    sys.argv = ['streamlit', 'run', APP] + sys.argv[1:]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
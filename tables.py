@@ -0,0 +1,66 @@
+# Paginated tables for the dashboard
+#
+# Filtering and sorting run on the full frame in pandas, and only the current
+# page is sent to the browser. Number formatting is left to st.column_config,
+# so no Python runs per cell or per row.
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from diagnostics import stage
+
+PAGE_SIZE = 50
+
+DOLLARS = st.column_config.NumberColumn(format="$%,d")
+PERCENT = st.column_config.NumberColumn(format="percent")
+
+
+def paged_table(df, key, column_config=None, page_size=PAGE_SIZE):
+
+    search_col, sort_col, order_col, page_col = st.columns([3, 2, 1, 1])
+
+    with search_col:
+        search = st.text_input("Search", key=f"{key}_search", placeholder="Filter rows")
+    with sort_col:
+        sort_by = st.selectbox("Sort By", [None] + df.columns.tolist(), key=f"{key}_sort", format_func=lambda column: "Default Order" if column is None else column)
+    with order_col:
+        descending = st.toggle("Descending", value=True, key=f"{key}_descending")
+
+    # filter on every text (or categorical name) column, then sort, before slicing out the page
+
+    if search:
+        mask = np.zeros(len(df), dtype=bool)
+        for column in df.columns:
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # match each distinct name once and look rows up by their category code
+                codes = values.cat.codes.to_numpy()
+                matches = np.asarray(values.cat.categories.str.contains(search, case=False, regex=False), dtype=bool)
+                mask |= (codes >= 0) & matches[codes]
+            elif pd.api.types.is_string_dtype(values):
+                mask |= values.str.contains(search, case=False, regex=False, na=False).to_numpy()
+        df = df[mask]
+
+    if sort_by is not None:
+        df = df.sort_values(by=sort_by, ascending=not descending, kind='stable')
+
+    pages = max(1, math.ceil(len(df) / page_size))
+
+    # a narrower filter can leave the stored page past the end
+
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+
+    with page_col:
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+
+    with stage(f"table: {key}"):
+        st.dataframe(
+            df.iloc[(page - 1) * page_size:page * page_size],
+            column_config=column_config,
+            hide_index=True)
+    st.caption(f"{len(df):,} rows, page {page} of {pages}")
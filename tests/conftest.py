@@ -0,0 +1,6 @@
+# the app modules live at the top of the repo, not in a package
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
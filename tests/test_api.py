@@ -0,0 +1,164 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import api
+from bench.synthetic import IPI_EIN, generate
+from data import build_dataset
+from search import build_search_index
+
+VERSION = ('test', 1)
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+
+    # a small synthetic network, built once for the module
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp('data'))
+        generate('.', scale=0.05)
+        return build_dataset()
+
+
+@pytest.fixture
+def served(dataset, monkeypatch):
+
+    # the API reads the dataset through the shared caches; here it is the one above
+    state = {'dataset': dataset}
+    monkeypatch.setattr(api, 'served_version', lambda: VERSION)
+    monkeypatch.setattr(api, 'load_dataset', lambda version: state['dataset'])
+    monkeypatch.setattr(api, 'load_search_index', lambda version: build_search_index(state['dataset']))
+    api.response.cache_clear()
+    yield state
+    api.response.cache_clear()
+
+
+@pytest.fixture
+def connection(served):
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), api.Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=30)
+    server.shutdown()
+    server.server_close()
+
+
+def get(connection, url, etag=None):
+
+    connection.request('GET', url, headers={'If-None-Match': etag} if etag else {})
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, response.getheader('ETag'), json.loads(body) if body else None
+
+
+def request(path, query=''):
+
+    status, body = api.response(VERSION, path, query)
+    return status, json.loads(body)
+
+
+def test_routes(served):
+
+    status, body = request('/orgs', 'limit=5')
+    assert status == 200
+    assert len(body['items']) == 5 and body['total'] > 5
+    assert set(body['items'][0]) == {'ein', 'name', 'first_year', 'last_year', 'total_expenses'}
+
+    status, body = request(f'/orgs/{IPI_EIN}')
+    assert status == 200
+    assert body['name'] == 'ILLINOIS POLICY INSTITUTE'
+    assert body['years'][-1]['tax_year'] is None
+
+    for endpoint in ['grantees', 'funders', 'contractors', 'compensation']:
+        status, body = request(f'/orgs/{IPI_EIN}/{endpoint}')
+        assert status == 200, endpoint
+        assert body['ein'] == IPI_EIN and 'items' in body
+
+    status, body = request('/years')
+    assert status == 200
+    year = body['items'][0]['tax_year']
+    status, body = request(f'/years/{year}', 'sort=grantee_cash_grant')
+    assert status == 200
+    assert [row['grantee_cash_grant_rank'] for row in body['items'][:3]] == [1, 2, 3]
+
+    status, body = request('/search', 'q=illinois policy')
+    assert status == 200
+    assert body['items'][0]['filing_ein'] == IPI_EIN
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/orgs', 'limit=0'),
+    ('/orgs', 'offset=-1'),
+    ('/orgs', 'limit=many'),
+    (f'/orgs/{IPI_EIN}', 'first_year=x'),
+    ('/years/2020', 'sort=name')
+])
+def test_bad_requests(served, path, query):
+
+    status, body = request(path, query)
+    assert status == 400
+    assert 'error' in body
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/nothing', ''),
+    ('/orgs/1', ''),
+    ('/orgs/1/grantees', ''),
+    (f'/orgs/{IPI_EIN}/unknown', ''),
+    (f'/orgs/{IPI_EIN}', 'first_year=1990&last_year=1991'),
+    ('/years/1990', '')
+])
+def test_not_found(served, path, query):
+
+    status, body = request(path, query)
+    assert status == 404
+    assert 'error' in body
+
+
+def test_etag_revalidation(connection):
+
+    status, etag, body = get(connection, '/orgs?limit=3')
+    assert status == 200 and etag
+    assert len(body['items']) == 3
+
+    # the same request is answered 304 while the version is unchanged
+    status, same, body = get(connection, '/orgs?limit=3', etag)
+    assert (status, same, body) == (304, etag, None)
+
+    # a different request has its own tag
+    status, other, _ = get(connection, '/orgs?limit=4', etag)
+    assert status == 200 and other != etag
+
+
+def test_unavailable_is_not_cached(served, connection):
+
+    # a dataset that failed to load is a 503, and the request is answered once it loads
+    dataset, served['dataset'] = served['dataset'], None
+    status, etag, body = get(connection, '/years')
+    assert status == 503 and etag is None
+    assert 'error' in body
+
+    served['dataset'] = dataset
+    status, etag, body = get(connection, '/years')
+    assert status == 200 and etag
+    assert body['items']
+
+
+def test_bug_is_not_cached_as_not_found(connection):
+
+    # a KeyError from a broken endpoint is a 500, and the next request tries again
+    def broken(dataset, params):
+        raise KeyError('filing_org')
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(api, 'orgs', broken)
+        status, etag, body = get(connection, '/orgs')
+        assert status == 500 and etag is None
+
+    status, _, body = get(connection, '/orgs')
+    assert status == 200
+    assert body['items']
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data
+from bench.synthetic import generate
+from data import SUMMARY_FILE, build_dataset, build_range_sums, range_rows, range_totals
+
+
+@pytest.fixture(scope='module')
+def grants():
+
+    # a few orgs granting to a few named (and some unnamed) grantees over the years
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        'filing_ein': rng.choice([11, 22, 33], n),
+        'grantee_business_name': pd.Categorical(rng.choice(['ALPHA', 'BETA', 'GAMMA', 'DELTA', None], n)),
+        'grantee_ein': rng.choice([101, 202, 303], n),
+        'tax_year': rng.integers(2013, 2025, n),
+        'grantee_cash_grant': rng.integers(0, 10000, n)
+    })
+    return df.sort_values('filing_ein', kind='stable', ignore_index=True)
+
+
+def as_dict(totals):
+
+    # unnamed counterparties are kept as their own group; NaN keys never compare equal
+    return totals.rename(lambda name: '<unnamed>' if pd.isna(name) else name).to_dict()
+
+
+def expected_totals(df, key, ein, counterparty, value, first_year, last_year):
+
+    rows = df[(df[key] == ein) & df['tax_year'].between(first_year, last_year)]
+    return as_dict(rows.groupby(counterparty, observed=True, dropna=False)[value].sum())
+
+
+@pytest.mark.parametrize('first_year, last_year', [(2013, 2024), (2016, 2019), (2020, 2020), (2000, 2015), (2024, 2030)])
+def test_range_totals_match_groupby(grants, first_year, last_year):
+
+    sums = build_range_sums(grants, 'filing_ein', 'grantee_business_name', ['grantee_cash_grant'])
+    for ein in [11, 22, 33]:
+        totals = range_totals(sums, ein, first_year, last_year)
+        assert (totals['filing_ein'] == ein).all()
+        got = as_dict(totals.set_index('grantee_business_name')['grantee_cash_grant'])
+        assert got == expected_totals(grants, 'filing_ein', ein, 'grantee_business_name', 'grantee_cash_grant', first_year, last_year)
+
+
+def test_range_totals_integer_counterparty(grants):
+
+    # funders: keyed by grantee EIN, with the filing org as the counterparty
+    sums = build_range_sums(grants.sort_values('grantee_ein', kind='stable'), 'grantee_ein', 'filing_ein', ['grantee_cash_grant'])
+    for ein in [101, 202, 303]:
+        totals = range_totals(sums, ein, 2015, 2021)
+        got = as_dict(totals.set_index('filing_ein')['grantee_cash_grant'])
+        assert got == expected_totals(grants, 'grantee_ein', ein, 'filing_ein', 'grantee_cash_grant', 2015, 2021)
+
+
+def test_range_totals_empty(grants):
+
+    sums = build_range_sums(grants, 'filing_ein', 'grantee_business_name', ['grantee_cash_grant'])
+    assert range_totals(sums, 44, 2013, 2024).empty
+    assert range_totals(sums, 11, 2030, 2040).empty
+    assert list(range_totals(sums, 44, 2013, 2024).columns) == ['filing_ein', 'grantee_business_name', 'grantee_cash_grant']
+
+
+def test_range_rows_match_groupby(grants):
+
+    sums = build_range_sums(grants, 'filing_ein', 'grantee_business_name', ['grantee_cash_grant'])
+    rows = range_rows(sums, 22, 2016, 2019)
+
+    org = grants[(grants['filing_ein'] == 22) & grants['tax_year'].between(2016, 2019)]
+    expected = org.groupby(['grantee_business_name', 'tax_year'], observed=True, dropna=False)['grantee_cash_grant'].sum()
+
+    assert rows['tax_year'].between(2016, 2019).all()
+    got = rows.set_index(['grantee_business_name', 'tax_year'])['grantee_cash_grant']
+    assert as_dict(got) == as_dict(expected)
+    assert ('<unnamed>', 2016) in as_dict(got)
+
+
+def test_summary_reused_when_unchanged(tmp_path, monkeypatch):
+
+    # a small synthetic network, with grantees that never file
+    monkeypatch.chdir(tmp_path)
+    generate('.', scale=0.05)
+
+    first = build_dataset()
+    assert len(first.org_versions) > first.summary.index.nunique()
+    written = os.stat(SUMMARY_FILE).st_mtime_ns
+
+    def build_summary(*frames):
+        raise AssertionError("summary rebuilt with nothing changed")
+
+    monkeypatch.setattr(data, 'build_summary', build_summary)
+    second = build_dataset()
+
+    assert os.stat(SUMMARY_FILE).st_mtime_ns == written
+    pd.testing.assert_frame_equal(second.summary, first.summary, check_categorical=False)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from entities import BANDS, ROWS, candidate_pairs, connected_labels, minhash, normalize, resolve_names, zip_codes
+from search import trigram_codes
+
+
+def resolve(names, places):
+
+    amounts = pd.Series(np.arange(len(names)) * 10.0)
+    mapping = resolve_names(pd.Series(names), amounts, pd.Series(places, dtype='string'))
+    return dict(zip(mapping['variant'], mapping['canonical']))
+
+
+def test_normalize():
+
+    names = pd.Series(['Aramark Corporation', 'ARAMARK CORP.', 'Smith & Jones, LLP', 'The Company Inc'])
+    assert normalize(names).tolist() == ['ARAMARK', 'ARAMARK', 'SMITH AND JONES', 'THE COMPANY INC']
+
+
+def test_zip_codes():
+
+    assert zip_codes(pd.Series([60606.0, 606061234, None, 0, 1234])).tolist() == ['60606', '60606', pd.NA, pd.NA, '01234']
+
+
+def test_minhash():
+
+    normalized = pd.Series(['ARAMARK', 'ARAMARK', 'INDIAN ASSET MANAGEMENT'])
+    codes, ids = trigram_codes((' ' + normalized + ' ').tolist())
+    signatures = minhash(codes, ids, len(normalized))
+
+    assert signatures.shape == (3, BANDS * ROWS)
+    assert (signatures[0] == signatures[1]).all()
+    assert (signatures[0] != signatures[2]).any()
+
+
+def test_candidate_pairs():
+
+    normalized = pd.Series(['ARAMARK', 'LOCAL 150', 'ARAMARK', 'ZENITH'])
+    places = pd.Series(['60606', pd.NA, '10001', pd.NA], dtype='string')
+    codes, ids = trigram_codes((' ' + normalized + ' ').tolist())
+
+    pairs = candidate_pairs(normalized, places, minhash(codes, ids, len(normalized)))
+    assert [0, 2] in pairs.tolist()
+    assert (pairs[:, 0] < pairs[:, 1]).all()
+
+
+def test_connected_labels():
+
+    assert connected_labels(6, np.array([[0, 1], [1, 2], [3, 4]])).tolist() == [0, 0, 0, 3, 3, 5]
+    assert connected_labels(5, np.array([[3, 4], [2, 3], [1, 2], [0, 1]])).tolist() == [0, 0, 0, 0, 0]
+    assert connected_labels(3, np.zeros((0, 2), dtype='int64')).tolist() == [0, 1, 2]
+
+
+def test_resolve_names():
+
+    names = ['ARAMARK'] * 3 + ['Aramark Corporation', 'ARAMARK CORP.', 'Bigcorp Consulting', 'Bigcorp Consulting',
+                               'BIGCORP CONSULTING INC', 'Lone Vendor', 'HEART & MIND STRATEGIES', 'HEART MIND STRATEGIES',
+                               'HEART MIND STRATEGIES', 'ADP TOTAL SOURCE', 'ADP TOTALSOURCE', 'ADP TOTALSOURCE']
+    mapping = resolve(names, ['60606'] * len(names))
+
+    # clusters are named after the spelling on the most rows, upper cased; names
+    # that are not merged with anything are left as filed. Connectors and words run
+    # together do not count as extra words
+    assert mapping == {
+        'Aramark Corporation': 'ARAMARK',
+        'ARAMARK CORP.': 'ARAMARK',
+        'Bigcorp Consulting': 'BIGCORP CONSULTING',
+        'BIGCORP CONSULTING INC': 'BIGCORP CONSULTING',
+        'HEART & MIND STRATEGIES': 'HEART MIND STRATEGIES',
+        'ADP TOTAL SOURCE': 'ADP TOTALSOURCE'
+    }
+
+
+def test_resolve_names_same_place():
+
+    # similar names are merged at a lower similarity when they are filed at the same place
+    names = ['GREENLEAF LANDSCAPING', 'GREENLEAF LANDSCAPE', 'SMITH AND JONES', 'JONES & SMITH']
+    assert resolve(names, ['53703', '53703', '60606', '60606']) == {
+        'GREENLEAF LANDSCAPING': 'GREENLEAF LANDSCAPE',
+        'SMITH AND JONES': 'JONES & SMITH'
+    }
+    assert resolve(names, ['53703', '10001', '60606', None]) == {}
+
+
+def test_resolve_names_false_merges():
+
+    # different first words, different numbers or extra words are never merged,
+    # even at one address
+    names = ['Iridian Asset Management', 'INDIAN ASSET MANAGEMENT', 'RAMLOWSTEIN ARCHITECTS',
+             'UIHLEINWILSON-RAMLOWSTEIN ARCHITECTS', 'LOCAL 150', 'LOCAL 151', 'WEST GROUP', 'WEST GROUP LAW',
+             'PLANET DIRECT', 'PLANET DIRECT MAIL', 'CONSIGLI CONSTRUCTION CO INC', 'CONSIGLI CONSTRUCTION NY LLC',
+             'FOOD SERVICES INC', 'FOOD Services I LLC', 'LISA WAGNER AND COMPANY INC', 'LISA WAGNER & ASSOC']
+    assert resolve(names, ['60606'] * len(names)) == {}
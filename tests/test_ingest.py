@@ -0,0 +1,100 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+from data import CONTRACTORS_FILE, EXPENSES_FILE, SCHEDULE_I_FILE, SCHEDULE_J_FILE
+from ingest import ingest_chunk, merge_parts, parse_return
+
+# two Form 990 returns (one with the pre-2013 tag names), a 990-EZ and a truncated
+# download, and an amended return for the first org's 2021 period
+
+RETURNS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'returns')
+
+ORIGINAL = '202202319349300100_public'
+AMENDED = '202203319349300500_public'
+
+
+def ingest(returns_dir, out_dir, append=False):
+
+    paths = sorted(glob.glob(os.path.join(returns_dir, '*.xml')))
+    parts_dir = os.path.join(out_dir, 'parts')
+    # one return per batch, so the part files are appended to
+    used, skipped = ingest_chunk(paths, parts_dir, 0, 1)
+    return used, skipped, merge_parts(parts_dir, out_dir, append)
+
+
+def read(out_dir, target):
+
+    path = os.path.join(out_dir, target)
+    return pd.read_parquet(path) if target.endswith('.parquet') else pd.read_csv(path, index_col=0)
+
+
+def test_parse_return():
+
+    header, rows = parse_return(os.path.join(RETURNS, 'filed', f'{ORIGINAL}.xml'))
+
+    # the filer's address is not mistaken for a contractor's
+    assert header == {
+        'filing_ein': '100000001', 'filing_org': 'PRAIRIE POLICY INSTITUTE', 'tax_year': '2021-12-31',
+        'return_type': '990', 'return_ts': '2022-05-13T10:21:07-05:00', 'tot_expenses': '1000000'
+    }
+    assert rows[SCHEDULE_I_FILE] == [
+        {'grantee_ein': '300000003', 'grantee_business_name': 'LAKESIDE FOUNDATION', 'grantee_cash_grant': '50000'},
+        {'grantee_business_name': 'RIVER SCHOOL', 'grantee_cash_grant': '25000'}
+    ]
+    assert rows[CONTRACTORS_FILE] == [{
+        'contractor_name': 'ACME PRINTING LLC', 'contractor_address': '5 STATE ST', 'contractor_city': 'CHICAGO',
+        'contractor_state': 'IL', 'contractor_zip': '60606', 'contractor_description': 'PRINTING', 'contractor_amt': '150000'
+    }]
+    assert rows[SCHEDULE_J_FILE] == [{
+        'compensation_name': 'JANE DOE', 'compensation_title': 'PRESIDENT',
+        'total_compensation_filing_org': '200000', 'total_compensation_related': '10000'
+    }]
+
+
+def test_ingest(tmp_path):
+
+    used, skipped, counts = ingest(os.path.join(RETURNS, 'filed'), str(tmp_path))
+
+    # the 990-EZ and the truncated file are skipped
+    assert (used, skipped) == (2, 2)
+    assert counts == {EXPENSES_FILE: 2, SCHEDULE_I_FILE: 3, CONTRACTORS_FILE: 1, SCHEDULE_J_FILE: 1}
+
+    expenses = read(str(tmp_path), EXPENSES_FILE)
+    assert expenses['filing_ein'].tolist() == [100000001, 300000003]
+    assert expenses['tax_year'].tolist() == ['2021-12-31', '2012-12-31']
+    assert expenses['tot_expenses'].tolist() == [1000000, 400000]
+
+    grants = read(str(tmp_path), SCHEDULE_I_FILE)
+    assert grants['grantee_ein'].fillna(0).tolist() == [300000003, 0, 100000001]
+    assert grants['grantee_cash_grant'].tolist() == [50000, 25000, 10000]
+
+    # total compensation is the filing org's and the related orgs' together
+    people = read(str(tmp_path), SCHEDULE_J_FILE)
+    assert people['total_compensation'].tolist() == [210000]
+
+
+def test_append_replaces_amended_return(tmp_path):
+
+    ingest(os.path.join(RETURNS, 'filed'), str(tmp_path))
+    used, skipped, counts = ingest(os.path.join(RETURNS, 'amended'), str(tmp_path), append=True)
+
+    # the amended return replaces every row of the original for its org and period;
+    # the other org's rows are kept
+    assert (used, skipped) == (1, 0)
+    assert counts == {EXPENSES_FILE: 2, SCHEDULE_I_FILE: 2, CONTRACTORS_FILE: 0, SCHEDULE_J_FILE: 0}
+
+    expenses = read(str(tmp_path), EXPENSES_FILE)
+    assert expenses['object_id'].tolist() == [AMENDED, '201302319349300200_public']
+    assert expenses['tot_expenses'].tolist() == [1200000, 400000]
+
+    grants = read(str(tmp_path), SCHEDULE_I_FILE)
+    assert grants['object_id'].tolist() == [AMENDED, '201302319349300200_public']
+    assert grants['grantee_cash_grant'].tolist() == [80000, 10000]
+
+    # appending the same return again changes nothing
+    counts_again = ingest(os.path.join(RETURNS, 'amended'), str(tmp_path), append=True)[2]
+    assert counts_again == counts
+    assert read(str(tmp_path), EXPENSES_FILE)['object_id'].tolist() == [AMENDED, '201302319349300200_public']
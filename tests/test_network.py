@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+
+from network import build_graph, flow_through, hop_distances, node_id, reachable, top_paths
+
+# four orgs: 1 funds 2 and 3, both fund 4, and 4 gives back to 1
+#
+#   1 -> 2  60 of 100 spent   share 0.6
+#   1 -> 3  40 of 100 spent   share 0.4
+#   2 -> 4  30 of 60 spent    share 0.5
+#   3 -> 4  20 of 40 spent    share 0.5
+#   4 -> 1  10 of 50 spent    share 0.2
+
+
+@pytest.fixture
+def graph():
+
+    schedule_i = pd.DataFrame({
+        'filing_ein': [1, 1, 2, 3, 4, 4, 4],
+        'grantee_ein': [2, 3, 4, 4, 1, None, 2],
+        'tax_year': [2020, 2020, 2020, 2020, 2020, 2020, 2019],
+        'grantee_cash_grant': [60, 40, 30, 20, 10, 5, 1000]
+    })
+    expenses = pd.DataFrame({
+        'filing_ein': [1, 2, 3, 4, 4],
+        'tax_year': [2020, 2020, 2020, 2020, 2019],
+        'tot_expenses': [80, 60, 40, 50, 9999]
+    })
+    return build_graph(schedule_i, expenses, tax_years=[2020])
+
+
+def test_build_graph(graph):
+
+    # grants without a grantee EIN and outside the years are left out; spend is the
+    # larger of expenses and grants given
+    assert graph.eins.tolist() == [1, 2, 3, 4]
+    assert graph.indptr.tolist() == [0, 2, 3, 4, 5]
+    assert graph.spend.tolist() == [100, 60, 40, 50]
+    assert graph.share.tolist() == pytest.approx([0.6, 0.4, 0.5, 0.5, 0.2])
+
+
+def test_hop_distances(graph):
+
+    assert hop_distances(graph, node_id(graph, 1), 3).tolist() == [0, 1, 1, 2]
+    assert hop_distances(graph, node_id(graph, 1), 1).tolist() == [0, 1, 1, -1]
+    assert hop_distances(graph, node_id(graph, 4), 3, reverse=True).tolist() == [2, 1, 1, 0]
+
+
+def test_reachable(graph):
+
+    assert reachable(graph, 2, 3).to_dict() == {4: 1, 1: 2, 3: 3}
+    assert reachable(graph, 99, 3).empty
+
+
+def test_flow_through(graph):
+
+    by_org, by_hop = flow_through(graph, 1, 4)
+
+    assert by_org['ein'].tolist() == [2, 4, 3]
+    assert by_org['first_hop'].tolist() == [1, 2, 1]
+    assert by_org['amount'].tolist() == pytest.approx([60, 50, 40])
+
+    # the 10 that come back to 1 on the third hop are not passed on again
+    assert by_hop['hop'].tolist() == [1, 2, 3]
+    assert by_hop['orgs'].tolist() == [2, 1, 0]
+    assert by_hop['amount'].tolist() == pytest.approx([100, 50, 0])
+    assert by_hop['returned'].tolist() == pytest.approx([0, 0, 10])
+
+
+def test_flow_through_unknown_source(graph):
+
+    by_org, by_hop = flow_through(graph, 99, 3)
+    assert by_org.empty and by_hop.empty
+
+
+def test_top_paths(graph):
+
+    paths = top_paths(graph, 1, 4, 3)
+    assert paths['path'].tolist() == [[1, 2, 4], [1, 3, 4]]
+    assert paths['hops'].tolist() == [2, 2]
+    assert paths['amount'].tolist() == pytest.approx([30, 20])
+
+    assert top_paths(graph, 1, 4, 3, n=1)['path'].tolist() == [[1, 2, 4]]
+    assert top_paths(graph, 1, 4, 1).empty
+
+
+def test_top_paths_cycles(graph):
+
+    cycles = top_paths(graph, 1, 1, 3)
+    assert cycles['path'].tolist() == [[1, 2, 4, 1], [1, 3, 4, 1]]
+    assert cycles['amount'].tolist() == pytest.approx([6, 4])
+    assert top_paths(graph, 1, 1, 2).empty
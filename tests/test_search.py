@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import Dataset, build_all_range_sums
+from search import build_search_index, search, trigram_codes
+
+ORGS = {
+    100000001: ('ILLINOIS POLICY INSTITUTE', 500),
+    200000002: ('POLICY RESEARCH FUND', 900),
+    300000003: ('WISCONSIN POLICY FORUM', 700),
+    123456789: ('ACME FOUNDATION', 50),
+    12345678: ('LAKESHORE TRUST', 10),
+    111111111: ('SAME NAME FOUNDATION', 40),
+    222222222: ('SAME NAME FOUNDATION', 60)
+}
+
+
+@pytest.fixture(scope='module')
+def index():
+
+    eins = list(ORGS)
+    totals = pd.DataFrame({
+        'filing_ein': eins,
+        'tax_year': np.nan,
+        'filing_org': [name for name, _ in ORGS.values()],
+        'total_expenses': [expenses for _, expenses in ORGS.values()]
+    })
+    # a yearly row next to each total row, as in the real summary
+    summary = pd.concat([totals, totals.assign(tax_year=2020.0)]).set_index('filing_ein').sort_index(kind='stable')
+
+    schedule_i = pd.DataFrame({
+        'filing_ein': [100000001, 100000001, 200000002, 200000002, 999999999],
+        'grantee_business_name': ['CHICAGO POLICY GROUP', 'ACME FOUNDATION TRUST', 'CHICAGO POLICY GROUP', 'POLICY INSTITUTE TRUST',
+                                  'NOT A FILER GRANTEE'],
+        'grantee_ein': [None, None, None, None, None],
+        'tax_year': 2020,
+        'grantee_cash_grant': [30, 5, 60, 5, 1]
+    }).sort_values('filing_ein', kind='stable')
+
+    # names are categorical in the dataset, as data.py reads them
+    schedule_i = schedule_i.astype({'grantee_business_name': 'category'})
+    contractors = pd.DataFrame({
+        'filing_ein': [200000002],
+        'contractor_name': ['POLICYWORKS LLC'],
+        'tax_year': 2020,
+        'contractor_amt': [20]
+    }).astype({'contractor_name': 'category'})
+    schedule_j = pd.DataFrame({
+        'filing_ein': [100000001],
+        'compensation_name': ['JOHN NAPOLICY'],
+        'tax_year': 2020,
+        'total_compensation': [10]
+    }).astype({'compensation_name': 'category'})
+
+    dataset = Dataset(
+        None, None, None, None, summary['filing_org'].groupby(level='filing_ein').first(), None, None, summary,
+        build_all_range_sums(schedule_i, contractors, schedule_j), None, None)
+    return build_search_index(dataset)
+
+
+def test_trigram_codes():
+
+    trigrams, ids = trigram_codes(['abcd', 'ab', 'bcd'])
+    bcd = (ord('b') << 16) | (ord('c') << 8) | ord('d')
+    assert ids[trigrams == bcd].tolist() == [0, 2]
+    assert len(trigrams) == 3
+    assert 1 not in ids.tolist()
+
+
+def test_ranking(index):
+
+    hits = search(index, 'policy')
+    names = hits['name'].drop_duplicates().tolist()
+
+    # prefixes, then word starts, then any substring; organizations first within each,
+    # then the most dollars
+    assert names == [
+        'POLICY RESEARCH FUND', 'POLICY INSTITUTE TRUST', 'POLICYWORKS LLC',
+        'WISCONSIN POLICY FORUM', 'ILLINOIS POLICY INSTITUTE', 'CHICAGO POLICY GROUP',
+        'JOHN NAPOLICY'
+    ]
+    assert hits.loc[hits['name'] == 'POLICYWORKS LLC', 'section'].tolist() == ['Part VII-B']
+    assert hits.loc[hits['name'] == 'JOHN NAPOLICY', 'section'].tolist() == ['Schedule J']
+
+
+def test_hits_link_filing_orgs(index):
+
+    # one row per filing org that names the grantee, largest amount first; grantees
+    # of orgs that are not filers in the summary are left out
+    hits = search(index, 'chicago policy')
+    assert hits['filing_ein'].tolist() == [200000002, 100000001]
+    assert hits['filing_org'].tolist() == ['POLICY RESEARCH FUND', 'ILLINOIS POLICY INSTITUTE']
+    assert hits['amount'].tolist() == [60, 30]
+    assert search(index, 'not a filer').empty
+
+
+def test_exact_match_first(index):
+
+    hits = search(index, '  Acme Foundation ')
+    assert hits['name'].tolist() == ['ACME FOUNDATION', 'ACME FOUNDATION TRUST']
+    assert hits['kind'].tolist() == ['Organization', 'Grantee']
+
+
+def test_short_query_prefix(index):
+
+    assert search(index, 'wi')['name'].tolist() == ['WISCONSIN POLICY FORUM']
+    assert search(index, 'is').empty
+
+
+def test_ein_prefix(index):
+
+    # EINs are matched as nine digits with leading zeros
+    assert search(index, '12345')['filing_ein'].tolist() == [123456789]
+    assert search(index, '0123')['name'].tolist() == ['LAKESHORE TRUST']
+    assert search(index, '555').empty
+
+
+def test_shared_name_ein(index):
+
+    # two filers under one name are one entry, found by either EIN
+    for ein in ['111111111', '222222222']:
+        hits = search(index, ein)
+        assert hits['name'].tolist() == ['SAME NAME FOUNDATION'] * 2
+        assert int(ein) in hits['filing_ein'].tolist()
+
+    assert search(index, 'same name')['filing_ein'].tolist() == [222222222, 111111111]
+
+
+def test_no_match(index):
+
+    assert search(index, 'zzz').empty
+    assert search(index, '   ').empty
+    assert search(index, 'policy', limit=2)['name'].drop_duplicates().tolist() == ['POLICY RESEARCH FUND', 'POLICY INSTITUTE TRUST']